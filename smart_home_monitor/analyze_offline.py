@@ -0,0 +1,186 @@
+# analyze_offline.py
+"""
+Phân tích video ghi sẵn không cần giao diện: chia mỗi video thành các đoạn frame (shard),
+xử lý song song bằng process pool (P1 -> P3), rồi gộp theo thời gian và lọc trùng cảnh báo (P4).
+Timestamp lấy theo vị trí frame trong video nên chạy lại luôn cho cùng kết quả.
+
+Ví dụ:
+    python analyze_offline.py data/input_videos/cam1.mp4 data/input_videos/cam2.mp4 \\
+        --cameras CAM_001 CAM_002 --start-times 2026-10-01T08:00:00 2026-10-01T08:00:00 \\
+        --workers 4 --output results.jsonl
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import math
+import heapq
+import argparse
+import multiprocessing as mp
+from datetime import datetime
+from typing import Dict, List, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import cv2
+from configs.config import DETECTION_THRESHOLD, CAMERA_CONFIG, TEMPORAL_BUCKETS
+from src.p4_action.detection_log import DetectionLog
+from src.utils.helpers import DetectionResult
+
+# Tài nguyên nặng của từng tiến trình con (tải model một lần cho mỗi tiến trình)
+_detector = None
+_rule_engine = None
+
+
+def make_shards(videos: List[str], cameras: List[str], start_times: List[Optional[datetime]],
+                shard_frames: int, temporal_windows: Optional[Dict[str, tuple]] = None) -> List[dict]:
+    """
+    Chia mỗi video thành các đoạn [start_frame, end_frame) dài tối đa shard_frames.
+    Phòng có quy tắc theo thời gian: shard chạy trước từ warmup_frame (một cửa sổ + một thùng) để
+    trạng thái cửa sổ ở đầu shard giống như khi xử lý cả video tuần tự; frame trước start_frame không được ghi.
+    :param temporal_windows: room_type -> các độ dài cửa sổ (CompiledRules.temporal_windows).
+    """
+    shards = []
+    for video_idx, (path, camera_id, start_time) in enumerate(zip(videos, cameras, start_times)):
+        cap = cv2.VideoCapture(path)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        cap.release()
+        if total <= 0:
+            print(f"[Error] Không đọc được số frame của {path}")
+            continue
+        windows = (temporal_windows or {}).get(CAMERA_CONFIG.get(camera_id, {}).get("room_type"), ())
+        preroll = math.ceil(max(windows) * (1 + 1 / TEMPORAL_BUCKETS) * fps) + 1 if windows else 0
+        for start in range(0, total, shard_frames):
+            shards.append({"video": path, "video_idx": video_idx, "camera_id": camera_id,
+                           "start_time": start_time, "start_frame": start,
+                           "end_frame": min(start + shard_frames, total),
+                           "warmup_frame": max(0, start - preroll)})
+    return shards
+
+
+def _init_worker(model_path: str, confidence_threshold: float):
+    global _detector, _rule_engine
+    from src.p2_recognition.detector import ObjectDetector
+    from src.p3_context.rule_engine import RuleEngine
+
+    _detector = ObjectDetector(model_path=model_path, confidence_threshold=confidence_threshold)
+    _rule_engine = RuleEngine(rules_path=None)
+
+
+def process_shard(shard: dict) -> List[tuple]:
+    """
+    Chạy P1 -> P3 trên một shard.
+    :return: Danh sách (timestamp, video_idx, frame_index, bản ghi detection) theo thứ tự frame.
+    """
+    from src.p1_acquisition.data_reader import DataAcquisition
+
+    start_frame = shard["start_frame"]
+    acquisition = DataAcquisition(source=shard["video"], camera_id=shard["camera_id"], threaded=False,
+                                  start_frame=shard.get("warmup_frame", start_frame), end_frame=shard["end_frame"],
+                                  timestamp_mode="video", base_time=shard["start_time"])
+    # Tiến trình con xử lý nhiều shard nối tiếp: trạng thái cửa sổ thời gian bắt đầu lại mỗi shard
+    _rule_engine.reset_temporal()
+    records = []
+    for packet in acquisition.get_stream():
+        meta = packet["metadata"]
+        detections = _detector.detect_objects(packet)
+        verdicts = _rule_engine.validate_batch(detections, meta)
+        if meta["frame_index"] < start_frame:
+            continue
+        for det, verdict in zip(detections, verdicts):
+            record = det.to_dict()
+            record.update({"video": shard["video"], "frame_index": meta["frame_index"],
+                           "room_name": meta["room_name"], "violation": list(verdict) if verdict[0] else None})
+            records.append((meta["timestamp"].timestamp(), shard["video_idx"], meta["frame_index"], record))
+    return records
+
+
+def _to_detection(record: dict) -> DetectionResult:
+    return DetectionResult(class_name=record["class"], confidence=record["confidence"], bbox=record["bbox"],
+                           position=record["position"], track_id=record["track_id"],
+                           metadata={"camera_id": record["camera_id"], "room_type": record["room_type"],
+                                     "room_name": record["room_name"],
+                                     "timestamp": datetime.fromisoformat(record["timestamp"])})
+
+
+def merge_and_write(shard_results: List[List[tuple]], output_path: str, detection_log=None) -> dict:
+    """
+    Gộp kết quả các shard theo thời gian, lọc trùng cảnh báo theo thời điểm của frame
+    (không theo thời gian thực) và ghi ra JSON Lines.
+    :param detection_log: DetectionLog để ghi thêm detection cho backtest_rules.py (None: không ghi).
+    """
+    from src.p4_action.alert_manager import AlertManager
+
+    alert_manager = AlertManager(notify=False)
+    detections = alerts = 0
+    with open(output_path, "w", encoding="utf-8") as f:
+        for ts, _, frame_index, record in heapq.merge(*shard_results, key=lambda item: item[:3]):
+            violation = record.pop("violation")
+            f.write(json.dumps({"type": "detection", **record}, ensure_ascii=False) + "\n")
+            detections += 1
+            det = _to_detection(record)
+            if detection_log is not None:
+                detection_log.record_detections([det])
+            if violation is None:
+                continue
+
+            alert = alert_manager.trigger(det, tuple(violation), current_time=ts)
+            if alert is None:
+                continue
+            # Mã cảnh báo xác định theo vị trí trong video để chạy lại cho cùng kết quả
+            alert.alert_id = uuid.uuid5(uuid.NAMESPACE_URL,
+                                        f"{record['video']}#{frame_index}#{record['class']}#{record['bbox']}").hex
+            f.write(json.dumps({"type": "alert", "video": record["video"], "frame_index": frame_index,
+                                **alert.to_dict()}, ensure_ascii=False) + "\n")
+            alerts += 1
+    return {"detections": detections, "alerts": alerts, "deduplicated": alert_manager.deduplicated_count}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Phân tích song song video ghi sẵn (P1-P4, không giao diện)")
+    parser.add_argument("videos", nargs="+", help="Các file video cần phân tích")
+    parser.add_argument("--cameras", nargs="+", default=None,
+                        help="Mã camera của từng video (tra room_type trong CAMERA_CONFIG), mặc định CAM_001")
+    parser.add_argument("--start-times", nargs="+", default=None,
+                        help="Thời điểm bắt đầu ghi của từng video (ISO 8601), mặc định mốc epoch")
+    parser.add_argument("--shard-frames", type=int, default=1800, help="Số frame mỗi shard")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Số tiến trình xử lý")
+    parser.add_argument("--model", default="yolov8n.pt", help="Đường dẫn model")
+    parser.add_argument("--conf", type=float, default=DETECTION_THRESHOLD, help="Ngưỡng tin cậy")
+    parser.add_argument("--output", default="offline_results.jsonl", help="File JSON Lines kết quả")
+    parser.add_argument("--detection-log", default=None,
+                        help="Thư mục DetectionLog để ghi thêm detection (chấm lại quy tắc bằng backtest_rules.py)")
+    args = parser.parse_args(argv)
+
+    args.cameras = args.cameras or ["CAM_001"] * len(args.videos)
+    args.start_times = [datetime.fromisoformat(t) for t in args.start_times] if args.start_times \
+        else [None] * len(args.videos)
+    if len(args.cameras) != len(args.videos) or len(args.start_times) != len(args.videos):
+        parser.error("--cameras và --start-times phải có cùng số phần tử với danh sách video")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    started = time.perf_counter()
+    from src.p3_context.rule_engine import RuleEngine
+    temporal_windows = RuleEngine(rules_path=None).compiled.temporal_windows
+    shards = make_shards(args.videos, args.cameras, args.start_times, args.shard_frames, temporal_windows)
+    print(f"[Offline] {len(args.videos)} video -> {len(shards)} shard, {args.workers} tiến trình")
+
+    ctx = mp.get_context("spawn")
+    with ctx.Pool(processes=args.workers, initializer=_init_worker, initargs=(args.model, args.conf)) as pool:
+        # imap giữ thứ tự shard; mỗi shard đã sắp theo frame nên chỉ cần merge
+        shard_results = list(pool.imap(process_shard, shards))
+
+    detection_log = DetectionLog(args.detection_log) if args.detection_log else None
+    summary = merge_and_write(shard_results, args.output, detection_log)
+    if detection_log is not None:
+        detection_log.close()
+    elapsed = time.perf_counter() - started
+    print(f"[Offline] {summary['detections']} detection, {summary['alerts']} cảnh báo "
+          f"({summary['deduplicated']} bị lọc trùng) -> {args.output} trong {elapsed:.1f} s")
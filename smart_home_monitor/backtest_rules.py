@@ -0,0 +1,136 @@
+# backtest_rules.py
+"""
+Chấm lại nhật ký detection (DetectionLog) với bộ quy tắc / thời gian lọc trùng mới mà không chạy lại YOLO,
+rồi so sánh với cấu hình hiện tại: cảnh báo nào sẽ thêm, mất hoặc đổi mức độ.
+Điều kiện thời gian ("temporal" trong SAFETY_RULES) không được chấm lại: nhật ký không ghi frame
+không có detection nên không tính được tỉ lệ frame, mọi vi phạm được xét theo kết quả tức thời.
+
+Ví dụ:
+    python backtest_rules.py --rules candidate_rules.json --dedup-time 60 --output diff.jsonl
+    python backtest_rules.py --rules candidate_rules.json --mode stream --camera CAM_002 --start 2026-10-01
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import numpy as np
+from configs.config import CAMERA_CONFIG, DEDUPLICATION_TIME, ALERT_DEDUP_IOU, DETECTION_LOG_DIR
+from src.p3_context.rule_engine import RuleEngine
+from src.p4_action.alert_manager import AlertManager
+from src.p4_action.detection_log import DetectionLogReader
+
+ROOM_NAMES = {camera_id: info.get("room_name") for camera_id, info in CAMERA_CONFIG.items()}
+
+
+def _violations_vectorized(log: DetectionLogReader, rows: np.ndarray, engine: RuleEngine) -> Dict[int, tuple]:
+    """Đối soát quy tắc cho mọi dòng bằng một phép tra mảng (room_type, class, position)."""
+    table, verdicts = engine.compiled.verdict_table(log.dictionary["room_type"], log.dictionary["class"])
+    codes = table[log["room_type"][rows], log["class"][rows], log["position"][rows]]
+    hits = np.flatnonzero(codes)
+    return {int(rows[i]): verdicts[codes[i]] for i in hits}
+
+
+def _violations_stream(log: DetectionLogReader, rows: np.ndarray, engine: RuleEngine) -> Dict[int, tuple]:
+    """Đối soát từng detection qua RuleEngine.validate_detection (đúng đường đi của pipeline)."""
+    violations = {}
+    for row in rows.tolist():
+        is_violation, v_type, severity, _ = engine.validate_detection(log.to_result(row, ROOM_NAMES))
+        if is_violation:
+            violations[row] = (v_type, severity)
+    return violations
+
+
+def replay(log: DetectionLogReader, rows: np.ndarray, engine: RuleEngine, dedup_time: float,
+           dedup_iou: float, mode: str = "vectorized") -> Dict[int, tuple]:
+    """
+    Chạy lại P3 + P4 (lọc trùng theo thời gian của detection) trên các dòng đã chọn.
+    :return: {chỉ số dòng: (violation_type, severity)} của các detection sẽ phát cảnh báo.
+    """
+    find = _violations_vectorized if mode == "vectorized" else _violations_stream
+    violations = find(log, rows, engine)
+
+    alert_manager = AlertManager(notify=False, dedup_interval=dedup_time, iou_threshold=dedup_iou)
+    alerts = {}
+    # Lọc trùng là bước tuần tự theo thời gian, chỉ cần chạy trên các dòng vi phạm
+    for row in sorted(violations, key=lambda r: (log["timestamp"][r], r)):
+        det = log.to_result(row, ROOM_NAMES)
+        if not alert_manager.is_duplicate(det, float(log["timestamp"][row])):
+            alerts[row] = violations[row]
+    return alerts
+
+
+def diff_alerts(baseline: Dict[int, tuple], candidate: Dict[int, tuple]) -> Dict[str, List[int]]:
+    return {
+        "added": sorted(set(candidate) - set(baseline)),
+        "removed": sorted(set(baseline) - set(candidate)),
+        "changed": sorted(row for row in set(baseline) & set(candidate) if baseline[row] != candidate[row]),
+    }
+
+
+def _record(log: DetectionLogReader, row: int, change: str, baseline: Optional[tuple],
+            candidate: Optional[tuple]) -> dict:
+    record = log.to_result(row, ROOM_NAMES).to_dict()
+    record.update({"row": row, "change": change,
+                   "baseline": list(baseline) if baseline else None,
+                   "candidate": list(candidate) if candidate else None})
+    return record
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Chấm lại nhật ký detection với quy tắc mới (không chạy YOLO)")
+    parser.add_argument("--log", default=DETECTION_LOG_DIR, help="Thư mục DetectionLog")
+    parser.add_argument("--rules", default=None,
+                        help="File JSON quy tắc đề xuất (cùng định dạng RULES_FILE), mặc định giữ quy tắc hiện tại")
+    parser.add_argument("--dedup-time", type=float, default=DEDUPLICATION_TIME, help="DEDUPLICATION_TIME đề xuất")
+    parser.add_argument("--dedup-iou", type=float, default=ALERT_DEDUP_IOU, help="ALERT_DEDUP_IOU đề xuất")
+    parser.add_argument("--mode", choices=("vectorized", "stream"), default="vectorized",
+                        help="vectorized: tra bảng trên cả mảng; stream: từng detection qua RuleEngine")
+    parser.add_argument("--camera", nargs="+", default=None, help="Chỉ chấm các camera này")
+    parser.add_argument("--start", type=datetime.fromisoformat, default=None, help="Từ thời điểm (ISO 8601)")
+    parser.add_argument("--end", type=datetime.fromisoformat, default=None, help="Tới thời điểm (ISO 8601)")
+    parser.add_argument("--output", default=None, help="Ghi chi tiết các cảnh báo thay đổi ra JSON Lines")
+    parser.add_argument("--show", type=int, default=10, help="Số dòng thay đổi in ra màn hình mỗi loại")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    started = time.perf_counter()
+    log = DetectionLogReader(args.log)
+    rows = log.select(args.start, args.end, args.camera)
+    print(f"[Backtest] {len(rows)}/{len(log)} detection từ {args.log} ({args.mode})")
+
+    baseline = replay(log, rows, RuleEngine(rules_path=None), DEDUPLICATION_TIME, ALERT_DEDUP_IOU, args.mode)
+    candidate_engine = RuleEngine(rules_path=args.rules, reload_interval=0) if args.rules else RuleEngine(None)
+    candidate = replay(log, rows, candidate_engine, args.dedup_time, args.dedup_iou, args.mode)
+    changes = diff_alerts(baseline, candidate)
+    elapsed = time.perf_counter() - started
+
+    print(f"[Backtest] Cảnh báo: hiện tại {len(baseline)} -> đề xuất {len(candidate)} "
+          f"(+{len(changes['added'])} / -{len(changes['removed'])} / ~{len(changes['changed'])}) trong {elapsed:.2f} s")
+    for change, changed_rows in changes.items():
+        by_key = Counter((log.dictionary["camera"][log["camera"][r]], log.dictionary["class"][log["class"][r]])
+                         for r in changed_rows)
+        for (camera_id, class_name), count in by_key.most_common():
+            print(f"  {change:8s} {camera_id:10s} {class_name:15s} {count}")
+        for row in changed_rows[:args.show]:
+            record = _record(log, row, change, baseline.get(row), candidate.get(row))
+            print(f"    {record['timestamp']} {record['camera_id']} {record['class']} ({record['position']}): "
+                  f"{record['baseline']} -> {record['candidate']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for change, changed_rows in changes.items():
+                for row in changed_rows:
+                    record = _record(log, row, change, baseline.get(row), candidate.get(row))
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        print(f"[Backtest] Chi tiết -> {args.output}")
@@ -0,0 +1,246 @@
+# benchmark.py
+"""
+Benchmark không giao diện cho pipeline P1 -> P4.
+
+Ví dụ:
+    python benchmark.py --cameras 4 --width 1920 --height 1080 --frames 300 --output results.json
+    python benchmark.py --video data/input_videos/test_sample.mp4 --baseline results.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import tempfile
+import tracemalloc
+from datetime import datetime
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import cv2
+import numpy as np
+from configs.config import CAMERA_CONFIG
+from src.p1_acquisition.data_reader import DataAcquisition
+from src.p2_recognition.detector import ObjectDetector
+from src.p2_recognition.motion_gate import MotionGate
+from src.p2_recognition.tiling import TiledDetector
+from src.p2_recognition.tracker import TrackedDetector
+from src.p3_context.rule_engine import RuleEngine
+from src.p4_action.alert_manager import AlertManager
+from src.utils.metrics import REGISTRY
+
+STAGES = ("P1_acquisition", "P2_recognition", "P3_context", "P4_action", "end_to_end")
+
+
+def make_synthetic_video(path: str, width: int, height: int, frames: int, fps: int = 30):
+    """Tạo video tổng hợp có vật thể chuyển động (để không cần webcam hay file ghi sẵn)."""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 60, (height, width, 3), dtype=np.uint8)
+    for i in range(frames):
+        frame = background.copy()
+        x = int((i * width / max(frames, 1)) % width)
+        cv2.rectangle(frame, (x, height // 2), (min(x + width // 10, width - 1), height // 2 + height // 8),
+                      (200, 200, 200), -1)
+        cv2.circle(frame, (width // 3, int(height * 0.85)), height // 20, (0, 0, 255), -1)
+        writer.write(frame)
+    writer.release()
+
+
+def percentiles(samples) -> dict:
+    if not samples:
+        return {"count": 0}
+    arr = np.asarray(samples, dtype=np.float64) * 1000.0
+    return {
+        "count": int(arr.size),
+        "mean_ms": float(arr.mean()),
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "p99_ms": float(np.percentile(arr, 99)),
+        "max_ms": float(arr.max()),
+    }
+
+
+def run_benchmark(args) -> dict:
+    REGISTRY.enabled = args.metrics
+    video = args.video
+    tmp_dir = None
+    if video is None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        video = os.path.join(tmp_dir.name, "synthetic.avi")
+        make_synthetic_video(video, args.width, args.height, args.frames)
+
+    camera_ids = list(CAMERA_CONFIG)
+    # Giải mã đồng bộ: P1_acquisition đo đúng thời gian giải mã + tiền xử lý thay vì thời gian chờ hàng đợi
+    # của luồng đọc nền (CAPTURE_THREADED), và tracemalloc thấy được cấp phát của P1
+    acquisitions = [DataAcquisition(source=video, camera_id=camera_ids[i % len(camera_ids)], threaded=False)
+                    for i in range(args.cameras)]
+    streams = [acq.get_stream() for acq in acquisitions]
+
+    load_start = time.perf_counter()
+    detector = ObjectDetector(model_path=args.model)
+    model_load_s = time.perf_counter() - load_start
+
+    recognizer = detector
+    if args.tiling:
+        recognizer = TiledDetector(detector, {cid: dict(info, tiling=True) for cid, info in CAMERA_CONFIG.items()})
+    if args.motion_gate:
+        recognizer = MotionGate(recognizer)
+    if args.tracker:
+        recognizer = TrackedDetector(recognizer, position_fn=detector.position_of)
+    rule_engine = RuleEngine(rules_path=None)
+    alert_manager = AlertManager(notify=False)
+
+    samples = {stage: [] for stage in STAGES}
+    alloc_peaks = []
+    detections_total = alerts_total = frames_total = 0
+    if args.track_allocations:
+        tracemalloc.start()
+
+    bench_start = time.perf_counter()
+    active = list(range(len(streams)))
+    while active and (args.frames <= 0 or frames_total < args.frames * args.cameras):
+        # Duyệt vòng các camera để mô phỏng nhiều luồng trên cùng một tiến trình
+        for idx in list(active):
+            if args.track_allocations:
+                tracemalloc.reset_peak()
+                base, _ = tracemalloc.get_traced_memory()
+
+            t0 = time.perf_counter()
+            packet = next(streams[idx], None)
+            t1 = time.perf_counter()
+            if packet is None:
+                active.remove(idx)
+                continue
+
+            detections = recognizer.detect_objects(packet)
+            t2 = time.perf_counter()
+            verdicts = rule_engine.validate_batch(detections, packet["metadata"])
+            t3 = time.perf_counter()
+            for det, verdict in zip(detections, verdicts):
+                if verdict[0] and alert_manager.trigger(det, verdict):
+                    alerts_total += 1
+            t4 = time.perf_counter()
+
+            if args.track_allocations:
+                _, peak = tracemalloc.get_traced_memory()
+                alloc_peaks.append(peak - base)
+
+            samples["P1_acquisition"].append(t1 - t0)
+            samples["P2_recognition"].append(t2 - t1)
+            samples["P3_context"].append(t3 - t2)
+            samples["P4_action"].append(t4 - t3)
+            samples["end_to_end"].append(t4 - t0)
+            detections_total += len(detections)
+            frames_total += 1
+    elapsed = time.perf_counter() - bench_start
+
+    if args.track_allocations:
+        tracemalloc.stop()
+    for stream in streams:
+        stream.close()
+    if tmp_dir is not None:
+        tmp_dir.cleanup()
+
+    # ru_maxrss: KB trên Linux, byte trên macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = peak_rss / (1024 * 1024) if sys.platform == "darwin" else peak_rss / 1024
+
+    result = {
+        "timestamp": datetime.now().isoformat(),
+        "config": {
+            "cameras": args.cameras, "width": args.width, "height": args.height, "frames": args.frames,
+            "video": args.video, "model": args.model,
+            "motion_gate": args.motion_gate, "tiling": args.tiling, "tracker": args.tracker, "metrics": args.metrics,
+            "capture_threaded": False,
+        },
+        "environment": {
+            "python": platform.python_version(), "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "opencv": cv2.__version__, "numpy": np.__version__,
+        },
+        "model_load_s": model_load_s,
+        "frames": frames_total,
+        "elapsed_s": elapsed,
+        "throughput_fps": frames_total / elapsed if elapsed > 0 else 0.0,
+        "detections_per_frame": detections_total / frames_total if frames_total else 0.0,
+        "alerts": alerts_total,
+        "peak_rss_mb": peak_rss_mb,
+        "latency": {stage: percentiles(samples[stage]) for stage in STAGES},
+    }
+    if args.track_allocations and alloc_peaks:
+        arr = np.asarray(alloc_peaks, dtype=np.float64) / 1024
+        result["alloc_per_frame_kb"] = {"mean": float(arr.mean()), "p95": float(np.percentile(arr, 95)),
+                                        "max": float(arr.max())}
+    return result
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """So sánh với kết quả cũ; trả về danh sách chỉ số bị chậm đi quá `tolerance` (tỉ lệ)."""
+    regressions = []
+    old_fps, new_fps = baseline.get("throughput_fps", 0), result["throughput_fps"]
+    if old_fps and new_fps < old_fps * (1 - tolerance):
+        regressions.append(f"throughput_fps: {old_fps:.2f} -> {new_fps:.2f}")
+
+    for stage in STAGES:
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            old = baseline.get("latency", {}).get(stage, {}).get(key)
+            new = result["latency"][stage].get(key)
+            if old and new and new > old * (1 + tolerance):
+                regressions.append(f"{stage}.{key}: {old:.2f} -> {new:.2f}")
+    return regressions
+
+
+def print_report(result: dict):
+    print(f"Frames: {result['frames']} | Throughput: {result['throughput_fps']:.2f} FPS | "
+          f"Peak RSS: {result['peak_rss_mb']:.1f} MB | Model load: {result['model_load_s']:.2f} s")
+    print(f"{'Stage':<16}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}  (ms)")
+    for stage in STAGES:
+        s = result["latency"][stage]
+        if s.get("count"):
+            print(f"{stage:<16}{s['mean_ms']:>10.2f}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}")
+    if "alloc_per_frame_kb" in result:
+        a = result["alloc_per_frame_kb"]
+        print(f"Cấp phát mỗi frame: mean {a['mean']:.1f} KB, p95 {a['p95']:.1f} KB")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark pipeline P1-P4 không cần giao diện")
+    parser.add_argument("--cameras", type=int, default=1, help="Số camera mô phỏng")
+    parser.add_argument("--width", type=int, default=1280, help="Chiều rộng video tổng hợp")
+    parser.add_argument("--height", type=int, default=720, help="Chiều cao video tổng hợp")
+    parser.add_argument("--frames", type=int, default=300, help="Số frame mỗi camera (<= 0: hết video)")
+    parser.add_argument("--video", default=None, help="Video ghi sẵn (mặc định: video tổng hợp)")
+    parser.add_argument("--model", default="yolov8n.pt", help="Đường dẫn model")
+    parser.add_argument("--motion-gate", action="store_true", help="Bật MotionGate")
+    parser.add_argument("--tiling", action="store_true", help="Bật suy luận theo ô trên dải sàn (TiledDetector)")
+    parser.add_argument("--tracker", action="store_true", help="Bật TrackedDetector")
+    parser.add_argument("--metrics", action="store_true", help="Bật counter/histogram (đo chi phí đo đạc)")
+    parser.add_argument("--track-allocations", action="store_true", help="Đo bộ nhớ cấp phát mỗi frame (tracemalloc)")
+    parser.add_argument("--output", default=None, help="Ghi kết quả JSON ra file")
+    parser.add_argument("--baseline", default=None, help="File JSON kết quả cũ để so sánh")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Ngưỡng chậm đi cho phép (0.10 = 10%%)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = run_benchmark(args)
+    print_report(result)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        if regressions:
+            print("[Benchmark] Phát hiện suy giảm hiệu năng:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("[Benchmark] Không có suy giảm so với baseline")
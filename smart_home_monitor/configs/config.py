@@ -7,20 +7,67 @@ OBJECT_CATEGORIES = {
     "CHEMICAL": ["detergent", "bleach", "medicine"]
 }
 
+# Từ khóa nhóm dùng trong SAFETY_RULES -> nhóm vật thể tương ứng
+CATEGORY_ALIASES = {
+    "any_sharp_object": "DANGEROUS",
+    "any_fragile_object": "FRAGILE",
+    "any_chemical": "CHEMICAL"
+}
+
 # Cấu hình Camera và Phòng (Room Metadata)
 CAMERA_CONFIG = {
     "CAM_001": {
         "room_id": "kitchen_01",
         "room_type": "kitchen",
-        "room_name": "Bếp tầng 1"
+        "room_name": "Bếp tầng 1",
+        "source": 0,                       # Webcam hoặc đường dẫn RTSP/file video
+        "backpressure": "drop_oldest",     # drop_oldest | drop_newest | block
+        # Vùng hiệu chỉnh theo góc đặt camera (tọa độ chuẩn hóa [0, 1]), xem ZONE_POSITIONS
+        "zones": {
+            "floor": [[0.0, 0.62], [1.0, 0.62], [1.0, 1.0], [0.0, 1.0]],
+            "counter": [[0.55, 0.38], [1.0, 0.38], [1.0, 0.62], [0.55, 0.62]]
+        },
+        # True: chỉ chạy YOLO trên vùng có quy tắc áp dụng (bếp: sàn + lề), vật thể ngoài vùng
+        # sẽ không còn được vẽ/ghi log. Tắt mặc định, bật khi cần giảm tải inference
+        "roi_inference": False
     },
     "CAM_002": {
         "room_id": "child_01",
         "room_type": "child_room",
-        "room_name": "Phòng trẻ em"
+        "room_name": "Phòng trẻ em",
+        "source": "rtsp://192.168.1.12:554/stream1",
+        "backpressure": "drop_oldest",
+        "motion": {"min_changed_ratio": 0.005, "redetect_interval": 15}  # Phòng trẻ em: nhạy hơn
     }
 }
 
+# Tên vùng trong CAMERA_CONFIG["zones"] -> vị trí tương ứng (floor/low/mid/high).
+# Camera có "zones" dùng mask vùng để phân loại vị trí; điểm ngoài mọi vùng dùng ngưỡng relative_y như cũ
+ZONE_POSITIONS = {
+    "floor": "floor",
+    "low": "low",
+    "counter": "mid",
+    "mid": "mid",
+    "shelf": "high",
+    "high": "high"
+}
+ZONE_MASK_WIDTH = 640         # Chiều rộng mask vùng (px) sau khi thu nhỏ
+ROI_MARGIN = 0.15             # Phần nới thêm quanh ROI (tỉ lệ khung hình) để giữ trọn vật thể
+
+# Suy luận theo ô (tile) trên dải sàn của frame gốc cho camera độ phân giải cao (1080p/4K),
+# để vật nhỏ nguy hiểm không bị thu nhỏ còn vài pixel. Bật bằng khóa "tiling": True (hoặc dict ghi đè) của camera
+TILING = {
+    "band": (0.6, 1.0),           # Dải sàn (tỉ lệ chiều cao frame) khi camera chưa có vùng "floor" trong "zones"
+    "tile_size": 640,             # Kích thước ô đưa vào model (px)
+    "overlap": 0.2,               # Tỉ lệ chồng lấn giữa hai ô liền kề
+    "max_tiles": 8,               # Vượt quá thì mỗi ô phủ vùng lớn hơn rồi thu nhỏ về tile_size
+    # Chạy lại các ô mỗi N lần nhận diện; các lần giữa chỉ giữ kết quả ô gần nhất khi lượt cả frame hiện tại
+    # cũng thấy vật đó, còn vật chỉ ô thấy được thì các ô chạy mỗi lần cho tới khi vật biến mất
+    "refresh_every": 5,
+    "categories": ["DANGEROUS"],  # Chỉ giữ detection từ ô thuộc các nhóm OBJECT_CATEGORIES này ([] = mọi lớp)
+    "merge_threshold": 0.5        # Gộp hai bbox cùng lớp khi diện tích giao / diện tích bbox nhỏ hơn >= ngưỡng
+}
+
 # Quy tắc an toàn (Safety Rules - Trang 2 & 16)
 SAFETY_RULES = {
     "kitchen": {
@@ -31,6 +78,10 @@ SAFETY_RULES = {
     "child_room": {
         "forbidden_objects": ["knife", "scissors", "medicine", "lighter"],
         "forbidden_on_floor": ["any_sharp_object"],
+        # Điều kiện thời gian theo loại vi phạm: vi phạm "forbidden_on_floor" của vật sắc nhọn chỉ cảnh báo khi
+        # vật vi phạm ít nhất "seconds" giây và trong ít nhất "ratio" số frame của khoảng đó (bỏ cảnh báo do nhận
+        # diện chập chờn). Loại vi phạm không khai báo (vd "forbidden_object" CRITICAL) vẫn cảnh báo ngay
+        "temporal": {"forbidden_on_floor": {"any_sharp_object": {"seconds": 3, "ratio": 0.8}}},
         "description": "Cấm vật nguy hiểm trong phòng trẻ em"
     },
     "living_room": {
@@ -39,6 +90,109 @@ SAFETY_RULES = {
     }
 }
 
+# File JSON quy tắc (tùy chọn) để cập nhật nóng không cần khởi động lại.
+# Các khóa: "SAFETY_RULES", "OBJECT_CATEGORIES", "CATEGORY_ALIASES" (thiếu khóa nào thì dùng giá trị trong file này)
+RULES_FILE = None
+RULES_RELOAD_INTERVAL = 2     # Giây giữa hai lần kiểm tra file quy tắc
+
+# Cửa sổ trượt của quy tắc theo thời gian (khóa "temporal" trong SAFETY_RULES)
+TEMPORAL_BUCKETS = 10         # Số thùng đếm cố định mỗi cửa sổ (độ mịn = seconds / TEMPORAL_BUCKETS)
+TEMPORAL_MAX_KEYS = 10000     # Số khóa (camera, vật thể, vị trí) tối đa giữ trạng thái
+
 # Cấu hình kỹ thuật
 DETECTION_THRESHOLD = 0.5
-DEDUPLICATION_TIME = 30  # Giây (Lọc trùng cảnh báo)
\ No newline at end of file
+DEDUPLICATION_TIME = 30  # Giây (Lọc trùng cảnh báo)
+ALERT_DEDUP_IOU = 0.3    # Cùng vật thể nếu IoU với bbox đã cảnh báo >= ngưỡng này
+ALERT_HISTORY_MAX = 10000  # Số khóa (camera, vật thể) tối đa giữ trong lịch sử lọc trùng
+
+# Cấu hình đa camera (Supervisor P1 -> P2)
+FRAME_RING_SLOTS = 4          # Số slot shared memory cho mỗi camera
+CAMERA_STALL_TIMEOUT = 10     # Giây không nhận được frame thì khởi động lại tiến trình camera
+CAMERA_RESTART_DELAY = 2      # Giây chờ trước khi kết nối lại nguồn video bị mất
+
+# Cấu hình inference theo lô (Dynamic micro-batching P2)
+INFERENCE_MAX_BATCH = 8       # Số frame tối đa trong một lần forward
+INFERENCE_MAX_WAIT_MS = 10    # Thời gian chờ tối đa để gom lô (ms)
+
+# Cấu hình lọc chuyển động (Motion gating P1 -> P2), có thể ghi đè bằng khóa "motion" của từng camera
+MOTION_GATE = {
+    "downscale_width": 160,       # Chiều rộng frame xám dùng để so sánh
+    "pixel_threshold": 25,        # Chênh lệch mức xám tối thiểu của một pixel
+    "min_changed_ratio": 0.01,    # Tỉ lệ pixel thay đổi để coi là có chuyển động
+    "redetect_interval": 30       # Số frame tối đa giữa hai lần chạy YOLO
+}
+
+# Cấu hình tracking đa vật thể (P2.4)
+TRACKER = {
+    "iou_threshold": 0.3,   # IoU tối thiểu để ghép detection vào track
+    "max_age": 30,          # Số frame giữ track khi không có detection
+    # Ngưỡng detection tin cậy cao (ByteTrack): phải lớn hơn DETECTION_THRESHOLD, detection trong khoảng
+    # [DETECTION_THRESHOLD, high_conf) không tạo track mới mà chỉ dùng để duy trì track đã có (bước ghép thứ hai)
+    "high_conf": 0.6,
+    "detect_every": 3       # Chạy YOLO mỗi N frame, tracker nội suy các frame còn lại
+}
+
+# Cấu hình phân bổ ngân sách inference giữa các camera (QoS scheduler P2).
+# Ưu tiên camera = rủi ro phòng (SAFETY_RULES) x hoạt động cảnh báo gần đây x mức chuyển động;
+# khi quá tải, camera ưu tiên thấp bị hạ độ phân giải trước rồi mới giảm tần suất nhận diện
+QOS = {
+    "enabled": False,
+    "budget_fps": 15.0,         # Tổng số frame (quy đổi về input 640) mỗi giây mà inference đáp ứng được
+    "cpu_share": None,          # Hoặc tỉ lệ thời gian dành cho inference (0-1): đo thời gian forward để quy đổi ra fps
+    "min_fps": 1.0,             # Tần suất nhận diện tối thiểu của mỗi camera
+    "low_res": 320,             # Kích thước input khi hạ độ phân giải (chi phí ~ (320/640)^2)
+    "alert_half_life": 60.0,    # Giây; hoạt động cảnh báo gần đây giảm một nửa sau mỗi chu kỳ
+    "alert_boost": 1.0,         # Mỗi cảnh báo gần đây tăng ưu tiên thêm 100%
+    "motion_floor": 0.5,        # Hệ số ưu tiên khi khung cảnh hoàn toàn tĩnh
+    "motion_full": 0.05,        # changed_ratio từ mức này trở lên coi là chuyển động mạnh (hệ số 1)
+    "reallocate_interval": 1.0  # Giây giữa hai lần phân bổ lại
+}
+
+# Cấu hình gửi thông báo bất đồng bộ (P4.3)
+NOTIFY_WEBHOOK_URL = None     # URL nhận POST JSON (SMS/Push gateway), None để tắt
+NOTIFY_QUEUE_SIZE = 1000      # Số cảnh báo chờ tối đa mỗi kênh, đầy thì bỏ cảnh báo mới
+NOTIFY_BATCH_SIZE = 20        # Số cảnh báo tối đa trong một lần gửi
+NOTIFY_FLUSH_INTERVAL = 1.0   # Giây chờ gom lô trước khi gửi
+NOTIFY_MAX_RETRIES = 3        # Số lần thử lại khi gửi lỗi
+NOTIFY_RETRY_BACKOFF = 0.5    # Giây chờ trước lần thử lại đầu tiên (nhân đôi mỗi lần)
+NOTIFY_RATE_LIMIT = 30        # Số lần gửi tối đa mỗi phút cho mỗi kênh
+
+# Cấu hình kho sự kiện (SQLite WAL) cho detection và cảnh báo
+EVENT_DB_PATH = "data/events.db"
+EVENT_BATCH_SIZE = 500        # Số bản ghi tối đa trong một transaction
+EVENT_FLUSH_INTERVAL = 1.0    # Giây tối đa giữa hai lần ghi
+EVENT_QUEUE_SIZE = 10000      # Số lô chờ ghi tối đa, đầy thì bỏ bản ghi mới
+
+# Nhật ký detection dạng cột (memmap) để chấm lại quy tắc bằng backtest_rules.py, None để tắt
+DETECTION_LOG_DIR = "data/detection_log"
+DETECTION_LOG_FLUSH_ROWS = 4096       # Số dòng gom trong bộ nhớ trước khi ghi
+DETECTION_LOG_FLUSH_INTERVAL = 5.0    # Giây tối đa giữa hai lần ghi
+
+# Cấu hình lưu bằng chứng cảnh báo (ảnh chụp + clip trước/sau), điền AlertMessage.image_path
+EVIDENCE_DIR = "data/evidence"
+EVIDENCE_PRE_SECONDS = 5      # Giây trước cảnh báo đưa vào clip
+EVIDENCE_POST_SECONDS = 5     # Giây sau cảnh báo đưa vào clip
+EVIDENCE_FPS = 10             # Số frame mỗi giây giữ trong ring buffer
+EVIDENCE_MEMORY_MB = 64       # Bộ nhớ tối đa mỗi camera: ring buffer JPEG + frame chờ nén (ghi đè bằng "evidence_memory_mb")
+EVIDENCE_JPEG_QUALITY = 80
+EVIDENCE_MAX_WIDTH = 960      # Thu nhỏ frame về chiều rộng này trước khi đưa vào hàng đợi nén
+EVIDENCE_QUEUE_SIZE = 64      # Số frame chờ nén tối đa, đầy thì bỏ frame mới
+
+# Cấu hình hiển thị Dashboard (tách khỏi tốc độ nhận diện)
+DISPLAY_FPS = 10              # Số frame hiển thị tối đa mỗi giây
+DISPLAY_WIDTH = 960           # Chiều rộng frame sau khi thu nhỏ để hiển thị
+
+# Cấu hình chỉ số giám sát hiệu năng (counter/histogram P1-P4)
+METRICS_ENABLED = False       # Bật đo đạc; khi tắt chi phí chỉ là một phép kiểm tra cờ
+METRICS_PORT = 9108           # Cổng endpoint Prometheus http://127.0.0.1:<port>/metrics
+METRICS_SPAN_LOG = None       # File JSON Lines ghi thời gian từng giai đoạn mỗi frame, None để tắt
+
+# Cấu hình luồng đọc camera (P1.1)
+CAPTURE_THREADED = True       # Giải mã trên luồng riêng, tách khỏi tốc độ inference
+CAPTURE_QUEUE_SIZE = 2        # Số frame đã giải mã chờ xử lý tối đa
+CAPTURE_MAX_LATENCY = 0.5     # (Nguồn live) Giây tối đa một frame được nằm chờ, cũ hơn thì bỏ
+
+# Cấu hình backend inference (P2.1): "auto" chọn theo định dạng model
+# (.pt -> ultralytics, .onnx -> onnxruntime, *_openvino_model -> openvino).
+# Mỗi camera có thể chỉ định riêng bằng khóa "model" / "backend" trong CAMERA_CONFIG
+INFERENCE_BACKEND = "auto"
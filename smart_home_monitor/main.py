@@ -1,6 +1,11 @@
 # main.py
+import atexit
 import os
 import sys
+import time
+
+# Mốc thời gian đầu mỗi lần Streamlit chạy lại script, để báo thời gian khởi động
+_SCRIPT_STARTED = time.perf_counter()
 
 # 1. Lấy đường dẫn tuyệt đối của thư mục chứa file main.py (thư mục gốc dự án)
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
@@ -10,30 +15,136 @@ if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
 # 3. Bây giờ mới thực hiện các lệnh import khác
+# (pandas chỉ import khi vẽ bảng; ultralytics/onnxruntime chỉ import khi registry tải model lần đầu;
+#  kho sự kiện, nhật ký detection, bằng chứng, QoS chỉ import khi được tạo)
 import streamlit as st
 import cv2
 import numpy as np
-import pandas as pd
-from src.p1_acquisition.data_reader import DataAcquisition
-from src.p2_recognition.detector import ObjectDetector
-from src.p3_context.rule_engine import RuleEngine
-from src.p4_action.alert_manager import AlertManager
-# main.py
-import streamlit as st
-import cv2
-import numpy as np
-import pandas as pd
-from datetime import datetime
 
 # Import các module đã xây dựng từ các bước trước
-from src.p1_acquisition.data_reader import DataAcquisition
-from src.p2_recognition.detector import ObjectDetector
-from src.p3_context.rule_engine import RuleEngine
-from src.p4_action.alert_manager import AlertManager
+from src.pipeline import MonitorPipeline, FrameResult
+from src.p2_recognition.model_registry import MODELS
+from src.utils import metrics
+from configs.config import (DISPLAY_FPS, DISPLAY_WIDTH, METRICS_ENABLED, METRICS_PORT, METRICS_SPAN_LOG, QOS,
+                            DETECTION_LOG_DIR)
 
 # Cấu hình trang Dashboard Streamlit
 st.set_page_config(page_title="Smart Home Safety Monitor", layout="wide")
 
+
+@st.cache_resource
+def get_event_store():
+    """Kho sự kiện dùng chung cho mọi phiên dashboard."""
+    from src.p4_action.event_store import EventStore
+    return EventStore()
+
+
+@st.cache_resource
+def get_detection_log():
+    """Nhật ký detection dạng cột dùng chung cho mọi phiên dashboard (None nếu DETECTION_LOG_DIR tắt)."""
+    if not DETECTION_LOG_DIR:
+        return None
+    from src.p4_action.detection_log import DetectionLog
+    log = DetectionLog(DETECTION_LOG_DIR)
+    # Ghi nốt bộ đệm khi tiến trình kết thúc (pipeline có thể còn chạy, không kịp gọi stop)
+    atexit.register(log.close)
+    return log
+
+
+@st.cache_resource
+def get_evidence_recorder():
+    """Bộ lưu ảnh chụp/clip cảnh báo dùng chung cho mọi phiên dashboard."""
+    from src.p4_action.evidence_recorder import EvidenceRecorder
+    return EvidenceRecorder()
+
+
+@st.cache_resource
+def get_scheduler():
+    """Bộ phân bổ ngân sách inference dùng chung cho mọi camera (None nếu QOS chưa bật)."""
+    if not QOS["enabled"]:
+        return None
+    from src.p2_recognition.scheduler import QoSScheduler
+    return QoSScheduler()
+
+
+@st.cache_resource
+def get_span_log():
+    """Mở endpoint chỉ số (nếu bật) và nhật ký span dùng chung, một lần cho cả tiến trình."""
+    if METRICS_ENABLED:
+        metrics.start_http_server(METRICS_PORT)
+    return metrics.open_span_log(METRICS_SPAN_LOG)
+
+
+@st.cache_resource
+def get_pipeline(source, camera_id: str) -> MonitorPipeline:
+    """Pipeline P1-P4 dùng chung cho mọi phiên dashboard (một pipeline cho mỗi nguồn/camera)."""
+    return MonitorPipeline(source=source, camera_id=camera_id, event_store=get_event_store(),
+                           span_log=get_span_log(), evidence_recorder=get_evidence_recorder(),
+                           scheduler=get_scheduler(), detection_log=get_detection_log())
+
+
+def render_frame(result: FrameResult, max_width: int) -> np.ndarray:
+    """
+    Thu nhỏ frame trước, rồi mới vẽ bbox và đổi hệ màu, để chi phí hiển thị
+    không phụ thuộc độ phân giải camera.
+    """
+    raw_frame = result.raw_frame
+    h, w = raw_frame.shape[:2]
+    scale = min(1.0, max_width / w)
+    if scale < 1.0:
+        frame = cv2.resize(raw_frame, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA)
+    else:
+        frame = raw_frame.copy()
+
+    for det, (is_violation, _, _, _) in zip(result.detections, result.verdicts):
+        # Xác định màu sắc Bounding Box (Yêu cầu: ĐỎ cho vi phạm, XANH cho an toàn)
+        color = (0, 0, 255) if is_violation else (0, 255, 0) # BGR
+        label = f"{det.class_name} ({det.position})"
+
+        # Vẽ lên Frame đã thu nhỏ (Visualization)
+        x1, y1, x2, y2 = (int(v * scale) for v in det.bbox)
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        cv2.putText(frame, label, (x1, y1 - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+
+    # Chuyển đổi BGR (OpenCV) sang RGB (Streamlit)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+
+def alerts_table(alerts) -> "pd.DataFrame":
+    import pandas as pd
+
+    return pd.DataFrame([{
+        "Thời gian": a.timestamp.strftime("%H:%M:%S"),
+        "Vị trí": a.room_name,
+        "Vật thể": a.class_name,
+        "Mức độ": a.severity,
+        "Nội dung": a.message,
+        "Bằng chứng": a.image_path or ""
+    } for a in alerts])
+
+
+def history_table(history) -> "pd.DataFrame":
+    import pandas as pd
+
+    return pd.DataFrame([{
+        "Thời gian": a["timestamp"].strftime("%Y-%m-%d %H:%M:%S"),
+        "Vị trí": a["room_name"],
+        "Vật thể": a["class"],
+        "Mức độ": a["severity"],
+        "Nội dung": a["message"]
+    } for a in history])
+
+
+def startup_report() -> str:
+    """Thời gian chạy script lần này và thời gian tải/warmup các model trong registry."""
+    report = f"Khởi động: {1000 * (time.perf_counter() - _SCRIPT_STARTED):.0f} ms"
+    for model in MODELS.stats():
+        report += (f" | {model['model']} ({model['backend']}): tải {model['load_seconds']:.2f} s, "
+                   f"warmup {model['warmup_seconds']:.2f} s")
+    return report
+
+
 def main():
     st.title("🛡️ Hệ thống Phát hiện & Cảnh báo Đồ vật Đặt sai vị trí")
     st.sidebar.header("Cấu hình hệ thống")
@@ -42,14 +153,11 @@ def main():
     input_source = st.sidebar.selectbox("Chọn nguồn Video", ("Webcam", "File Video"))
     source = 0 if input_source == "Webcam" else "data/input_videos/test_sample.mp4"
     camera_id = st.sidebar.text_input("Mã Camera", "CAM_001")
+    display_fps = st.sidebar.slider("FPS hiển thị", min_value=1, max_value=30, value=DISPLAY_FPS)
 
-    # Khởi tạo các Module (Step 12: Generalization)
-    if 'pipeline' not in st.session_state:
-        st.session_state.acquisition = DataAcquisition(source=source, camera_id=camera_id)
-        st.session_state.detector = ObjectDetector()
-        st.session_state.rule_engine = RuleEngine()
-        st.session_state.alert_manager = AlertManager()
-        st.session_state.alert_logs = [] # Lưu trữ log cảnh báo để hiển thị trên bảng
+    # Khởi tạo các Module (Step 12: Generalization) - dùng chung giữa các phiên
+    pipeline = get_pipeline(source, camera_id)
+    st.sidebar.caption(startup_report())
 
     # Bố cục giao diện: Cột trái (Video) - Cột phải (Log)
     col1, col2 = st.columns([2, 1])
@@ -57,64 +165,47 @@ def main():
     with col1:
         st.subheader("📺 Camera Live Stream")
         video_placeholder = st.empty() # Placeholder để cập nhật frame liên tục
+        status_placeholder = st.empty()
 
     with col2:
         st.subheader("⚠️ Danh sách Cảnh báo")
         log_placeholder = st.empty()
 
+        # Lịch sử cảnh báo đọc theo trang từ kho sự kiện
+        with st.expander("📜 Lịch sử cảnh báo"):
+            page = st.number_input("Trang", min_value=1, value=1, step=1)
+            history = get_event_store().last_alerts(limit=20, offset=(page - 1) * 20)
+            if history:
+                st.table(history_table(history))
+
     # Nút bắt đầu/dừng hệ thống
     start_btn = st.sidebar.button("Bắt đầu giám sát")
-    
-    if start_btn:
-        # --- BẮT ĐẦU END-TO-END PIPELINE ---
-        # P1: Data Acquisition (Generator)
-        for packet in st.session_state.acquisition.get_stream():
-            raw_frame = packet["raw_frame"]
-            
-            # P2: Object Recognition & Position Classification
-            # Nhận diện vật thể và xác định floor/low/mid/high
-            detections = st.session_state.detector.detect_objects(packet)
-            
-            current_alerts_in_frame = []
-            
-            for det in detections:
-                # P3: Context Analysis
-                # Đối soát với Safety Rules trong config.py
-                is_violation, v_type, severity, msg = st.session_state.rule_engine.validate_detection(det)
-                
-                # Xác định màu sắc Bounding Box (Yêu cầu: ĐỎ cho vi phạm, XANH cho an toàn)
-                color = (0, 0, 255) if is_violation else (0, 255, 0) # BGR
-                label = f"{det.class_name} ({det.position})"
-                
-                # Vẽ lên Frame gốc (Visualization)
-                x1, y1, x2, y2 = det.bbox
-                cv2.rectangle(raw_frame, (x1, y1), (x2, y2), color, 2)
-                cv2.putText(raw_frame, label, (x1, y1 - 10), 
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-
-                # P4: Action Triggering
-                # Nếu vi phạm, thực hiện lọc trùng và ghi log
-                if is_violation:
-                    triggered = st.session_state.alert_manager.trigger(det, (is_violation, v_type, severity, msg))
-                    if triggered:
-                        new_log = {
-                            "Thời gian": det.metadata['timestamp'].strftime("%H:%M:%S"),
-                            "Vị trí": det.metadata['room_name'],
-                            "Vật thể": det.class_name,
-                            "Mức độ": severity,
-                            "Nội dung": msg
-                        }
-                        st.session_state.alert_logs.insert(0, new_log) # Đưa log mới lên đầu
-
-            # --- CẬP NHẬT GIAO DIỆN STREAMLIT ---
-            # Chuyển đổi BGR (OpenCV) sang RGB (Streamlit)
-            frame_rgb = cv2.cvtColor(raw_frame, cv2.COLOR_BGR2RGB)
-            video_placeholder.image(frame_rgb, channels="RGB", use_container_width=True)
-            
-            # Cập nhật bảng Log cảnh báo (P4.3)
-            if st.session_state.alert_logs:
-                df_logs = pd.DataFrame(st.session_state.alert_logs).head(10) # Hiển thị 10 log mới nhất
-                log_placeholder.table(df_logs)
+    stop_btn = st.sidebar.button("Dừng giám sát")
+
+    if stop_btn:
+        pipeline.stop()
+    elif start_btn:
+        # --- BẮT ĐẦU END-TO-END PIPELINE (chạy nền, không phụ thuộc giao diện) ---
+        pipeline.start()
+
+    # --- CẬP NHẬT GIAO DIỆN STREAMLIT ---
+    # Chỉ đọc kết quả mới nhất với tần suất display_fps; bảng log chỉ vẽ lại khi có cảnh báo mới
+    frame_version, alert_version = -1, -1
+    period = 1.0 / display_fps
+    while pipeline.running:
+        tick = time.monotonic()
+
+        frame_version, result = pipeline.bus.frame_slot(camera_id).get(frame_version)
+        if result is not None:
+            video_placeholder.image(render_frame(result, DISPLAY_WIDTH), channels="RGB", use_container_width=True)
+
+        # Cập nhật bảng Log cảnh báo (P4.3)
+        alert_version, alerts = pipeline.bus.alerts.snapshot(alert_version, limit=10) # 10 log mới nhất
+        if alerts:
+            log_placeholder.table(alerts_table(alerts))
+
+        status_placeholder.caption(f"Pipeline: {pipeline.fps:.1f} FPS | {pipeline.frames_processed} frame")
+        time.sleep(max(0.0, period - (time.monotonic() - tick)))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
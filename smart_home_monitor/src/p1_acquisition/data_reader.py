@@ -1,39 +1,255 @@
 # src/p1_acquisition/data_reader.py
 
+import os
 import cv2
 import datetime
 import time
+import queue
+import threading
 import numpy as np
-from typing import Generator, Dict, Any, Union
-from configs.config import CAMERA_CONFIG
+from typing import Generator, Dict, Any, Union, Tuple, Optional
+from configs.config import CAMERA_CONFIG, CAPTURE_THREADED, CAPTURE_QUEUE_SIZE, CAPTURE_MAX_LATENCY
+from src.utils.metrics import REGISTRY
+from src.utils.zones import camera_roi
+
+PREPROCESS_MODES = ("letterbox", "stretch")
+TIMESTAMP_MODES = ("wallclock", "video")
+LETTERBOX_PAD_VALUE = 114  # Màu viền xám chuẩn của YOLOv8
+
+FRAMES_READ = REGISTRY.counter("p1_frames_read_total", "Số frame đọc được", ("camera_id",))
+FRAMES_DROPPED = REGISTRY.counter("p1_frames_dropped_total", "Số frame bị bỏ qua", ("camera_id",))
+DECODE_SECONDS = REGISTRY.histogram("p1_decode_seconds", "Thời gian đọc và giải mã frame", ("camera_id",))
+PREPROCESS_SECONDS = REGISTRY.histogram("p1_preprocess_seconds", "Thời gian tiền xử lý frame", ("camera_id",))
+
 
 class DataAcquisition:
-    def __init__(self, source: Union[str, int], camera_id: str):
+    def __init__(self, source: Union[str, int], camera_id: str, preprocess_mode: str = "letterbox",
+                 input_size: int = 640, num_buffers: int = 2, threaded: bool = CAPTURE_THREADED,
+                 queue_size: int = CAPTURE_QUEUE_SIZE, max_latency: float = CAPTURE_MAX_LATENCY,
+                 roi: Optional[Tuple[float, float, float, float]] = None, start_frame: int = 0,
+                 end_frame: Optional[int] = None, timestamp_mode: str = "wallclock",
+                 base_time: Optional[datetime.datetime] = None):
         """
         Khởi tạo module thu thập dữ liệu (P1).
         :param source: Đường dẫn file video hoặc ID camera (0 cho webcam).
         :param camera_id: Mã định danh camera để tra cứu metadata.
+        :param preprocess_mode: "letterbox" (uint8, giữ tỉ lệ, buffer dùng lại) hoặc "stretch" (float32, cách cũ).
+        :param input_size: Kích thước đầu vào vuông của model.
+        :param num_buffers: Số buffer letterbox xoay vòng. processed_frame chỉ hợp lệ
+                            cho tới khi get_stream() sinh thêm num_buffers frame nữa.
+        :param threaded: Giải mã trên luồng riêng vào hàng đợi có giới hạn. Nguồn live bỏ frame
+                         khi xử lý không kịp (chỉ grab, không giải mã); file video đọc đủ, không bỏ frame.
+        :param queue_size: Số frame đã giải mã chờ xử lý tối đa.
+        :param max_latency: (Nguồn live) Tuổi tối đa (giây) của frame trong hàng đợi; frame cũ hơn bị bỏ.
+        :param roi: Vùng (x0, y0, x1, y1) chuẩn hóa [0, 1] đưa vào model; mặc định lấy theo
+                    "roi_inference"/"zones" của camera, None nếu dùng toàn khung hình.
+        :param start_frame: (File video) Frame bắt đầu đọc (seek tới đó).
+        :param end_frame: (File video) Dừng trước frame này, None: đọc tới hết.
+        :param timestamp_mode: "wallclock" (datetime.now() lúc đọc) hoặc "video"
+                               (base_time + vị trí frame / fps, cho kết quả lặp lại được khi phân tích file).
+        :param base_time: Thời điểm ứng với frame 0 ở chế độ "video" (mặc định: mốc epoch).
         """
+        if preprocess_mode not in PREPROCESS_MODES:
+            raise ValueError(f"Chế độ tiền xử lý không hợp lệ: {preprocess_mode}")
+        if timestamp_mode not in TIMESTAMP_MODES:
+            raise ValueError(f"Chế độ timestamp không hợp lệ: {timestamp_mode}")
+
         self.source = source
         self.camera_id = camera_id
         self.cap = None
-        
+        self.preprocess_mode = preprocess_mode
+        self.input_size = input_size
+        self.threaded = threaded
+        self.queue_size = max(1, queue_size)
+        self.max_latency = max_latency
+        self.is_live = not (isinstance(source, str) and os.path.isfile(source))
+        self.frames_read = 0
+        self.dropped = 0
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        self.timestamp_mode = timestamp_mode
+        self.base_time = base_time if base_time is not None else datetime.datetime.fromtimestamp(0)
+        self._frame_index = start_frame
+        self._video_fps = 0.0
+
         # Tra cứu room_type từ config (Node P1.3)
         cam_info = CAMERA_CONFIG.get(camera_id, {})
         self.room_type = cam_info.get("room_type", "unknown")
         self.room_name = cam_info.get("room_name", "Unknown Room")
+        self.roi = roi if roi is not None else camera_roi(camera_id)
+
+        # Buffer letterbox cấp phát một lần, dùng lại cho mọi frame
+        self._buffers = [np.full((input_size, input_size, 3), LETTERBOX_PAD_VALUE, dtype=np.uint8)
+                         for _ in range(max(1, num_buffers))]
+        self._buffer_idx = 0
+        self._geometry = None  # (frame_h, frame_w, scale, pad_x, pad_y, resize_buffer)
+        self._roi_pixels = None  # (frame_h, frame_w, (x0, y0, x1, y1) theo pixel)
 
-    def _preprocess(self, frame: np.ndarray) -> np.ndarray:
+    def _letterbox_geometry(self, frame_h: int, frame_w: int) -> tuple:
+        """Tính (và cache) tỉ lệ, phần đệm và buffer resize cho một kích thước frame."""
+        geo = self._geometry
+        if geo is not None and geo[0] == frame_h and geo[1] == frame_w:
+            return geo
+
+        size = self.input_size
+        scale = min(size / frame_w, size / frame_h)
+        new_w, new_h = round(frame_w * scale), round(frame_h * scale)
+        pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+
+        # Kích thước thay đổi (hiếm): tô lại viền và cấp phát buffer resize mới
+        for buf in self._buffers:
+            buf.fill(LETTERBOX_PAD_VALUE)
+        resize_buffer = np.empty((new_h, new_w, 3), dtype=np.uint8)
+
+        self._geometry = (frame_h, frame_w, scale, pad_x, pad_y, resize_buffer)
+        return self._geometry
+
+    def _roi_box(self, frame_h: int, frame_w: int) -> Optional[Tuple[int, int, int, int]]:
+        """ROI theo pixel cho một kích thước frame (được cache)."""
+        if self.roi is None:
+            return None
+        cached = self._roi_pixels
+        if cached is None or cached[0] != frame_h or cached[1] != frame_w:
+            x0, y0, x1, y1 = self.roi
+            box = (int(x0 * frame_w), int(y0 * frame_h), max(int(x0 * frame_w) + 1, round(x1 * frame_w)),
+                   max(int(y0 * frame_h) + 1, round(y1 * frame_h)))
+            cached = self._roi_pixels = (frame_h, frame_w, box)
+        return cached[2]
+
+    def _preprocess(self, frame: np.ndarray) -> Tuple[np.ndarray, Optional[tuple]]:
         """
-        Node P1.2: Tiền xử lý khung hình (Resize + Normalization)
+        Node P1.2: Tiền xử lý khung hình.
+        - letterbox: resize giữ tỉ lệ vào buffer uint8 dùng lại, không cấp phát mới mỗi frame.
+          YOLO tự chuẩn hóa [0, 1] bên trong nên không chia 255 ở đây.
+        - stretch: resize méo về 640x640 và chuẩn hóa float32 (cách cũ).
+        :return: (processed_frame, letterbox) với letterbox = (scale, pad_x, pad_y) hoặc None.
         """
-        # 1. Resize về 640x640 (chuẩn đầu vào YOLOv8 - Trang 22)
-        resized = cv2.resize(frame, (640, 640))
-        
-        # 2. Chuẩn hóa pixel về dải [0, 1] - Kiểu dữ liệu float32
-        normalized = resized.astype(np.float32) / 255.0
-        
-        return normalized
+        if self.preprocess_mode == "stretch":
+            # 1. Resize về 640x640 (chuẩn đầu vào YOLOv8 - Trang 22)
+            resized = cv2.resize(frame, (self.input_size, self.input_size))
+
+            # 2. Chuẩn hóa pixel về dải [0, 1] - Kiểu dữ liệu float32
+            normalized = resized.astype(np.float32) / 255.0
+            return normalized, None
+
+        _, _, scale, pad_x, pad_y, resize_buffer = self._letterbox_geometry(frame.shape[0], frame.shape[1])
+        new_h, new_w = resize_buffer.shape[:2]
+
+        cv2.resize(frame, (new_w, new_h), dst=resize_buffer, interpolation=cv2.INTER_LINEAR)
+        buffer = self._buffers[self._buffer_idx]
+        self._buffer_idx = (self._buffer_idx + 1) % len(self._buffers)
+        buffer[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = resize_buffer
+
+        return buffer, (scale, pad_x, pad_y)
+
+    def _drop(self):
+        self.dropped += 1
+        FRAMES_DROPPED.inc(self.camera_id)
+
+    def _seek(self, frame_index: int):
+        """Seek tới frame_index; backend không seek chính xác được thì grab() bỏ qua từ đầu (không giải mã)."""
+        if self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index) and \
+                int(self.cap.get(cv2.CAP_PROP_POS_FRAMES)) == frame_index:
+            return
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        for _ in range(frame_index):
+            if not self.cap.grab():
+                break
+
+    def _at_end(self) -> bool:
+        return self.end_frame is not None and self._frame_index >= self.end_frame
+
+    def _stamp(self) -> Tuple[datetime.datetime, int]:
+        """Timestamp và số thứ tự của frame vừa đọc."""
+        index = self._frame_index
+        self._frame_index += 1
+        if self.timestamp_mode == "video":
+            # Theo vị trí trong video: cùng một file luôn cho cùng timestamp
+            if self._video_fps > 0:
+                seconds = index / self._video_fps
+            else:
+                seconds = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            return self.base_time + datetime.timedelta(seconds=seconds), index
+        # Ghi nhận timestamp hiện tại (Node P1.3 - Trang 7)
+        return datetime.datetime.now(), index
+
+    def _read_inline(self) -> Generator[tuple, None, None]:
+        """Đọc tuần tự trên luồng gọi (cách cũ): trả về (frame, timestamp, decode_time, frame_index)."""
+        while not self._at_end():
+            read_start = time.perf_counter()
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            timestamp, index = self._stamp()
+            yield frame, timestamp, time.perf_counter() - read_start, index
+
+    def _capture_loop(self, frames: queue.Queue, stop_event: threading.Event):
+        """
+        Luồng giải mã. Nguồn live: khi hàng đợi đầy, frame mới chỉ được grab() (không giải mã)
+        rồi bỏ, trừ khi frame cũ nhất đã quá max_latency thì bỏ frame cũ nhất thay vào đó.
+        File video: chờ tới khi hàng đợi có chỗ, không bỏ frame nào.
+        """
+        while not stop_event.is_set() and not self._at_end():
+            read_start = time.perf_counter()
+            if not self.cap.grab():
+                break
+            captured_at = time.monotonic()
+            timestamp, index = self._stamp()
+
+            if self.is_live and frames.full():
+                with frames.mutex:
+                    oldest = frames.queue[0] if frames.queue else None
+                if oldest is not None and captured_at - oldest[4] < self.max_latency:
+                    self._drop()
+                    continue
+                try:
+                    frames.get_nowait()
+                    self._drop()
+                except queue.Empty:
+                    pass
+
+            ret, frame = self.cap.retrieve()
+            if not ret:
+                break
+            item = (frame, timestamp, time.perf_counter() - read_start, index, captured_at)
+
+            if self.is_live:
+                try:
+                    frames.put_nowait(item)
+                except queue.Full:
+                    self._drop()
+                continue
+            while not stop_event.is_set():
+                try:
+                    frames.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+
+        # Báo hết luồng cho bên đọc
+        while not stop_event.is_set():
+            try:
+                frames.put(None, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+
+    def _read_threaded(self) -> Generator[tuple, None, None]:
+        """Đọc qua luồng giải mã riêng: trả về (frame, timestamp, decode_time, frame_index)."""
+        frames: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        stop_event = threading.Event()
+        reader = threading.Thread(target=self._capture_loop, args=(frames, stop_event),
+                                  name=f"P1-capture-{self.camera_id}", daemon=True)
+        reader.start()
+        try:
+            while True:
+                item = frames.get()
+                if item is None:
+                    break
+                yield item[:4]
+        finally:
+            stop_event.set()
+            reader.join(timeout=1.0)
 
     def get_stream(self) -> Generator[Dict[str, Any], None, None]:
         """
@@ -48,34 +264,97 @@ class DataAcquisition:
 
         print(f"[P1] Đang bắt đầu luồng dữ liệu từ: {self.room_name} ({self.camera_id})")
 
-        while True:
-            ret, frame = self.cap.read()
-            if not ret:
-                break
+        self._video_fps = self.cap.get(cv2.CAP_PROP_FPS) or 0.0
+        self._frame_index = self.start_frame
+        if self.start_frame > 0:
+            self._seek(self.start_frame)
+
+        frames = self._read_threaded() if self.threaded else self._read_inline()
+        try:
+            for frame, timestamp, decode_time, frame_index in frames:
+                # Thực hiện tiền xử lý (chỉ trên ROI nếu có, cắt bằng view không sao chép)
+                preprocess_start = time.perf_counter()
+                roi = self._roi_box(frame.shape[0], frame.shape[1])
+                model_input = frame if roi is None else frame[roi[1]:roi[3], roi[0]:roi[2]]
+                processed_frame, letterbox = self._preprocess(model_input)
+                preprocess_time = time.perf_counter() - preprocess_start
+
+                self.frames_read += 1
+                FRAMES_READ.inc(self.camera_id)
+                DECODE_SECONDS.observe(decode_time, self.camera_id)
+                PREPROCESS_SECONDS.observe(preprocess_time, self.camera_id)
 
-            # Ghi nhận timestamp hiện tại (Node P1.3 - Trang 7)
-            timestamp = datetime.datetime.now()
-            
-            # Thực hiện tiền xử lý
-            processed_frame = self._preprocess(frame)
-
-            # Đóng gói dữ liệu đầu ra của P1
-            data_packet = {
-                "raw_frame": frame,          # Giữ frame gốc để hiển thị/vẽ cảnh báo
-                "processed_frame": processed_frame,
-                "metadata": {
-                    "timestamp": timestamp,
-                    "camera_id": self.camera_id,
-                    "room_type": self.room_type,
-                    "room_name": self.room_name,
-                    "frame_height": frame.shape[0],
-                    "frame_width": frame.shape[1]
+                # Đóng gói dữ liệu đầu ra của P1
+                data_packet = {
+                    "raw_frame": frame,          # Giữ frame gốc để hiển thị/vẽ cảnh báo
+                    "processed_frame": processed_frame,
+                    "metadata": {
+                        "timestamp": timestamp,
+                        "frame_index": frame_index,  # Số thứ tự frame trong nguồn
+                        "camera_id": self.camera_id,
+                        "room_type": self.room_type,
+                        "room_name": self.room_name,
+                        "frame_height": frame.shape[0],
+                        "frame_width": frame.shape[1],
+                        "input_size": self.input_size,
+                        "letterbox": letterbox,   # (scale, pad_x, pad_y) để P2 ánh xạ ngược bbox
+                        "roi": roi,               # (x0, y0, x1, y1) pixel của vùng đưa vào model, None: cả frame
+                        "p1_timings": (decode_time, preprocess_time)  # (giải mã, tiền xử lý) tính bằng giây
+                    }
                 }
-            }
 
-            yield data_packet
+                yield data_packet
+        finally:
+            frames.close()
+            self.cap.release()
+
+
+def estimate_preprocess_bandwidth(frame_w: int, frame_h: int, fps: float = 30,
+                                  input_size: int = 640) -> Dict[str, Dict[str, float]]:
+    """
+    Ước lượng lưu lượng bộ nhớ (MB/s) và dung lượng cấp phát mới của bước tiền xử lý
+    cho một camera, bỏ qua phần đọc frame gốc (giống nhau ở cả hai chế độ).
+    """
+    plane = input_size * input_size * 3
+    scale = min(input_size / frame_w, input_size / frame_h)
+    roi = round(frame_w * scale) * round(frame_h * scale) * 3
+
+    # stretch: resize (ghi u8) + astype (đọc u8, ghi f32) + chia 255 (đọc f32, ghi f32)
+    stretch_traffic = plane + (plane + 4 * plane) + (4 * plane + 4 * plane)
+    stretch_alloc = plane + 4 * plane + 4 * plane
+    # letterbox: resize (ghi u8 vùng ảnh) + copy vào buffer (đọc + ghi u8)
+    letterbox_traffic = roi + 2 * roi
+
+    mb = 1024 * 1024
+    return {
+        "stretch": {"traffic_mb_s": stretch_traffic * fps / mb, "alloc_mb_s": stretch_alloc * fps / mb},
+        "letterbox": {"traffic_mb_s": letterbox_traffic * fps / mb, "alloc_mb_s": 0.0},
+    }
+
+
+def measure_preprocess(frame_w: int = 1920, frame_h: int = 1080, frames: int = 100) -> Dict[str, Dict[str, float]]:
+    """
+    Đo thực tế thời gian và bộ nhớ cấp phát mới mỗi frame của hai chế độ tiền xử lý (tracemalloc).
+    """
+    import tracemalloc
+
+    frame = np.random.randint(0, 255, (frame_h, frame_w, 3), dtype=np.uint8)
+    report = {}
+    for mode in PREPROCESS_MODES:
+        acquisition = DataAcquisition(source=0, camera_id="BENCH", preprocess_mode=mode)
+        acquisition._preprocess(frame)  # Khởi tạo buffer trước khi đo
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        for _ in range(frames):
+            acquisition._preprocess(frame)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        report[mode] = {"ms_per_frame": 1000 * elapsed / frames, "peak_alloc_mb": peak / (1024 * 1024)}
+    return report
 
-        self.cap.release()
 
 # --- Đoạn mã chạy thử nghiệm (Unit Test cho Module P1) ---
 if __name__ == "__main__":
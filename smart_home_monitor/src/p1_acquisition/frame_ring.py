@@ -0,0 +1,166 @@
+# src/p1_acquisition/frame_ring.py
+
+import pickle
+import time
+import numpy as np
+from multiprocessing import shared_memory
+from typing import Optional, Tuple, Dict, Any
+
+# Bố cục header (int64):
+# [write_seq, read_seq, dropped (producer), skipped (consumer), heartbeat_ms, slot_seq_0 ... slot_seq_n-1]
+_WRITE_SEQ = 0
+_READ_SEQ = 1
+_DROPPED = 2
+_SKIPPED = 3
+_HEARTBEAT = 4
+_HEADER_FIELDS = 5
+
+# Kích thước tối đa của metadata (pickle) cho mỗi slot
+META_BYTES = 4096
+
+BACKPRESSURE_POLICIES = ("drop_oldest", "drop_newest", "block")
+
+
+class SharedFrameRing:
+    def __init__(self, name: str, slots: int, frame_shape: Tuple[int, ...],
+                 dtype=np.uint8, create: bool = False, policy: str = "drop_oldest"):
+        """
+        Ring buffer khung hình trên shared memory (một producer, một consumer).
+        Frame được ghi thẳng vào vùng nhớ dùng chung nên không bị pickle/copy giữa các tiến trình.
+        :param name: Tên vùng shared memory (duy nhất cho mỗi camera).
+        :param slots: Số slot trong ring.
+        :param frame_shape: Kích thước frame lưu trong mỗi slot (vd: (640, 640, 3)).
+        :param create: True ở tiến trình supervisor (tạo vùng nhớ), False ở tiến trình con (attach).
+        :param policy: Chính sách back-pressure khi ring đầy: drop_oldest | drop_newest | block.
+        """
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Chính sách back-pressure không hợp lệ: {policy}")
+
+        self.name = name
+        self.slots = slots
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+        self.policy = policy
+
+        header_bytes = (_HEADER_FIELDS + slots) * 8
+        frame_bytes = int(np.prod(self.frame_shape)) * self.dtype.itemsize
+        total = header_bytes + slots * META_BYTES + slots * frame_bytes
+
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=total)
+        buf = self.shm.buf
+
+        self._header = np.ndarray((_HEADER_FIELDS + slots,), dtype=np.int64, buffer=buf, offset=0)
+        self._meta = np.ndarray((slots, META_BYTES), dtype=np.uint8, buffer=buf, offset=header_bytes)
+        self._frames = np.ndarray((slots,) + self.frame_shape, dtype=self.dtype, buffer=buf,
+                                  offset=header_bytes + slots * META_BYTES)
+
+        if create:
+            self._header[:] = 0
+            self._header[_HEADER_FIELDS:] = -1
+
+    # --- Phía producer (tiến trình camera) ---
+    def write(self, frame: np.ndarray, metadata: Dict[str, Any], timeout: float = 1.0) -> bool:
+        """
+        Ghi một frame và metadata vào slot kế tiếp.
+        :return: False nếu frame bị bỏ theo chính sách back-pressure.
+        """
+        header = self._header
+        write_seq = int(header[_WRITE_SEQ])
+        self.touch()
+
+        if write_seq - int(header[_READ_SEQ]) >= self.slots:
+            if self.policy == "drop_newest":
+                header[_DROPPED] += 1
+                return False
+            if self.policy == "block":
+                deadline = time.monotonic() + timeout
+                while write_seq - int(header[_READ_SEQ]) >= self.slots:
+                    if time.monotonic() > deadline:
+                        header[_DROPPED] += 1
+                        return False
+                    time.sleep(0.001)
+            # drop_oldest: ghi đè slot cũ nhất, consumer sẽ tự bỏ qua frame đã bị ghi đè
+
+        payload = pickle.dumps(metadata, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) + 4 > META_BYTES:
+            raise ValueError(f"Metadata quá lớn cho slot ({len(payload)} bytes)")
+
+        slot = write_seq % self.slots
+        slot_seq = header[_HEADER_FIELDS:]
+        slot_seq[slot] = -1  # Đánh dấu slot đang được ghi
+
+        np.copyto(self._frames[slot], frame, casting="unsafe")
+        meta = self._meta[slot]
+        meta[:4] = np.frombuffer(len(payload).to_bytes(4, "little"), dtype=np.uint8)
+        meta[4:4 + len(payload)] = np.frombuffer(payload, dtype=np.uint8)
+
+        slot_seq[slot] = write_seq
+        header[_WRITE_SEQ] = write_seq + 1
+        return True
+
+    def touch(self):
+        """Cập nhật heartbeat để supervisor biết tiến trình camera vẫn sống."""
+        self._header[_HEARTBEAT] = int(time.time() * 1000)
+
+    # --- Phía consumer (tiến trình inference) ---
+    def read(self) -> Optional[Tuple[int, np.ndarray, Dict[str, Any]]]:
+        """
+        Lấy frame kế tiếp cần xử lý (không copy: trả về view trên shared memory).
+        drop_oldest luôn lấy frame mới nhất; các chính sách khác lấy theo thứ tự.
+        :return: (seq, frame_view, metadata) hoặc None nếu chưa có frame mới.
+        """
+        header = self._header
+        write_seq = int(header[_WRITE_SEQ])
+        read_seq = int(header[_READ_SEQ])
+        if write_seq <= read_seq:
+            return None
+
+        if self.policy == "drop_oldest":
+            seq = write_seq - 1
+        else:
+            seq = max(read_seq, write_seq - self.slots)
+
+        slot = seq % self.slots
+        if int(header[_HEADER_FIELDS + slot]) != seq:
+            return None  # Slot đang bị ghi đè
+
+        meta = self._meta[slot]
+        length = int.from_bytes(meta[:4].tobytes(), "little")
+        metadata = pickle.loads(meta[4:4 + length].tobytes())
+
+        if int(header[_HEADER_FIELDS + slot]) != seq:
+            return None
+        return seq, self._frames[slot], metadata
+
+    def is_valid(self, seq: int) -> bool:
+        """Kiểm tra frame `seq` chưa bị producer ghi đè trong lúc đang xử lý."""
+        return int(self._header[_HEADER_FIELDS + seq % self.slots]) == seq
+
+    def release(self, seq: int):
+        """Báo đã xử lý xong frame `seq`, giải phóng slot cho producer."""
+        read_seq = int(self._header[_READ_SEQ])
+        if seq >= read_seq:
+            # Các frame bị nhảy qua (drop_oldest hoặc bị ghi đè) được tính là frame bỏ
+            self._header[_SKIPPED] += seq - read_seq
+            self._header[_READ_SEQ] = seq + 1
+
+    # --- Thống kê ---
+    @property
+    def written(self) -> int:
+        return int(self._header[_WRITE_SEQ])
+
+    @property
+    def dropped(self) -> int:
+        return int(self._header[_DROPPED]) + int(self._header[_SKIPPED])
+
+    @property
+    def heartbeat(self) -> float:
+        """Thời điểm heartbeat cuối cùng (epoch giây)."""
+        return self._header[_HEARTBEAT] / 1000.0
+
+    def close(self, unlink: bool = False):
+        # Giải phóng các view trước khi đóng vùng nhớ
+        del self._header, self._meta, self._frames
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
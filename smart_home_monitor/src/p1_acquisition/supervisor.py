@@ -0,0 +1,270 @@
+# src/p1_acquisition/supervisor.py
+
+import os
+import time
+import queue
+import multiprocessing as mp
+import numpy as np
+from typing import Dict, Any, Generator, List, Tuple, Optional
+from configs.config import (CAMERA_CONFIG, DETECTION_THRESHOLD, FRAME_RING_SLOTS,
+                            CAMERA_STALL_TIMEOUT, CAMERA_RESTART_DELAY,
+                            INFERENCE_MAX_BATCH, INFERENCE_MAX_WAIT_MS, QOS)
+from src.p1_acquisition.frame_ring import SharedFrameRing
+from src.utils.metrics import REGISTRY
+
+FRAMES_DROPPED = REGISTRY.counter("p1_frames_dropped_total", "Số frame bị bỏ qua", ("camera_id",))
+
+
+def _is_file_source(source) -> bool:
+    return isinstance(source, str) and os.path.isfile(source)
+
+
+def _camera_worker(camera_id: str, source, ring_name: str, slots: int, frame_shape: tuple,
+                   frame_dtype: str, policy: str, stop_event, restart_delay: float):
+    """
+    Tiến trình thu thập của một camera: đọc P1 và ghi frame vào ring buffer dùng chung.
+    Nguồn live bị mất kết nối sẽ được thử lại sau `restart_delay` giây.
+    """
+    from src.p1_acquisition.data_reader import DataAcquisition
+
+    ring = SharedFrameRing(ring_name, slots, frame_shape, dtype=frame_dtype, policy=policy)
+    acquisition = DataAcquisition(source=source, camera_id=camera_id)
+    try:
+        while not stop_event.is_set():
+            for packet in acquisition.get_stream():
+                if stop_event.is_set():
+                    break
+                ring.write(packet["processed_frame"], packet["metadata"])
+
+            # File video đã đọc hết thì dừng, nguồn live thì kết nối lại
+            if _is_file_source(source):
+                break
+            ring.touch()
+            stop_event.wait(restart_delay)
+    finally:
+        ring.close()
+
+
+def _inference_worker(ring_specs: Dict[str, dict], model_path: str, confidence_threshold: float,
+                      max_batch: int, max_wait: float, result_queue, stop_event):
+    """
+    Tiến trình inference trung tâm: duyệt vòng (round-robin) các ring buffer, gom tối đa
+    một frame mỗi camera thành lô và chạy ObjectDetector trực tiếp trên view shared memory.
+    Khi bật QOS, QoSScheduler quyết định camera nào được chạy YOLO và với kích thước input nào.
+    """
+    from src.p2_recognition.detector import ObjectDetector
+    from src.p2_recognition.scheduler import QoSScheduler, ScheduledDetector
+
+    detector = ObjectDetector(model_path=model_path, confidence_threshold=confidence_threshold)
+    if QOS["enabled"]:
+        detector = ScheduledDetector(detector, QoSScheduler(), scalable=detector.backend.input_size is None)
+    rings = {cid: SharedFrameRing(**spec) for cid, spec in ring_specs.items()}
+    batch_limit = min(max_batch, len(rings))
+    pending: Dict[str, tuple] = {}
+    first_at = 0.0
+    try:
+        while not stop_event.is_set():
+            for camera_id, ring in rings.items():
+                if camera_id in pending or len(pending) >= batch_limit:
+                    continue
+                item = ring.read()
+                if item is not None:
+                    if not pending:
+                        first_at = time.monotonic()
+                    pending[camera_id] = item
+
+            if not pending:
+                time.sleep(0.002)
+                continue
+            if len(pending) < batch_limit and time.monotonic() - first_at < max_wait:
+                time.sleep(0.0005)
+                continue
+
+            camera_ids = list(pending)
+            packets = [{"raw_frame": None, "processed_frame": pending[cid][1], "metadata": pending[cid][2]}
+                       for cid in camera_ids]
+            results = detector.detect_objects_batch(packets)
+
+            for camera_id, detections in zip(camera_ids, results):
+                ring = rings[camera_id]
+                seq = pending[camera_id][0]
+                # Frame bị ghi đè trong lúc inference thì kết quả không còn tin cậy
+                valid = ring.is_valid(seq)
+                ring.release(seq)
+                if not valid:
+                    continue
+                try:
+                    result_queue.put_nowait((camera_id, seq, detections))
+                except queue.Full:
+                    pass
+            pending.clear()
+    finally:
+        pending.clear()
+        for ring in rings.values():
+            ring.close()
+
+
+class CameraSupervisor:
+    def __init__(self, camera_config: Dict[str, Dict[str, Any]] = None, model_path: str = "yolov8n.pt",
+                 confidence_threshold: float = DETECTION_THRESHOLD, slots: int = FRAME_RING_SLOTS,
+                 frame_shape: Tuple[int, ...] = (640, 640, 3), frame_dtype=np.uint8,
+                 stall_timeout: float = CAMERA_STALL_TIMEOUT, restart_delay: float = CAMERA_RESTART_DELAY,
+                 max_batch: int = INFERENCE_MAX_BATCH, max_wait_ms: float = INFERENCE_MAX_WAIT_MS):
+        """
+        Supervisor đa camera: mỗi camera một tiến trình thu thập (P1),
+        một tiến trình ObjectDetector (P2) dùng chung, trao đổi frame qua shared memory.
+        :param camera_config: Cấu hình camera (mặc định CAMERA_CONFIG), mỗi camera cần khóa "source".
+        :param stall_timeout: Số giây không có heartbeat thì coi camera bị treo và khởi động lại.
+        """
+        self.camera_config = camera_config if camera_config is not None else CAMERA_CONFIG
+        self.model_path = model_path
+        self.conf_threshold = confidence_threshold
+        self.slots = slots
+        self.frame_shape = tuple(frame_shape)
+        self.frame_dtype = np.dtype(frame_dtype).str
+        self.stall_timeout = stall_timeout
+        self.restart_delay = restart_delay
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._ctx = mp.get_context("spawn")
+        self._stop_event = self._ctx.Event()
+        self._result_queue = self._ctx.Queue(maxsize=256)
+        self._rings: Dict[str, SharedFrameRing] = {}
+        self._camera_procs: Dict[str, mp.Process] = {}
+        self._started_at: Dict[str, float] = {}
+        self._restarts: Dict[str, int] = {}
+        self._dropped_reported: Dict[str, int] = {}
+        self._inference_proc: Optional[mp.Process] = None
+
+    def _ring_spec(self, camera_id: str) -> dict:
+        return {
+            "name": self._rings[camera_id].name,
+            "slots": self.slots,
+            "frame_shape": self.frame_shape,
+            "dtype": self.frame_dtype,
+            "policy": self._rings[camera_id].policy,
+        }
+
+    def _start_camera(self, camera_id: str):
+        cam_info = self.camera_config[camera_id]
+        spec = self._ring_spec(camera_id)
+        proc = self._ctx.Process(
+            target=_camera_worker,
+            args=(camera_id, cam_info.get("source", 0), spec["name"], spec["slots"], spec["frame_shape"],
+                  spec["dtype"], spec["policy"], self._stop_event, self.restart_delay),
+            name=f"P1-{camera_id}", daemon=True)
+        proc.start()
+        self._camera_procs[camera_id] = proc
+        self._started_at[camera_id] = time.time()
+
+    def _start_inference(self):
+        specs = {cid: self._ring_spec(cid) for cid in self._rings}
+        self._inference_proc = self._ctx.Process(
+            target=_inference_worker,
+            args=(specs, self.model_path, self.conf_threshold, self.max_batch, self.max_wait,
+                  self._result_queue, self._stop_event),
+            name="P2-inference", daemon=True)
+        self._inference_proc.start()
+
+    def start(self):
+        """Tạo ring buffer cho từng camera và khởi động toàn bộ tiến trình."""
+        for camera_id, cam_info in self.camera_config.items():
+            ring_name = f"shm_{os.getpid()}_{camera_id}"
+            self._rings[camera_id] = SharedFrameRing(
+                ring_name, self.slots, self.frame_shape, dtype=self.frame_dtype, create=True,
+                policy=cam_info.get("backpressure", "drop_oldest"))
+            self._restarts[camera_id] = 0
+            self._dropped_reported[camera_id] = 0
+
+        for camera_id in self._rings:
+            self._start_camera(camera_id)
+        self._start_inference()
+        print(f"[Supervisor] Đã khởi động {len(self._rings)} camera")
+
+    def monitor(self):
+        """
+        Khởi động lại tiến trình camera bị chết hoặc bị treo (không có heartbeat),
+        để một nguồn RTSP lỗi không ảnh hưởng các camera còn lại.
+        """
+        now = time.time()
+        for camera_id, proc in list(self._camera_procs.items()):
+            source = self.camera_config[camera_id].get("source", 0)
+            ring = self._rings[camera_id]
+            dropped = ring.dropped
+            if dropped > self._dropped_reported[camera_id]:
+                FRAMES_DROPPED.inc(camera_id, amount=dropped - self._dropped_reported[camera_id])
+                self._dropped_reported[camera_id] = dropped
+
+            last_beat = max(ring.heartbeat, self._started_at[camera_id])
+            stalled = proc.is_alive() and (now - last_beat) > self.stall_timeout
+
+            if stalled:
+                print(f"[Supervisor] Camera {camera_id} bị treo, khởi động lại")
+                proc.terminate()
+                proc.join(timeout=1)
+            elif proc.is_alive() or _is_file_source(source):
+                continue
+
+            self._restarts[camera_id] += 1
+            self._start_camera(camera_id)
+
+        if self._inference_proc is not None and not self._inference_proc.is_alive():
+            print("[Supervisor] Tiến trình inference dừng bất thường, khởi động lại")
+            self._start_inference()
+
+    def results(self, timeout: float = 0.5) -> Generator[Tuple[str, List[Any]], None, None]:
+        """
+        Generator trả về (camera_id, danh sách DetectionResult) theo thứ tự hoàn thành.
+        """
+        last_check = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                camera_id, _, detections = self._result_queue.get(timeout=timeout)
+                yield camera_id, detections
+            except queue.Empty:
+                pass
+
+            if time.monotonic() - last_check > 1.0:
+                self.monitor()
+                last_check = time.monotonic()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Thống kê theo camera: số frame đã ghi, số frame bị bỏ, số lần khởi động lại."""
+        return {
+            camera_id: {
+                "written": ring.written,
+                "dropped": ring.dropped,
+                "restarts": self._restarts[camera_id],
+                "alive": self._camera_procs[camera_id].is_alive(),
+            }
+            for camera_id, ring in self._rings.items()
+        }
+
+    def stop(self):
+        self._stop_event.set()
+        procs = list(self._camera_procs.values())
+        if self._inference_proc is not None:
+            procs.append(self._inference_proc)
+        for proc in procs:
+            proc.join(timeout=2)
+            if proc.is_alive():
+                proc.terminate()
+        for ring in self._rings.values():
+            ring.close(unlink=True)
+        self._rings.clear()
+        print("[Supervisor] Đã dừng toàn bộ tiến trình")
+
+
+# --- Đoạn mã chạy thử nghiệm (Supervisor đa camera) ---
+if __name__ == "__main__":
+    supervisor = CameraSupervisor()
+    supervisor.start()
+    try:
+        for camera_id, detections in supervisor.results():
+            for det in detections:
+                print(f"[{camera_id}] {det.class_name} ({det.position}) {det.confidence:.2f}")
+    except KeyboardInterrupt:
+        print(supervisor.stats())
+    finally:
+        supervisor.stop()
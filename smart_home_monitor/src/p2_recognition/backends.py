@@ -0,0 +1,362 @@
+# src/p2_recognition/backends.py
+
+import os
+import ast
+import time
+import cv2
+import numpy as np
+from typing import Dict, List, Optional
+from src.utils.helpers import calculate_iou_matrix
+
+BACKENDS = ("ultralytics", "onnxruntime", "openvino")
+NMS_IOU_THRESHOLD = 0.7  # Ngưỡng NMS mặc định của YOLOv8
+
+
+class InferenceBackend:
+    """
+    Giao diện chung của các backend inference.
+    predict() nhận danh sách ảnh letterbox uint8 (BGR, input_size x input_size) và trả về,
+    cho mỗi ảnh, mảng (N, 6) [x1, y1, x2, y2, conf, class_id] theo tọa độ ảnh đầu vào.
+    """
+    name = ""
+
+    def __init__(self):
+        self.names: Dict[int, str] = {}
+        # Kích thước input cố định của model (None: nhận mọi kích thước, vd để hạ xuống 320 khi quá tải)
+        self.input_size: Optional[int] = None
+
+    def predict(self, images: List[np.ndarray], conf: float) -> List[np.ndarray]:
+        raise NotImplementedError
+
+
+class UltralyticsBackend(InferenceBackend):
+    """PyTorch eager qua ultralytics.YOLO (cách cũ), nhận file .pt."""
+    name = "ultralytics"
+
+    def __init__(self, model_path: str):
+        super().__init__()
+        from ultralytics import YOLO
+
+        self.model = YOLO(model_path)
+        self.names = dict(self.model.names)
+
+    def predict(self, images: List[np.ndarray], conf: float) -> List[np.ndarray]:
+        if not images:
+            return []
+        # imgsz theo ảnh đầu vào để ảnh đã thu nhỏ (vd 320) không bị phóng lại lên 640
+        results = self.model.predict(source=images, conf=conf, imgsz=images[0].shape[0], verbose=False)
+        outputs = []
+        for r in results:
+            boxes = r.boxes
+            if len(boxes) == 0:
+                outputs.append(np.empty((0, 6), dtype=np.float32))
+                continue
+            outputs.append(np.concatenate([
+                boxes.xyxy.cpu().numpy().reshape(-1, 4),
+                boxes.conf.cpu().numpy().reshape(-1, 1),
+                boxes.cls.cpu().numpy().reshape(-1, 1)
+            ], axis=1).astype(np.float32))
+        return outputs
+
+
+class _RawYoloBackend(InferenceBackend):
+    """
+    Phần chung cho model YOLOv8 đã export (ONNX/OpenVINO): tự chuẩn hóa đầu vào
+    và giải mã đầu ra thô (1, 4 + num_classes, num_anchors) kèm NMS theo từng lớp.
+    """
+
+    def __init__(self, batch_size: Optional[int]):
+        super().__init__()
+        # None: model nhận batch động; số nguyên: batch cố định (thường là 1)
+        self.batch_size = batch_size
+
+    def _forward(self, blob: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    @staticmethod
+    def _blob(images: List[np.ndarray]) -> np.ndarray:
+        # BGR HWC -> RGB float32 NCHW [0, 1], giống tiền xử lý của ultralytics
+        # (ảnh chế độ "stretch" đã là float32 [0, 1] nên không chia lại)
+        batch = np.stack(images)
+        blob = np.ascontiguousarray(batch[..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32)
+        return blob / 255.0 if batch.dtype == np.uint8 else blob
+
+    @staticmethod
+    def _decode(raw: np.ndarray, conf: float) -> np.ndarray:
+        preds = raw.T  # (num_anchors, 4 + num_classes)
+        scores = preds[:, 4:]
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+        keep = confidences >= conf
+        if not keep.any():
+            return np.empty((0, 6), dtype=np.float32)
+
+        cx, cy, w, h = preds[keep, :4].T
+        boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+        confidences, class_ids = confidences[keep], class_ids[keep]
+
+        # NMS theo từng lớp: dịch bbox mỗi lớp ra một vùng riêng rồi NMS một lần
+        offset = class_ids[:, None] * 4096.0
+        shifted = boxes + offset
+        rects = np.concatenate([shifted[:, :2], shifted[:, 2:] - shifted[:, :2]], axis=1)
+        indices = cv2.dnn.NMSBoxes(rects.tolist(), confidences.tolist(), conf, NMS_IOU_THRESHOLD)
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+
+        return np.concatenate([boxes[indices], confidences[indices, None],
+                               class_ids[indices, None].astype(np.float32)], axis=1).astype(np.float32)
+
+    def predict(self, images: List[np.ndarray], conf: float) -> List[np.ndarray]:
+        if not images:
+            return []
+        step = self.batch_size or len(images)
+        outputs = []
+        for i in range(0, len(images), step):
+            raw = self._forward(self._blob(images[i:i + step]))
+            outputs.extend(self._decode(r, conf) for r in raw)
+        return outputs
+
+
+def _parse_names(value) -> Dict[int, str]:
+    """Metadata 'names' do ultralytics ghi khi export: dict hoặc chuỗi dạng dict."""
+    if isinstance(value, str):
+        value = ast.literal_eval(value)
+    return {int(k): v for k, v in (value or {}).items()}
+
+
+class OnnxRuntimeBackend(_RawYoloBackend):
+    """Model .onnx (FP32 hoặc INT8 đã lượng tử hóa) chạy bằng ONNX Runtime trên CPU."""
+    name = "onnxruntime"
+
+    def __init__(self, model_path: str, num_threads: int = 0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+        batch_dim, _, height, _ = self.session.get_inputs()[0].shape
+        super().__init__(batch_dim if isinstance(batch_dim, int) else None)
+        self.input_size = height if isinstance(height, int) else None
+        self.names = _parse_names(self.session.get_modelmeta().custom_metadata_map.get("names"))
+
+    def _forward(self, blob: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVINOBackend(_RawYoloBackend):
+    """Thư mục *_openvino_model (hoặc file .xml) do ultralytics export, chạy bằng OpenVINO trên CPU."""
+    name = "openvino"
+
+    def __init__(self, model_path: str):
+        import openvino as ov
+
+        xml_path = model_path
+        if os.path.isdir(model_path):
+            xml_path = next(os.path.join(model_path, f) for f in os.listdir(model_path) if f.endswith(".xml"))
+
+        core = ov.Core()
+        model = core.read_model(xml_path)
+        self.compiled = core.compile_model(model, "CPU", {"PERFORMANCE_HINT": "LATENCY"})
+        self.output = self.compiled.output(0)
+
+        shape = model.input(0).get_partial_shape()
+        super().__init__(shape[0].get_length() if shape[0].is_static else None)
+        self.input_size = shape[2].get_length() if shape[2].is_static else None
+
+        metadata_path = os.path.join(os.path.dirname(xml_path), "metadata.yaml")
+        if os.path.exists(metadata_path):
+            import yaml
+
+            with open(metadata_path, "r", encoding="utf-8") as f:
+                self.names = _parse_names(yaml.safe_load(f).get("names"))
+
+    def _forward(self, blob: np.ndarray) -> np.ndarray:
+        return self.compiled([blob])[self.output]
+
+
+def resolve_backend(model_path: str) -> str:
+    """Chọn backend theo định dạng model: .pt -> ultralytics, .onnx -> onnxruntime, OpenVINO IR -> openvino."""
+    path = model_path.rstrip("/\\")
+    if path.endswith(".onnx"):
+        return "onnxruntime"
+    if path.endswith(".xml") or path.endswith("_openvino_model"):
+        return "openvino"
+    return "ultralytics"
+
+
+def create_backend(model_path: str, backend: str = "auto") -> InferenceBackend:
+    if backend == "auto":
+        backend = resolve_backend(model_path)
+    if backend == "ultralytics":
+        return UltralyticsBackend(model_path)
+    if backend == "onnxruntime":
+        return OnnxRuntimeBackend(model_path)
+    if backend == "openvino":
+        return OpenVINOBackend(model_path)
+    raise ValueError(f"Backend không hợp lệ: {backend} (chọn một trong {BACKENDS} hoặc 'auto')")
+
+
+def export_model(model_path: str = "yolov8n.pt", fmt: str = "onnx", input_size: int = 640) -> str:
+    """Export model .pt sang ONNX hoặc OpenVINO IR bằng ultralytics, trả về đường dẫn model mới."""
+    from ultralytics import YOLO
+
+    return YOLO(model_path).export(format=fmt, imgsz=input_size)
+
+
+def _calibration_frames(video_paths: List[str], max_frames: int, input_size: int) -> List[np.ndarray]:
+    """Lấy mẫu đều các frame letterbox từ video ghi sẵn để hiệu chỉnh lượng tử hóa."""
+    from src.p1_acquisition.data_reader import DataAcquisition
+
+    per_video = max(1, max_frames // max(1, len(video_paths)))
+    frames = []
+    for path in video_paths:
+        cap = cv2.VideoCapture(path)
+        try:
+            total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or per_video
+        finally:
+            cap.release()
+        stride = max(1, total // per_video)
+        acquisition = DataAcquisition(source=path, camera_id="CALIB", input_size=input_size, threaded=False)
+        stream = acquisition.get_stream()
+        taken = 0
+        try:
+            for i, packet in enumerate(stream):
+                if i % stride == 0:
+                    frames.append(packet["processed_frame"].copy())
+                    taken += 1
+                if taken >= per_video:
+                    break
+        finally:
+            # Đóng generator ngay để giải phóng VideoCapture của DataAcquisition
+            stream.close()
+    return frames
+
+
+def quantize_onnx_int8(onnx_path: str, video_paths: List[str], output_path: Optional[str] = None,
+                       max_frames: int = 200, input_size: int = 640) -> str:
+    """
+    Lượng tử hóa tĩnh INT8 (post-training) model ONNX, hiệu chỉnh trên frame thật từ camera của mình.
+    :param video_paths: Các video ghi sẵn từ camera dùng làm dữ liệu hiệu chỉnh.
+    :return: Đường dẫn model INT8.
+    """
+    from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                          quantize_static)
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    output_path = output_path or onnx_path.replace(".onnx", "_int8.onnx")
+    frames = _calibration_frames(video_paths, max_frames, input_size)
+    if not frames:
+        raise ValueError("Không đọc được frame hiệu chỉnh nào từ video")
+
+    import onnxruntime as ort
+
+    input_name = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class _FrameReader(CalibrationDataReader):
+        def __init__(self):
+            self._iter = iter(frames)
+
+        def get_next(self):
+            frame = next(self._iter, None)
+            return None if frame is None else {input_name: _RawYoloBackend._blob([frame])}
+
+    prepared_path = output_path.replace(".onnx", "_prep.onnx")
+    quant_pre_process(onnx_path, prepared_path)
+    quantize_static(prepared_path, output_path, _FrameReader(), quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, per_channel=True)
+    os.remove(prepared_path)
+
+    # Giữ metadata (tên lớp) của model gốc
+    import onnx
+
+    source_meta = {p.key: p.value for p in onnx.load(onnx_path, load_external_data=False).metadata_props}
+    quantized = onnx.load(output_path)
+    onnx.helper.set_model_props(quantized, source_meta)
+    onnx.save(quantized, output_path)
+    print(f"[P2] Đã lượng tử hóa INT8 trên {len(frames)} frame: {output_path}")
+    return output_path
+
+
+def _agreement(reference: np.ndarray, candidate: np.ndarray, iou_threshold: float = 0.5) -> tuple:
+    """Số cặp khớp (cùng lớp, IoU >= ngưỡng, ghép tham lam), số bbox tham chiếu, số bbox ứng viên."""
+    if len(reference) == 0 or len(candidate) == 0:
+        return 0, len(reference), len(candidate)
+    iou = calculate_iou_matrix(reference[:, :4], candidate[:, :4])
+    iou[reference[:, 5, None] != candidate[None, :, 5]] = 0.0
+    matched = 0
+    while True:
+        i, j = np.unravel_index(np.argmax(iou), iou.shape)
+        if iou[i, j] < iou_threshold:
+            break
+        matched += 1
+        iou[i, :] = 0.0
+        iou[:, j] = 0.0
+    return matched, len(reference), len(candidate)
+
+
+def compare_backends(video_path: str, models: Dict[str, str], frames: int = 300, conf: float = 0.5,
+                     input_size: int = 640) -> Dict[str, Dict[str, float]]:
+    """
+    Báo cáo độ chính xác - tốc độ trên cùng một đoạn video.
+    Backend đầu tiên trong `models` (thường là PyTorch .pt) được dùng làm tham chiếu:
+    precision/recall là mức trùng khớp detection của từng backend so với tham chiếu.
+    :param models: {tên hiển thị: đường dẫn model}, vd {"pytorch": "yolov8n.pt", "onnx_int8": "yolov8n_int8.onnx"}
+    """
+    from src.p1_acquisition.data_reader import DataAcquisition
+
+    acquisition = DataAcquisition(source=video_path, camera_id="BENCH", input_size=input_size, threaded=False)
+    clip = []
+    for packet in acquisition.get_stream():
+        clip.append(packet["processed_frame"].copy())
+        if len(clip) >= frames:
+            break
+
+    report, reference = {}, None
+    for label, path in models.items():
+        backend = create_backend(path)
+        backend.predict(clip[:1], conf)  # Khởi động (warmup)
+
+        timings, outputs = [], []
+        for image in clip:
+            start = time.perf_counter()
+            outputs.append(backend.predict([image], conf)[0])
+            timings.append(time.perf_counter() - start)
+        if reference is None:
+            reference = outputs
+
+        matched = ref_total = cand_total = 0
+        for ref, cand in zip(reference, outputs):
+            m, r, c = _agreement(ref, cand)
+            matched, ref_total, cand_total = matched + m, ref_total + r, cand_total + c
+
+        ms = np.asarray(timings) * 1000.0
+        report[label] = {
+            "backend": backend.name,
+            "mean_ms": float(ms.mean()),
+            "p95_ms": float(np.percentile(ms, 95)),
+            "fps": float(1000.0 / ms.mean()),
+            "detections": cand_total,
+            "precision": matched / cand_total if cand_total else 1.0,
+            "recall": matched / ref_total if ref_total else 1.0,
+        }
+    return report
+
+
+# --- Đoạn mã chạy thử nghiệm: export, lượng tử hóa và so sánh backend ---
+if __name__ == "__main__":
+    import sys
+
+    video = sys.argv[1] if len(sys.argv) > 1 else "data/input_videos/test_sample.mp4"
+    onnx_path = export_model("yolov8n.pt", "onnx")
+    openvino_path = export_model("yolov8n.pt", "openvino")
+    int8_path = quantize_onnx_int8(onnx_path, [video])
+
+    report = compare_backends(video, {"pytorch": "yolov8n.pt", "onnx": onnx_path,
+                                      "onnx_int8": int8_path, "openvino": openvino_path})
+    print(f"{'Model':<12}{'Backend':<14}{'ms':>8}{'p95':>8}{'FPS':>8}{'Prec':>7}{'Recall':>8}")
+    for label, r in report.items():
+        print(f"{label:<12}{r['backend']:<14}{r['mean_ms']:>8.2f}{r['p95_ms']:>8.2f}{r['fps']:>8.1f}"
+              f"{r['precision']:>7.2f}{r['recall']:>8.2f}")
@@ -0,0 +1,163 @@
+# src/p2_recognition/batcher.py
+
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, List, Optional
+from configs.config import INFERENCE_MAX_BATCH, INFERENCE_MAX_WAIT_MS
+
+
+@dataclass
+class BatchStats:
+    """Thống kê của một lô inference (dùng để cân bằng throughput và độ trễ)."""
+    batch_size: int
+    mean_queue_wait: float    # Giây chờ trung bình trong hàng đợi trước khi vào lô
+    max_queue_wait: float
+    inference_time: float     # Giây cho một lần forward
+
+
+class DynamicBatcher:
+    def __init__(self, detector, max_batch_size: int = INFERENCE_MAX_BATCH,
+                 max_wait_ms: float = INFERENCE_MAX_WAIT_MS,
+                 on_result: Optional[Callable[[str, list], None]] = None, history: int = 1000):
+        """
+        Gom packet từ nhiều luồng DataAcquisition thành lô (dynamic micro-batching).
+        Một lô được chạy khi đủ max_batch_size packet hoặc packet đầu tiên đã chờ quá max_wait_ms.
+        :param detector: ObjectDetector có hàm detect_objects_batch.
+        :param on_result: Callback (camera_id, detections) được gọi cho từng packet sau inference.
+        """
+        self.detector = detector
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.on_result = on_result
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._stop_event = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._feeders: List[threading.Thread] = []
+        self.stats: Deque[BatchStats] = deque(maxlen=history)
+
+    def start(self):
+        self._stop_event.clear()
+        self._worker = threading.Thread(target=self._run, name="P2-batcher", daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._worker is not None:
+            self._worker.join(timeout=2)
+
+    def submit(self, data_packet: dict) -> Future:
+        """
+        Đưa một packet vào hàng đợi.
+        :return: Future nhận danh sách DetectionResult của packet này.
+        """
+        future = Future()
+        self._queue.put((time.monotonic(), data_packet, future))
+        return future
+
+    def attach_stream(self, acquisition) -> threading.Thread:
+        """
+        Chạy get_stream() của một camera trên luồng riêng và đẩy từng packet vào batcher.
+        Mỗi camera chỉ có một packet đang chờ, nên camera chậm không làm nghẽn camera khác.
+        """
+        def _feed():
+            for packet in acquisition.get_stream():
+                if self._stop_event.is_set():
+                    break
+                self.submit(packet).result()
+
+        feeder = threading.Thread(target=_feed, name=f"P1-{acquisition.camera_id}", daemon=True)
+        feeder.start()
+        self._feeders.append(feeder)
+        return feeder
+
+    def _collect(self) -> list:
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = first[0] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                # Hết hạn chờ thì vẫn lấy các packet đã có sẵn trong hàng đợi
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+
+            started = time.monotonic()
+            waits = [started - enqueued for enqueued, _, _ in batch]
+            packets = [packet for _, packet, _ in batch]
+            try:
+                results = self.detector.detect_objects_batch(packets)
+                self.stats.append(BatchStats(
+                    batch_size=len(batch),
+                    mean_queue_wait=sum(waits) / len(waits),
+                    max_queue_wait=max(waits),
+                    inference_time=time.monotonic() - started,
+                ))
+
+                # Trả kết quả về đúng camera
+                for (_, packet, future), detections in zip(batch, results):
+                    if self.on_result is not None:
+                        self.on_result(packet["metadata"]["camera_id"], detections)
+                    future.set_result(detections)
+            except Exception as e:
+                # Lỗi ở backend hoặc on_result: mọi future chưa có kết quả đều nhận lỗi để luồng chờ .result() không treo
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def summary(self) -> Dict[str, float]:
+        """Tổng hợp thống kê các lô gần nhất."""
+        if not self.stats:
+            return {"batches": 0}
+        stats = list(self.stats)
+        waits = sorted(s.max_queue_wait for s in stats)
+        return {
+            "batches": len(stats),
+            "mean_batch_size": sum(s.batch_size for s in stats) / len(stats),
+            "mean_queue_wait_ms": 1000 * sum(s.mean_queue_wait for s in stats) / len(stats),
+            "p95_queue_wait_ms": 1000 * waits[int(0.95 * (len(waits) - 1))],
+            "mean_inference_ms": 1000 * sum(s.inference_time for s in stats) / len(stats),
+        }
+
+
+# --- Đoạn mã chạy thử nghiệm (Dynamic batching nhiều camera) ---
+if __name__ == "__main__":
+    from configs.config import CAMERA_CONFIG
+    from src.p1_acquisition.data_reader import DataAcquisition
+    from src.p2_recognition.detector import ObjectDetector
+
+    def _print_result(camera_id, detections):
+        for det in detections:
+            print(f"[{camera_id}] {det.class_name} ({det.position})")
+
+    batcher = DynamicBatcher(ObjectDetector(), on_result=_print_result)
+    batcher.start()
+    feeders = [batcher.attach_stream(DataAcquisition(source=cfg.get("source", 0), camera_id=cid))
+               for cid, cfg in CAMERA_CONFIG.items()]
+    try:
+        for feeder in feeders:
+            feeder.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        batcher.stop()
+        print(batcher.summary())
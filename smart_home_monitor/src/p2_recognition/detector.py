@@ -1,23 +1,41 @@
 # src/p2_recognition/detector.py
 
-from ultralytics import YOLO
+import time
 import numpy as np
 from typing import List
-from src.utils.helpers import DetectionResult  # Sử dụng Class đã định nghĩa ở Bước 1
+from configs.config import INFERENCE_BACKEND
+from src.p2_recognition.backends import create_backend
+from src.p2_recognition.model_registry import MODELS
+from src.utils.helpers import DetectionBatch, DetectionView  # Sử dụng Class đã định nghĩa ở Bước 1
+from src.utils.metrics import REGISTRY
+from src.utils.zones import zone_map_for, NO_ZONE
+
+# Ngưỡng relative_y giữa các vị trí high | mid | low | floor (Trang 22)
+POSITION_THRESHOLDS = (0.3, 0.5, 0.8)
+
+INFERENCE_SECONDS = REGISTRY.histogram("p2_inference_seconds", "Thời gian một lần forward YOLO")
+BATCH_SIZE = REGISTRY.histogram("p2_batch_size", "Số ảnh trong một lần forward", buckets=(1, 2, 4, 8, 16, 32))
+DETECTIONS_PER_FRAME = REGISTRY.histogram("p2_detections_per_frame", "Số vật thể nhận diện được mỗi frame",
+                                          ("camera_id",), buckets=(0, 1, 2, 5, 10, 20, 50))
 
 class ObjectDetector:
-    def __init__(self, model_path: str = "yolov8n.pt", confidence_threshold: float = 0.5):
+    def __init__(self, model_path: str = "yolov8n.pt", confidence_threshold: float = 0.5,
+                 backend: str = INFERENCE_BACKEND, shared: bool = True):
         """
         Khởi tạo Module P2: Nhận diện vật thể.
-        :param model_path: Đường dẫn tới trọng số YOLOv8.
+        :param model_path: Đường dẫn tới trọng số YOLOv8 (.pt, .onnx hoặc thư mục *_openvino_model).
         :param confidence_threshold: Ngưỡng tin cậy để lọc các nhận diện nhiễu (Node P2.2).
+        :param backend: "ultralytics", "onnxruntime", "openvino" hoặc "auto" (chọn theo định dạng model).
+        :param shared: True để lấy model từ registry dùng chung (tải + warmup một lần cho cả tiến trình),
+                       False để tải một bản riêng.
         """
         # Node P2.1: Load model YOLOv8 (Trang 11, 22)
         try:
-            self.model = YOLO(model_path)
+            self.backend = MODELS.get(model_path, backend) if shared else create_backend(model_path, backend)
         except Exception as e:
             print(f"[Error] Không thể tải model: {e}")
             raise
+        self.names = self.backend.names
 
         self.conf_threshold = confidence_threshold
 
@@ -39,56 +57,114 @@ class ObjectDetector:
         else:
             return "high"
 
-    def detect_objects(self, data_packet: dict) -> List[DetectionResult]:
+    def _classify_positions(self, y1: np.ndarray, y2: np.ndarray, frame_height: int) -> np.ndarray:
+        """
+        Phiên bản vector hóa của _classify_position cho cả frame.
+        :return: Mảng mã vị trí (chỉ số trong POSITIONS: 0 floor, 1 low, 2 mid, 3 high).
+        """
+        relative_y = (y1 + y2) / (2.0 * frame_height)
+        # Số ngưỡng (0.3, 0.5, 0.8) mà relative_y vượt qua: 3 -> floor, ..., 0 -> high
+        return (3 - np.searchsorted(POSITION_THRESHOLDS, relative_y, side="left")).astype(np.uint8)
+
+    def position_of(self, bbox: List[int], metadata: dict) -> str:
+        """
+        Vị trí của một bbox (theo khung hình gốc): tra mask vùng nếu camera đã hiệu chỉnh,
+        ngoài mọi vùng hoặc chưa hiệu chỉnh thì dùng ngưỡng relative_y.
+        """
+        zone_map = zone_map_for(metadata.get("camera_id"))
+        if zone_map is not None:
+            position = zone_map.position_of(bbox, metadata["frame_width"], metadata["frame_height"])
+            if position is not None:
+                return position
+        return self._classify_position(bbox[1], bbox[3], metadata["frame_height"])
+
+    def _parse_result(self, boxes: np.ndarray, metadata: dict) -> DetectionBatch:
+        """
+        Chuyển kết quả của một ảnh (mảng [x1, y1, x2, y2, conf, class_id] từ backend)
+        thành DetectionBatch; ánh xạ tọa độ và phân loại vị trí tính trên cả mảng một lần.
+        """
+        frame_h = metadata["frame_height"]
+        frame_w = metadata["frame_width"]
+        letterbox = metadata.get("letterbox")
+        input_size = metadata.get("input_size", 640)
+        # Vùng ảnh đã đưa vào model (ROI) theo khung hình gốc
+        roi = metadata.get("roi") or (0, 0, frame_w, frame_h)
+        offset = (roi[0], roi[1], roi[0], roi[1])
+        # Lưu ý: tọa độ bbox (định dạng xyxy) tương ứng với ảnh đầu vào (640x640)
+        xyxy = boxes[:, :4].astype(np.float64)
+
+        if letterbox is not None:
+            # Ánh xạ ngược chính xác từ ảnh letterbox: bỏ phần đệm rồi chia tỉ lệ
+            scale, pad_x, pad_y = letterbox
+            original = (xyxy - (pad_x, pad_y, pad_x, pad_y)) / scale + offset
+            np.clip(original, offset, (roi[2] - 1, roi[3] - 1, roi[2] - 1, roi[3] - 1), out=original)
+            original_bbox = original.astype(np.int32)
+            # Tính toán vị trí (Node P2.3) trên tọa độ khung hình gốc
+            positions = self._classify_positions(original_bbox[:, 1], original_bbox[:, 3], frame_h)
+        else:
+            # Chuyển đổi tọa độ ngược lại kích thước raw_frame để vẽ sau này
+            scale_x = (roi[2] - roi[0]) / input_size
+            scale_y = (roi[3] - roi[1]) / input_size
+            original_bbox = (xyxy * (scale_x, scale_y, scale_x, scale_y) + offset).astype(np.int32)
+
+            # Tính toán vị trí (Node P2.3)
+            if metadata.get("roi") is None:
+                # Dùng y1, y2 trên khung hình 640 để tính tỉ lệ relative_y
+                positions = self._classify_positions(xyxy[:, 1], xyxy[:, 3], input_size)
+            else:
+                positions = self._classify_positions(original_bbox[:, 1], original_bbox[:, 3], frame_h)
+
+        # Camera đã hiệu chỉnh vùng: tra mask vùng, điểm ngoài mọi vùng giữ kết quả theo ngưỡng
+        zone_map = zone_map_for(metadata.get("camera_id"))
+        if zone_map is not None and len(original_bbox):
+            codes = zone_map.position_codes(original_bbox, frame_w, frame_h)
+            positions = np.where(codes != NO_ZONE, codes, positions).astype(np.uint8)
+
+        return DetectionBatch(
+            boxes=original_bbox,
+            scores=boxes[:, 4].astype(np.float32),
+            class_ids=boxes[:, 5].astype(np.int32),
+            position_codes=positions,
+            names=self.names,
+            metadata=metadata
+        )
+
+    def detect_objects(self, data_packet: dict) -> List[DetectionView]:
         """
         Thực hiện nhận diện và phân loại vị trí.
         :param data_packet: Packet từ Module P1 chứa processed_frame và metadata.
-        :return: Danh sách các đối tượng DetectionResult.
+        :return: Danh sách các vật thể (DetectionView, cùng thuộc tính với DetectionResult).
         """
-        # Đầu vào là processed_frame (640x640) từ P1
-        img = data_packet["processed_frame"]
-        frame_h = data_packet["metadata"]["frame_height"]
-        frame_w = data_packet["metadata"]["frame_width"]
+        return self.detect_objects_batch([data_packet])[0]
 
-        # 1. Chạy Inference (Dự đoán)
-        # Chúng ta chạy trên ảnh 640x640 đã chuẩn hóa
-        results = self.model.predict(source=img, conf=self.conf_threshold, verbose=False)
-        
-        detections = []
-        
-        # 2. Xử lý kết quả trả về từ YOLOv8
-        for r in results:
-            boxes = r.boxes
-            for box in boxes:
-                # Lấy tọa độ bbox (định dạng xyxy)
-                # Lưu ý: YOLOv8 trả về tọa độ tương ứng với ảnh đầu vào (640x640)
-                # Để phân loại vị trí chính xác, ta dùng tọa độ pixel chuẩn hóa
-                x1, y1, x2, y2 = box.xyxy[0].tolist()
-                
-                # Tính toán vị trí (Node P2.3)
-                # Dùng y1, y2 trên khung hình 640 để tính tỉ lệ relative_y
-                position = self._classify_position(y1, y2, 640) 
-
-                # Chuyển đổi tọa độ ngược lại kích thước raw_frame để vẽ sau này
-                scale_x = frame_w / 640
-                scale_y = frame_h / 640
-                original_bbox = [
-                    int(x1 * scale_x), int(y1 * scale_y), 
-                    int(x2 * scale_x), int(y2 * scale_y)
-                ]
-
-                # Tạo đối tượng DetectionResult (Trang 3)
-                obj = DetectionResult(
-                    class_name=self.model.names[int(box.cls)],
-                    confidence=float(box.conf),
-                    bbox=original_bbox,
-                    position=position,
-                    metadata=data_packet["metadata"]
-                )
-                
-                detections.append(obj)
-
-        return detections
+    def detect_objects_batch(self, data_packets: List[dict]) -> List[List[DetectionView]]:
+        """
+        Nhận diện nhiều packet (có thể từ nhiều camera) trong một lần forward.
+        :param data_packets: Danh sách packet từ Module P1.
+        :return: Danh sách kết quả (DetectionView, dùng như DetectionResult), cùng thứ tự với data_packets.
+        """
+        return [list(batch) for batch in self.detect_batches(data_packets)]
+
+    def detect_batches(self, data_packets: List[dict]) -> List[DetectionBatch]:
+        """
+        Như detect_objects_batch nhưng trả về DetectionBatch (struct-of-arrays) cho mỗi packet,
+        không tạo đối tượng riêng cho từng vật thể.
+        """
+        if not data_packets:
+            return []
+
+        # Chạy Inference theo lô trên các ảnh 640x640 từ P1
+        # (ảnh uint8 letterbox: YOLO tự chuẩn hóa, không cần chia 255 lần nữa)
+        images = [packet["processed_frame"] for packet in data_packets]
+        start = time.perf_counter()
+        results = self.backend.predict(images, self.conf_threshold)
+        INFERENCE_SECONDS.observe(time.perf_counter() - start)
+        BATCH_SIZE.observe(len(images))
+
+        batches = [self._parse_result(r, packet["metadata"]) for r, packet in zip(results, data_packets)]
+        for batch, packet in zip(batches, data_packets):
+            DETECTIONS_PER_FRAME.observe(len(batch), packet["metadata"].get("camera_id"))
+        return batches
 
 # --- Đoạn mã chạy thử nghiệm (Unit Test cho Module P2) ---
 if __name__ == "__main__":
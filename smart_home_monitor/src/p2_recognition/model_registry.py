@@ -0,0 +1,84 @@
+# src/p2_recognition/model_registry.py
+
+import time
+import threading
+import numpy as np
+from typing import Dict, List, Tuple
+from src.p2_recognition.backends import InferenceBackend, create_backend, resolve_backend
+from src.utils.metrics import REGISTRY
+
+MODEL_LOAD_SECONDS = REGISTRY.histogram("p2_model_load_seconds", "Thời gian tải + warmup model",
+                                        ("model",), buckets=(0.1, 0.5, 1, 2, 5, 10, 30, 60))
+
+
+class SharedModel(InferenceBackend):
+    """
+    Backend dùng chung giữa nhiều ObjectDetector (nhiều camera/phiên dashboard).
+    Các lần forward được tuần tự hóa bằng khóa vì model PyTorch/ONNX không đảm bảo an toàn đa luồng.
+    """
+
+    def __init__(self, backend: InferenceBackend, load_seconds: float, warmup_seconds: float):
+        super().__init__()
+        self.backend = backend
+        self.name = backend.name
+        self.names = backend.names
+        self.input_size = backend.input_size
+        self.load_seconds = load_seconds      # Thời gian đọc trọng số từ đĩa
+        self.warmup_seconds = warmup_seconds  # Thời gian lần forward đầu tiên (khởi tạo kernel, cấp phát bộ nhớ)
+        self._lock = threading.Lock()
+
+    def predict(self, images: List[np.ndarray], conf: float) -> List[np.ndarray]:
+        with self._lock:
+            return self.backend.predict(images, conf)
+
+
+class ModelRegistry:
+    def __init__(self, warmup_size: int = 640):
+        """
+        Registry model cho cả tiến trình: mỗi (model, backend) chỉ được tải và warmup một lần,
+        các ObjectDetector sau dùng lại bản đã tải thay vì đọc lại trọng số từ đĩa.
+        :param warmup_size: Kích thước ảnh giả (input_size của P1) dùng cho lần forward warmup.
+        """
+        self.warmup_size = warmup_size
+        self._models: Dict[Tuple[str, str], SharedModel] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_path: str, backend: str = "auto") -> SharedModel:
+        if backend == "auto":
+            backend = resolve_backend(model_path)
+        key = (model_path, backend)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        # Giữ khóa trong lúc tải để hai camera khởi động cùng lúc không tải trùng một model
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                model = self._models[key] = self._load(model_path, backend)
+        return model
+
+    def _load(self, model_path: str, backend: str) -> SharedModel:
+        started = time.perf_counter()
+        loaded = create_backend(model_path, backend)
+        load_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        size = loaded.input_size or self.warmup_size
+        loaded.predict([np.zeros((size, size, 3), dtype=np.uint8)], conf=0.5)
+        warmup_seconds = time.perf_counter() - started
+
+        MODEL_LOAD_SECONDS.observe(load_seconds + warmup_seconds, model_path)
+        print(f"[P2] Đã tải model {model_path} ({backend}) trong {load_seconds:.2f} s, "
+              f"warmup {warmup_seconds:.2f} s")
+        return SharedModel(loaded, load_seconds, warmup_seconds)
+
+    def stats(self) -> List[dict]:
+        """Thời gian tải/warmup của các model đã nạp (hiển thị lúc khởi động)."""
+        return [{"model": path, "backend": backend, "load_seconds": model.load_seconds,
+                 "warmup_seconds": model.warmup_seconds}
+                for (path, backend), model in list(self._models.items())]
+
+
+# Registry dùng chung cho cả tiến trình
+MODELS = ModelRegistry()
@@ -0,0 +1,154 @@
+# src/p2_recognition/motion_gate.py
+
+import cv2
+import numpy as np
+from typing import Dict, List, Optional
+from configs.config import CAMERA_CONFIG, MOTION_GATE
+from src.utils.helpers import DetectionResult
+
+
+class _CameraMotionState:
+    """Trạng thái lọc chuyển động của một camera (buffer cấp phát sẵn, dùng lại mỗi frame)."""
+
+    def __init__(self, params: dict):
+        self.params = params
+        self.frame_shape = None
+        self.small = None          # Frame thu nhỏ (BGR)
+        self.gray = None           # Frame xám hiện tại
+        self.reference = None      # Frame xám tại lần chạy YOLO gần nhất
+        self.diff = None
+        self.frames_since_detect = 0
+        self.last_detections: List[DetectionResult] = []
+        self.last_changed_ratio = 0.0
+        self.frames = 0
+        self.skipped = 0
+
+    def allocate(self, frame_h: int, frame_w: int):
+        self.frame_shape = (frame_h, frame_w)
+        width = self.params["downscale_width"]
+        height = max(1, round(frame_h * width / frame_w))
+        self.small = np.empty((height, width, 3), dtype=np.uint8)
+        self.gray = np.empty((height, width), dtype=np.uint8)
+        self.diff = np.empty((height, width), dtype=np.uint8)
+        self.reference = None
+
+
+class MotionGate:
+    def __init__(self, detector, camera_config: Dict[str, dict] = None):
+        """
+        Bộ lọc chuyển động giữa P1 và P2: chỉ chạy YOLO khi khung cảnh thay đổi.
+        So sánh frame xám thu nhỏ với frame tại lần nhận diện gần nhất; khi cảnh tĩnh,
+        dùng lại danh sách DetectionResult trước đó. Có chu kỳ nhận diện bắt buộc
+        (redetect_interval) để không bỏ sót đồ vật được đặt vào chậm.
+        :param detector: ObjectDetector (hoặc đối tượng có detect_objects/detect_objects_batch).
+        :param camera_config: Cấu hình camera, khóa "motion" ghi đè MOTION_GATE cho từng camera.
+        """
+        self.detector = detector
+        self.camera_config = camera_config if camera_config is not None else CAMERA_CONFIG
+        self._states: Dict[str, _CameraMotionState] = {}
+
+    def _state(self, camera_id: str) -> _CameraMotionState:
+        state = self._states.get(camera_id)
+        if state is None:
+            params = dict(MOTION_GATE)
+            params.update(self.camera_config.get(camera_id, {}).get("motion", {}))
+            state = _CameraMotionState(params)
+            self._states[camera_id] = state
+        return state
+
+    def should_detect(self, data_packet: dict) -> bool:
+        """
+        Quyết định có cần chạy YOLO cho packet này hay không (không cấp phát bộ nhớ mới).
+        """
+        metadata = data_packet["metadata"]
+        state = self._state(metadata["camera_id"])
+        params = state.params
+        frame = data_packet.get("raw_frame")
+        if frame is None:
+            frame = data_packet["processed_frame"]
+
+        if state.frame_shape != frame.shape[:2]:
+            state.allocate(frame.shape[0], frame.shape[1])
+
+        h, w = state.gray.shape
+        cv2.resize(frame, (w, h), dst=state.small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(state.small, cv2.COLOR_BGR2GRAY, dst=state.gray)
+        cv2.GaussianBlur(state.gray, (5, 5), 0, dst=state.gray)
+
+        state.frames += 1
+        if state.reference is None or state.frames_since_detect >= params["redetect_interval"]:
+            state.last_changed_ratio = 1.0
+            return True
+
+        cv2.absdiff(state.gray, state.reference, dst=state.diff)
+        cv2.threshold(state.diff, params["pixel_threshold"], 255, cv2.THRESH_BINARY, dst=state.diff)
+        state.last_changed_ratio = cv2.countNonZero(state.diff) / state.diff.size
+        return state.last_changed_ratio >= params["min_changed_ratio"]
+
+    def _record_detection(self, camera_id: str, detections: List[DetectionResult]):
+        state = self._states[camera_id]
+        if state.reference is None:
+            state.reference = state.gray.copy()
+        else:
+            np.copyto(state.reference, state.gray)
+        state.frames_since_detect = 0
+        state.last_detections = detections
+
+    def _reuse(self, data_packet: dict) -> List[DetectionResult]:
+        metadata = data_packet["metadata"]
+        state = self._states[metadata["camera_id"]]
+        state.frames_since_detect += 1
+        state.skipped += 1
+        # Cập nhật metadata (timestamp) của frame hiện tại cho kết quả cũ
+        return [det.with_metadata(metadata) for det in state.last_detections]
+
+    def detect_objects(self, data_packet: dict) -> List[DetectionResult]:
+        """Cùng hợp đồng với ObjectDetector.detect_objects."""
+        if not self.should_detect(data_packet):
+            return self._reuse(data_packet)
+
+        detections = self.detector.detect_objects(data_packet)
+        self._record_detection(data_packet["metadata"]["camera_id"], detections)
+        return detections
+
+    def detect_objects_batch(self, data_packets: List[dict]) -> List[List[DetectionResult]]:
+        """Cùng hợp đồng với ObjectDetector.detect_objects_batch; chỉ frame có chuyển động được đưa vào lô."""
+        results: List[Optional[List[DetectionResult]]] = [None] * len(data_packets)
+        pending = []
+        for i, packet in enumerate(data_packets):
+            if self.should_detect(packet):
+                pending.append(i)
+            else:
+                results[i] = self._reuse(packet)
+
+        if pending:
+            batch = self.detector.detect_objects_batch([data_packets[i] for i in pending])
+            for i, detections in zip(pending, batch):
+                self._record_detection(data_packets[i]["metadata"]["camera_id"], detections)
+                results[i] = detections
+        return results
+
+    def skip_ratio(self, camera_id: Optional[str] = None) -> float:
+        """Tỉ lệ frame bỏ qua YOLO (của một camera hoặc toàn bộ)."""
+        if camera_id is None:
+            states = list(self._states.values())
+        else:
+            states = [self._states[camera_id]] if camera_id in self._states else []
+        frames = sum(s.frames for s in states)
+        return sum(s.skipped for s in states) / frames if frames else 0.0
+
+    def changed_ratio(self, camera_id: str) -> Optional[float]:
+        """Tỉ lệ pixel thay đổi ở frame gần nhất của camera (None nếu chưa nhận frame nào)."""
+        state = self._states.get(camera_id)
+        return state.last_changed_ratio if state is not None else None
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            camera_id: {
+                "frames": state.frames,
+                "skipped": state.skipped,
+                "skip_ratio": state.skipped / state.frames if state.frames else 0.0,
+                "changed_ratio": state.last_changed_ratio,
+            }
+            for camera_id, state in self._states.items()
+        }
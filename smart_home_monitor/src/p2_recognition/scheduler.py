@@ -0,0 +1,303 @@
+# src/p2_recognition/scheduler.py
+
+import time
+import threading
+import cv2
+import numpy as np
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from configs.config import CAMERA_CONFIG, SAFETY_RULES, OBJECT_CATEGORIES, CATEGORY_ALIASES, QOS
+from src.p3_context.rule_engine import CompiledRules
+from src.utils.helpers import DetectionResult
+from src.utils.metrics import REGISTRY
+
+# Trọng số rủi ro theo mức độ vi phạm (mỗi vật thể bị cấm trong phòng cộng một lần, lấy mức nặng nhất)
+SEVERITY_WEIGHTS = {"CRITICAL": 3.0, "HIGH": 2.0, "MEDIUM": 1.0}
+FULL_INPUT_SIZE = 640  # Kích thước input chuẩn, chi phí 1 đơn vị
+_STALE_SECONDS = 5.0   # Camera không gửi frame quá lâu thì không được tính khi phân bổ
+
+QOS_SKIPPED = REGISTRY.counter("p2_qos_frames_skipped_total", "Số frame bỏ qua YOLO do hết ngân sách inference",
+                               ("camera_id",))
+
+
+def room_risks(rules: dict = SAFETY_RULES) -> Dict[str, float]:
+    """
+    Mức rủi ro của từng loại phòng theo SAFETY_RULES: 1 + tổng trọng số mức độ của các vật thể bị cấm
+    (vd: phòng trẻ em cấm dao, thuốc, bật lửa ở mọi nơi có rủi ro cao hơn phòng khách chỉ cấm ly dưới sàn).
+    """
+    compiled = CompiledRules(rules, OBJECT_CATEGORIES, CATEGORY_ALIASES)
+    worst: Dict[Tuple[str, str], float] = {}
+    for (room_type, obj_name, _), (_, severity) in compiled.table.items():
+        key = (room_type, obj_name)
+        worst[key] = max(worst.get(key, 0.0), SEVERITY_WEIGHTS.get(severity, 1.0))
+
+    risks = {room_type: 1.0 for room_type in rules}
+    for (room_type, _), weight in worst.items():
+        risks[room_type] += weight
+    return risks
+
+
+class _CameraQoS:
+    """Trạng thái phân bổ của một camera."""
+
+    def __init__(self, risk: float, full_size: int):
+        self.risk = risk
+        self.scalable = True            # Backend nhận được input nhỏ hơn hay không
+        self.mean_interval = None       # Khoảng cách trung bình (EWMA) giữa hai frame đến
+        self.last_arrival = None
+        self.next_due = 0.0
+        self.period = 0.0               # Giây tối thiểu giữa hai lần nhận diện (0: mọi frame)
+        self.rate = None                # Tần suất nhận diện được cấp (frame/giây)
+        self.input_size = full_size
+        self.alert_score = 0.0
+        self.alert_updated = 0.0
+        self.motion = None              # changed_ratio gần nhất (None: chưa biết, coi như có chuyển động)
+        self.priority = risk
+        self.detected = 0
+        self.skipped = 0
+
+    @property
+    def demand(self) -> float:
+        """Tốc độ frame đến (frame/giây)."""
+        return 1.0 / self.mean_interval if self.mean_interval else 0.0
+
+
+class QoSScheduler:
+    def __init__(self, budget_fps: float = QOS["budget_fps"], cpu_share: Optional[float] = QOS["cpu_share"],
+                 min_fps: float = QOS["min_fps"], low_res: int = QOS["low_res"],
+                 full_size: int = FULL_INPUT_SIZE, camera_config: Dict[str, dict] = None,
+                 rules: dict = SAFETY_RULES, params: dict = None):
+        """
+        Bộ phân bổ ngân sách inference dùng chung cho mọi camera (đặt trước ObjectDetector qua ScheduledDetector).
+        Mỗi camera được cấp tần suất nhận diện và kích thước input theo mức ưu tiên:
+        rủi ro phòng (SAFETY_RULES) x (1 + hoạt động cảnh báo gần đây) x mức chuyển động.
+        Khi tổng nhu cầu vượt ngân sách: camera ưu tiên thấp bị hạ xuống `low_res` trước,
+        sau đó ngân sách được chia theo trọng số ưu tiên (mỗi camera tối thiểu `min_fps`),
+        thay vì để mọi camera cùng chậm như nhau.
+        :param budget_fps: Ngân sách tính bằng số frame 640 mỗi giây.
+        :param cpu_share: Nếu đặt, ngân sách = cpu_share / thời gian forward trung bình của một frame 640
+                          (đo được trong lúc chạy); chưa đo được thì dùng budget_fps.
+        :param params: Ghi đè các khóa còn lại của QOS (alert_half_life, alert_boost, motion_floor, ...).
+        """
+        self.budget_fps = budget_fps
+        self.cpu_share = cpu_share
+        self.min_fps = min_fps
+        self.low_res = low_res
+        self.full_size = full_size
+        self.camera_config = camera_config if camera_config is not None else CAMERA_CONFIG
+        self.params = dict(QOS)
+        self.params.update(params or {})
+        self.risks = room_risks(rules)
+
+        self._cameras: Dict[str, _CameraQoS] = {}
+        self._unit_seconds = None  # Thời gian forward trung bình (EWMA) của một frame 640
+        self._allocated_at = 0.0
+        self._lock = threading.Lock()
+
+    def _camera(self, camera_id: str) -> _CameraQoS:
+        cam = self._cameras.get(camera_id)
+        if cam is None:
+            room_type = self.camera_config.get(camera_id, {}).get("room_type")
+            cam = self._cameras[camera_id] = _CameraQoS(self.risks.get(room_type, 1.0), self.full_size)
+        return cam
+
+    def cost(self, input_size: int) -> float:
+        """Chi phí tương đối của một frame so với input chuẩn (tỉ lệ theo số pixel)."""
+        return (input_size / self.full_size) ** 2
+
+    @property
+    def budget(self) -> float:
+        """Ngân sách hiện tại (đơn vị: frame 640 mỗi giây)."""
+        if self.cpu_share is not None and self._unit_seconds:
+            return self.cpu_share / self._unit_seconds
+        return self.budget_fps
+
+    # --- Tín hiệu đầu vào ---
+    def observe_alert(self, camera_id: str, now: Optional[float] = None):
+        """Ghi nhận một cảnh báo (từ AlertManager) của camera, tăng ưu tiên trong vài phút tới."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            cam = self._camera(camera_id)
+            cam.alert_score = self._alert_activity(cam, now) + 1.0
+            cam.alert_updated = now
+
+    def observe_motion(self, camera_id: str, changed_ratio: float):
+        """Ghi nhận mức chuyển động (tỉ lệ pixel thay đổi, vd từ MotionGate) của camera."""
+        with self._lock:
+            self._camera(camera_id).motion = changed_ratio
+
+    def observe_cost(self, units: float, seconds: float):
+        """Ghi nhận thời gian forward của `units` frame 640 quy đổi (để quy đổi cpu_share ra fps)."""
+        if units <= 0:
+            return
+        with self._lock:
+            sample = seconds / units
+            self._unit_seconds = sample if self._unit_seconds is None else 0.9 * self._unit_seconds + 0.1 * sample
+
+    # --- Phân bổ ---
+    def _alert_activity(self, cam: _CameraQoS, now: float) -> float:
+        return cam.alert_score * 0.5 ** ((now - cam.alert_updated) / self.params["alert_half_life"])
+
+    def _priority(self, cam: _CameraQoS, now: float) -> float:
+        floor = self.params["motion_floor"]
+        motion = 1.0 if cam.motion is None else min(1.0, cam.motion / self.params["motion_full"])
+        alerts = self._alert_activity(cam, now)
+        return cam.risk * (1.0 + self.params["alert_boost"] * alerts) * (floor + (1.0 - floor) * motion)
+
+    def _waterfill(self, cameras: Dict[str, _CameraQoS], sizes: Dict[str, int], budget: float) -> Dict[str, float]:
+        """
+        Chia ngân sách (đơn vị chi phí) theo trọng số ưu tiên: mỗi camera trước hết được min_fps,
+        phần còn lại chia theo ưu tiên; camera đã đủ nhu cầu thì phần dư chia tiếp cho các camera khác.
+        """
+        cost = {cid: self.cost(sizes[cid]) for cid in cameras}
+        rates = {cid: min(self.min_fps, cam.demand) for cid, cam in cameras.items()}
+        remaining = budget - sum(rates[cid] * cost[cid] for cid in cameras)
+        active = [cid for cid, cam in cameras.items() if rates[cid] < cam.demand]
+
+        while remaining > 1e-9 and active:
+            total = sum(cameras[cid].priority for cid in active)
+            satisfied = [cid for cid in active
+                         if (cameras[cid].demand - rates[cid]) * cost[cid] <= remaining * cameras[cid].priority / total]
+            if not satisfied:
+                for cid in active:
+                    rates[cid] += remaining * cameras[cid].priority / total / cost[cid]
+                break
+            for cid in satisfied:
+                remaining -= (cameras[cid].demand - rates[cid]) * cost[cid]
+                rates[cid] = cameras[cid].demand
+            active = [cid for cid in active if cid not in satisfied]
+        return rates
+
+    def _reallocate(self, now: float):
+        cameras = {cid: cam for cid, cam in self._cameras.items()
+                   if cam.last_arrival is not None and now - cam.last_arrival < _STALE_SECONDS}
+        for cam in cameras.values():
+            cam.priority = self._priority(cam, now)
+
+        # Hạ độ phân giải lần lượt từ camera ưu tiên thấp nhất cho tới khi mọi camera đủ nhu cầu
+        budget = self.budget
+        sizes = {cid: self.full_size for cid in cameras}
+        downgradable = [cid for cid in sorted(cameras, key=lambda c: cameras[c].priority)
+                        if cameras[cid].scalable and self.low_res < self.full_size]
+        while True:
+            rates = self._waterfill(cameras, sizes, budget)
+            starved = any(rates[cid] < 0.99 * cam.demand for cid, cam in cameras.items())
+            if not starved or not downgradable:
+                break
+            sizes[downgradable.pop(0)] = self.low_res
+
+        for cid, cam in cameras.items():
+            cam.rate = rates[cid]
+            cam.input_size = sizes[cid]
+            cam.period = 0.0 if rates[cid] >= 0.99 * cam.demand else 1.0 / max(rates[cid], 1e-6)
+        self._allocated_at = now
+
+    def admit(self, camera_id: str, now: Optional[float] = None, scalable: bool = True) -> Optional[int]:
+        """
+        Quyết định cho một frame mới đến của camera.
+        :param scalable: Backend của camera nhận được input nhỏ hơn full_size hay không.
+        :return: Kích thước input để chạy YOLO, hoặc None nếu bỏ qua frame này (dùng lại kết quả cũ).
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            cam = self._camera(camera_id)
+            cam.scalable = scalable
+            if cam.last_arrival is not None:
+                interval = now - cam.last_arrival
+                cam.mean_interval = interval if cam.mean_interval is None else 0.9 * cam.mean_interval + 0.1 * interval
+            cam.last_arrival = now
+            if now - self._allocated_at >= self.params["reallocate_interval"]:
+                self._reallocate(now)
+
+            if now < cam.next_due:
+                cam.skipped += 1
+                QOS_SKIPPED.inc(camera_id)
+                return None
+            # Cho phép bù tối đa một chu kỳ khi frame đến trễ để giữ đúng tần suất trung bình
+            cam.next_due = max(cam.next_due, now - cam.period) + cam.period
+            cam.detected += 1
+            return cam.input_size
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                camera_id: {
+                    "risk": cam.risk,
+                    "priority": cam.priority,
+                    "demand_fps": cam.demand,
+                    "rate_fps": cam.rate if cam.rate is not None else cam.demand,
+                    "input_size": cam.input_size,
+                    "detected": cam.detected,
+                    "skipped": cam.skipped,
+                }
+                for camera_id, cam in self._cameras.items()
+            }
+
+
+class ScheduledDetector:
+    def __init__(self, detector, scheduler: QoSScheduler, scalable: bool = True):
+        """
+        Đặt QoSScheduler trước bộ nhận diện của một pipeline: frame không được cấp ngân sách
+        dùng lại kết quả gần nhất của camera; frame được cấp input nhỏ hơn thì thu nhỏ processed_frame
+        (và điều chỉnh metadata letterbox/input_size để P2 ánh xạ ngược đúng).
+        :param detector: ObjectDetector hoặc MotionGate (nếu có changed_ratio() thì dùng làm tín hiệu chuyển động).
+        :param scalable: False nếu model có input cố định (không hạ độ phân giải được).
+        """
+        self.detector = detector
+        self.scheduler = scheduler
+        self.scalable = scalable
+        self._last: Dict[str, List[DetectionResult]] = {}
+        self._buffers: Dict[Tuple[str, int], np.ndarray] = {}
+
+    def _resize(self, packet: dict, size: int) -> dict:
+        frame = packet["processed_frame"]
+        source_size = frame.shape[0]
+        if size >= source_size:
+            return packet
+
+        metadata = packet["metadata"]
+        key = (metadata["camera_id"], size)
+        buffer = self._buffers.get(key)
+        if buffer is None or buffer.dtype != frame.dtype:
+            buffer = self._buffers[key] = np.empty((size, size) + frame.shape[2:], dtype=frame.dtype)
+        cv2.resize(frame, (size, size), dst=buffer, interpolation=cv2.INTER_AREA)
+
+        ratio = size / source_size
+        metadata = dict(metadata, input_size=size)
+        if metadata.get("letterbox") is not None:
+            scale, pad_x, pad_y = metadata["letterbox"]
+            metadata["letterbox"] = (scale * ratio, pad_x * ratio, pad_y * ratio)
+        return dict(packet, processed_frame=buffer, metadata=metadata)
+
+    def detect_objects(self, data_packet: dict) -> List[DetectionResult]:
+        """Cùng hợp đồng với ObjectDetector.detect_objects."""
+        return self.detect_objects_batch([data_packet])[0]
+
+    def detect_objects_batch(self, data_packets: List[dict]) -> List[List[DetectionResult]]:
+        """Cùng hợp đồng với ObjectDetector.detect_objects_batch; frame cùng kích thước input được gom một lô."""
+        results: List[Optional[List[DetectionResult]]] = [None] * len(data_packets)
+        groups: Dict[int, List[Tuple[int, dict]]] = defaultdict(list)
+        for i, packet in enumerate(data_packets):
+            metadata = packet["metadata"]
+            size = self.scheduler.admit(metadata["camera_id"], scalable=self.scalable)
+            if size is None:
+                results[i] = [det.with_metadata(metadata) for det in self._last.get(metadata["camera_id"], [])]
+            else:
+                groups[size].append((i, self._resize(packet, size)))
+
+        for size, items in groups.items():
+            start = time.perf_counter()
+            batch = self.detector.detect_objects_batch([packet for _, packet in items])
+            self.scheduler.observe_cost(len(items) * self.scheduler.cost(size), time.perf_counter() - start)
+            for (i, packet), detections in zip(items, batch):
+                camera_id = packet["metadata"]["camera_id"]
+                self._last[camera_id] = detections
+                results[i] = detections
+
+        changed_ratio = getattr(self.detector, "changed_ratio", None)
+        if changed_ratio is not None:
+            for camera_id in {packet["metadata"]["camera_id"] for packet in data_packets}:
+                ratio = changed_ratio(camera_id)
+                if ratio is not None:
+                    self.scheduler.observe_motion(camera_id, ratio)
+        return results
@@ -0,0 +1,279 @@
+# src/p2_recognition/tiling.py
+
+import math
+import cv2
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from configs.config import CAMERA_CONFIG, OBJECT_CATEGORIES, TILING
+from src.utils.helpers import DetectionBatch, DetectionView
+
+_EMPTY_BOXES = np.empty((0, 4), dtype=np.int32)
+
+
+def tile_grid(frame_w: int, frame_h: int, band: Tuple[float, float], tile_size: int, overlap: float,
+              max_tiles: int) -> List[Tuple[int, int, int, int]]:
+    """
+    Chia dải [band[0], band[1]] (tỉ lệ chiều cao) của frame thành các ô vuông chồng lấn.
+    Ô có cạnh tile_size pixel gốc; nếu cần quá max_tiles ô thì tăng cạnh ô (ô sẽ được thu nhỏ về tile_size).
+    :return: Danh sách (x0, y0, x1, y1) pixel gốc, rỗng nếu frame không lớn hơn tile_size (không cần chia ô).
+    """
+    if max(frame_w, frame_h) <= tile_size:
+        return []
+    band_y0 = int(band[0] * frame_h)
+    band_h = max(1, int(band[1] * frame_h) - band_y0)
+
+    def axis(length: int, side: int) -> List[int]:
+        if length <= side:
+            return [0]
+        count = math.ceil((length - side) / (side * (1.0 - overlap))) + 1
+        step = (length - side) / (count - 1)
+        return [round(i * step) for i in range(count)]
+
+    side = tile_size
+    while True:
+        side = min(side, frame_w, frame_h)
+        xs = axis(frame_w, side)
+        ys = axis(band_h, side)
+        if len(xs) * len(ys) <= max_tiles or side >= min(frame_w, frame_h):
+            break
+        side = int(side * 1.25)
+
+    # Dải thấp hơn cạnh ô: ô bám đáy dải (vẫn nằm trong frame)
+    tiles = []
+    for y in ys:
+        y0 = min(band_y0 + y, frame_h - side)
+        for x in xs:
+            tiles.append((x, y0, x + side, y0 + side))
+    return tiles
+
+
+def _ios_matrix(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+    """Ma trận diện tích giao / diện tích bbox nhỏ hơn (IoS) giữa hai tập bbox [x1, y1, x2, y2]."""
+    a = boxes1.astype(np.float64)[:, None, :]
+    b = boxes2.astype(np.float64)[None, :, :]
+    w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    area_a = np.maximum(a[..., 2] - a[..., 0], 1.0) * np.maximum(a[..., 3] - a[..., 1], 1.0)
+    area_b = np.maximum(b[..., 2] - b[..., 0], 1.0) * np.maximum(b[..., 3] - b[..., 1], 1.0)
+    return w * h / np.minimum(area_a, area_b)
+
+
+def confirmed_by(boxes: np.ndarray, class_ids: np.ndarray, ref_boxes: np.ndarray, ref_class_ids: np.ndarray,
+                 threshold: float) -> np.ndarray:
+    """Mask các bbox có ít nhất một bbox tham chiếu cùng lớp chồng lên (IoS >= threshold)."""
+    if not len(boxes) or not len(ref_boxes):
+        return np.zeros(len(boxes), dtype=bool)
+    same_class = class_ids[:, None] == ref_class_ids[None, :]
+    return ((_ios_matrix(boxes, ref_boxes.reshape(-1, 4)) >= threshold) & same_class).any(axis=1)
+
+
+def merge_boxes(boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray, threshold: float) -> np.ndarray:
+    """
+    NMS tham lam theo từng lớp dùng tỉ lệ giao / diện tích bbox nhỏ hơn (IoS), để gộp cả bbox
+    bị mép ô cắt mất một phần với bbox đầy đủ từ ô bên cạnh hoặc từ lượt cả frame.
+    :return: Chỉ số các bbox được giữ, theo thứ tự độ tin cậy giảm dần.
+    """
+    order = np.argsort(-scores, kind="stable")
+    boxes = boxes.astype(np.float64)
+    areas = np.maximum(boxes[:, 2] - boxes[:, 0], 1.0) * np.maximum(boxes[:, 3] - boxes[:, 1], 1.0)
+    suppressed = np.zeros(len(boxes), dtype=bool)
+    keep = []
+    for i in order:
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        w = np.clip(np.minimum(boxes[i, 2], boxes[:, 2]) - np.maximum(boxes[i, 0], boxes[:, 0]), 0, None)
+        h = np.clip(np.minimum(boxes[i, 3], boxes[:, 3]) - np.maximum(boxes[i, 1], boxes[:, 1]), 0, None)
+        ios = w * h / np.minimum(areas[i], areas)
+        suppressed |= (class_ids == class_ids[i]) & (ios >= threshold)
+    return np.asarray(keep, dtype=np.int64)
+
+
+def detect_grouped(detector, packets: List[dict]) -> List[DetectionBatch]:
+    """
+    Gọi detector.detect_batches một lần cho mỗi nhóm packet cùng kích thước và kiểu processed_frame.
+    Ô (uint8, tile_size) và frame đầy đủ (float32 chế độ "stretch" hoặc đã bị QoS thu nhỏ) không được
+    xếp chung một lô: backend ghép ảnh thành một tensor và chọn imgsz/chuẩn hóa theo ảnh đầu tiên.
+    :return: DetectionBatch cùng thứ tự với packets.
+    """
+    groups: Dict[tuple, List[int]] = {}
+    for i, packet in enumerate(packets):
+        frame = packet["processed_frame"]
+        groups.setdefault((frame.shape, frame.dtype.str), []).append(i)
+    if len(groups) == 1:
+        return detector.detect_batches(packets)
+
+    results: List[Optional[DetectionBatch]] = [None] * len(packets)
+    for indices in groups.values():
+        for i, batch in zip(indices, detector.detect_batches([packets[i] for i in indices])):
+            results[i] = batch
+    return results
+
+
+class _CameraTiles:
+    """Trạng thái chia ô của một camera: lưới ô theo kích thước frame, buffer ô và kết quả ô gần nhất."""
+
+    def __init__(self, params: dict):
+        self.params = params
+        self.frame_shape = None
+        self.tiles: List[Tuple[int, int, int, int]] = []
+        self.buffers: List[np.ndarray] = []
+        self.calls_since_refresh = None  # None: chưa chạy ô lần nào
+        self.unconfirmed = False         # Lượt ô gần nhất có vật mà lượt cả frame không thấy
+        # Kết quả ô gần nhất theo tọa độ frame gốc
+        self.boxes = _EMPTY_BOXES
+        self.scores = np.empty(0, dtype=np.float32)
+        self.class_ids = np.empty(0, dtype=np.int32)
+        self.position_codes = np.empty(0, dtype=np.uint8)
+
+    def due(self) -> bool:
+        # Vật chỉ lượt ô thấy được: chạy ô mỗi lần để detection luôn là của frame hiện tại
+        return (self.calls_since_refresh is None or self.unconfirmed
+                or self.calls_since_refresh + 1 >= self.params["refresh_every"])
+
+
+class TiledDetector:
+    def __init__(self, detector, camera_config: Dict[str, dict] = None):
+        """
+        Bổ sung lượt suy luận theo ô trên dải sàn của frame gốc cho các camera bật "tiling".
+        Mỗi `refresh_every` lần nhận diện, các ô được chạy cùng lần gọi với frame đầy đủ (mỗi nhóm cùng
+        kích thước và kiểu ảnh một lô); detection từ ô (chỉ các lớp thuộc `categories`) được gộp với
+        lượt cả frame bằng NMS giữa các ô.
+        Các lần còn lại chỉ chạy cả frame; kết quả ô gần nhất chỉ được giữ khi có bbox cùng lớp của frame
+        hiện tại chồng lên (không phát detection cũ cho vật đã bị lấy đi). Khi lượt ô thấy vật mà lượt
+        cả frame không thấy, các ô được chạy lại mỗi lần cho tới khi hai lượt khớp nhau.
+        :param detector: ObjectDetector (cần detect_batches và names).
+        :param camera_config: Cấu hình camera; khóa "tiling" (True hoặc dict ghi đè TILING) bật chia ô.
+        """
+        self.detector = detector
+        self.camera_config = camera_config if camera_config is not None else CAMERA_CONFIG
+        self._states: Dict[str, Optional[_CameraTiles]] = {}
+        self.tile_runs = 0
+
+    def _state(self, camera_id: str) -> Optional[_CameraTiles]:
+        if camera_id not in self._states:
+            cam_info = self.camera_config.get(camera_id, {})
+            option = cam_info.get("tiling")
+            state = None
+            if option:
+                params = dict(TILING)
+                if isinstance(option, dict):
+                    params.update(option)
+                # Dải sàn lấy theo vùng "floor" đã hiệu chỉnh nếu có
+                floor = cam_info.get("zones", {}).get("floor")
+                if floor:
+                    ys = [point[1] for point in floor]
+                    params["band"] = (min(ys), max(ys))
+                names = {name for category in params["categories"] for name in OBJECT_CATEGORIES.get(category, [])}
+                params["class_ids"] = (np.asarray([cid for cid, name in self.detector.names.items() if name in names],
+                                                  dtype=np.int32) if names else None)
+                state = _CameraTiles(params)
+            self._states[camera_id] = state
+        return self._states[camera_id]
+
+    def _tile_packets(self, state: _CameraTiles, packet: dict) -> List[dict]:
+        frame = packet.get("raw_frame")
+        if frame is None:
+            return []
+        params = state.params
+        size = params["tile_size"]
+        if state.frame_shape != frame.shape:
+            state.frame_shape = frame.shape
+            state.tiles = tile_grid(frame.shape[1], frame.shape[0], params["band"], size,
+                                    params["overlap"], params["max_tiles"])
+            state.buffers = [np.empty((size, size) + frame.shape[2:], dtype=frame.dtype) for _ in state.tiles]
+
+        packets = []
+        metadata = packet["metadata"]
+        for (x0, y0, x1, y1), buffer in zip(state.tiles, state.buffers):
+            crop = frame[y0:y1, x0:x1]
+            if x1 - x0 == size:
+                np.copyto(buffer, crop)
+            else:
+                cv2.resize(crop, (size, size), dst=buffer, interpolation=cv2.INTER_AREA)
+            scale = size / (x1 - x0)
+            packets.append({"raw_frame": None, "processed_frame": buffer,
+                            "metadata": dict(metadata, input_size=size, letterbox=(scale, 0, 0),
+                                             roi=(x0, y0, x1, y1))})
+        return packets
+
+    def _store_tiles(self, state: _CameraTiles, batches: List[DetectionBatch]):
+        boxes = np.concatenate([b.boxes for b in batches]) if batches else _EMPTY_BOXES
+        scores = np.concatenate([b.scores for b in batches]) if batches else np.empty(0, dtype=np.float32)
+        class_ids = np.concatenate([b.class_ids for b in batches]) if batches else np.empty(0, dtype=np.int32)
+        codes = np.concatenate([b.position_codes for b in batches]) if batches else np.empty(0, dtype=np.uint8)
+        if state.params["class_ids"] is not None:
+            keep = np.isin(class_ids, state.params["class_ids"])
+            boxes, scores, class_ids, codes = boxes[keep], scores[keep], class_ids[keep], codes[keep]
+        state.boxes, state.scores, state.class_ids, state.position_codes = boxes, scores, class_ids, codes
+
+    def _merge(self, state: _CameraTiles, full: DetectionBatch, fresh: bool) -> DetectionBatch:
+        """
+        Gộp kết quả ô với lượt cả frame.
+        :param fresh: Kết quả ô vừa chạy trên chính frame này; False thì chỉ giữ bbox ô được frame hiện tại xác nhận.
+        """
+        if not len(state.scores):
+            return full
+        threshold = state.params["merge_threshold"]
+        confirmed = confirmed_by(state.boxes, state.class_ids, full.boxes, full.class_ids, threshold)
+        # Còn bbox ô không được xác nhận: lần sau chạy lại ô (trên frame mới) thay vì dùng kết quả cũ
+        state.unconfirmed = not confirmed.all()
+        tiles = (state.boxes, state.scores, state.class_ids, state.position_codes)
+        if not fresh:
+            if not confirmed.any():
+                return full
+            tiles = tuple(column[confirmed] for column in tiles)
+        tile_boxes, tile_scores, tile_class_ids, tile_codes = tiles
+
+        boxes = np.concatenate([full.boxes.reshape(-1, 4), tile_boxes])
+        scores = np.concatenate([full.scores, tile_scores])
+        class_ids = np.concatenate([full.class_ids, tile_class_ids])
+        codes = np.concatenate([full.position_codes, tile_codes])
+        keep = merge_boxes(boxes, scores, class_ids, threshold)
+        return DetectionBatch(boxes=boxes[keep].astype(np.int32), scores=scores[keep], class_ids=class_ids[keep],
+                              position_codes=codes[keep], names=full.names, metadata=full.metadata)
+
+    def detect_batches(self, data_packets: List[dict]) -> List[DetectionBatch]:
+        """
+        Cùng hợp đồng với ObjectDetector.detect_batches: frame đầy đủ và các ô đến hạn chạy trong cùng một lần gọi,
+        mỗi nhóm cùng kích thước/kiểu ảnh một lô.
+        """
+        packets = list(data_packets)
+        tile_spans: Dict[int, Tuple[int, int]] = {}
+        for i, packet in enumerate(data_packets):
+            state = self._state(packet["metadata"]["camera_id"])
+            if state is None:
+                continue
+            if state.due():
+                tiles = self._tile_packets(state, packet)
+                if tiles:
+                    tile_spans[i] = (len(packets), len(packets) + len(tiles))
+                    packets.extend(tiles)
+                    continue
+            if state.calls_since_refresh is not None:
+                state.calls_since_refresh += 1
+
+        batches = detect_grouped(self.detector, packets)
+
+        results = []
+        for i, packet in enumerate(data_packets):
+            state = self._states.get(packet["metadata"]["camera_id"])
+            if state is None:
+                results.append(batches[i])
+                continue
+            fresh = i in tile_spans
+            if fresh:
+                start, end = tile_spans[i]
+                self._store_tiles(state, batches[start:end])
+                state.calls_since_refresh = 0
+                self.tile_runs += 1
+            results.append(self._merge(state, batches[i], fresh))
+        return results
+
+    def detect_objects(self, data_packet: dict) -> List[DetectionView]:
+        """Cùng hợp đồng với ObjectDetector.detect_objects."""
+        return list(self.detect_batches([data_packet])[0])
+
+    def detect_objects_batch(self, data_packets: List[dict]) -> List[List[DetectionView]]:
+        """Cùng hợp đồng với ObjectDetector.detect_objects_batch."""
+        return [list(batch) for batch in self.detect_batches(data_packets)]
@@ -0,0 +1,234 @@
+# src/p2_recognition/tracker.py
+
+import itertools
+import numpy as np
+from typing import Callable, Dict, List, Optional
+from configs.config import TRACKER
+from src.utils.helpers import DetectionResult, calculate_iou_matrix
+
+
+def _bbox_to_z(bbox) -> np.ndarray:
+    """[x1, y1, x2, y2] -> [cx, cy, diện tích, tỉ lệ w/h] (không gian đo của Kalman)."""
+    w = max(bbox[2] - bbox[0], 1.0)
+    h = max(bbox[3] - bbox[1], 1.0)
+    return np.array([bbox[0] + w / 2, bbox[1] + h / 2, w * h, w / h], dtype=np.float64)
+
+
+def _x_to_bbox(x: np.ndarray) -> List[float]:
+    area = max(x[2], 1.0)
+    w = np.sqrt(area * max(x[3], 1e-3))
+    h = area / w
+    return [x[0] - w / 2, x[1] - h / 2, x[0] + w / 2, x[1] + h / 2]
+
+
+class KalmanBoxTrack:
+    """
+    Một track với bộ lọc Kalman vận tốc không đổi (theo SORT).
+    Trạng thái: [cx, cy, s, r, vcx, vcy, vs]
+    """
+    _F = np.eye(7)
+    _F[0, 4] = _F[1, 5] = _F[2, 6] = 1.0
+    _H = np.eye(4, 7)
+    _Q = np.diag([1.0, 1.0, 1.0, 1.0, 0.01, 0.01, 0.0001])
+    _R = np.diag([1.0, 1.0, 10.0, 10.0])
+
+    def __init__(self, track_id: int, det: DetectionResult):
+        self.track_id = track_id
+        self.class_name = det.class_name
+        self.confidence = det.confidence
+        self.position = det.position
+
+        self.x = np.zeros(7)
+        self.x[:4] = _bbox_to_z(det.bbox)
+        self.P = np.diag([10.0, 10.0, 10.0, 10.0, 1e4, 1e4, 1e4])
+
+        self.hits = 1
+        self.time_since_update = 0
+
+    def predict(self) -> List[float]:
+        # Không để diện tích âm khi vật thể co lại nhanh
+        if self.x[2] + self.x[6] <= 0:
+            self.x[6] = 0.0
+        self.x = self._F @ self.x
+        self.P = self._F @ self.P @ self._F.T + self._Q
+        self.time_since_update += 1
+        return _x_to_bbox(self.x)
+
+    def update(self, det: DetectionResult):
+        z = _bbox_to_z(det.bbox)
+        y = z - self._H @ self.x
+        S = self._H @ self.P @ self._H.T + self._R
+        K = self.P @ self._H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ y
+        self.P = (np.eye(7) - K @ self._H) @ self.P
+
+        self.confidence = det.confidence
+        self.position = det.position
+        self.hits += 1
+        self.time_since_update = 0
+
+    @property
+    def bbox(self) -> List[float]:
+        return _x_to_bbox(self.x)
+
+
+class ObjectTracker:
+    def __init__(self, iou_threshold: float = TRACKER["iou_threshold"], max_age: int = TRACKER["max_age"],
+                 high_conf: float = TRACKER["high_conf"], id_counter: Optional[itertools.count] = None):
+        """
+        Node P2.4: Gán track ID ổn định cho các vật thể của một camera (kiểu SORT/ByteTrack).
+        Ghép cặp theo IoU giữa bbox dự đoán (Kalman) và bbox mới, chỉ trong cùng lớp vật thể:
+        detection tin cậy cao được ghép trước, detection tin cậy thấp ghép với các track còn lại.
+        :param iou_threshold: IoU tối thiểu để ghép detection vào track.
+        :param max_age: Số frame tối đa một track được giữ khi không có detection.
+        :param high_conf: Ngưỡng chia detection tin cậy cao/thấp (ByteTrack); cần lớn hơn ngưỡng
+                          của detector thì bước ghép detection tin cậy thấp mới có dữ liệu.
+        """
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.high_conf = high_conf
+        self.tracks: List[KalmanBoxTrack] = []
+        self._ids = id_counter if id_counter is not None else itertools.count(1)
+        self._since_detection = 0  # Số frame nội suy kể từ lần update gần nhất
+
+    def _associate(self, tracks: List[KalmanBoxTrack], predicted: List[List[float]],
+                   detections: List[DetectionResult]) -> tuple:
+        """Ghép cặp tham lam theo IoU giảm dần. Trả về (cặp ghép, track chưa ghép, detection chưa ghép)."""
+        if not tracks or not detections:
+            return [], list(range(len(tracks))), list(range(len(detections)))
+
+        iou = calculate_iou_matrix(predicted, [d.bbox for d in detections])
+        for i, track in enumerate(tracks):
+            for j, det in enumerate(detections):
+                if track.class_name != det.class_name:
+                    iou[i, j] = 0.0
+
+        matches = []
+        while True:
+            i, j = np.unravel_index(np.argmax(iou), iou.shape)
+            if iou[i, j] < self.iou_threshold:
+                break
+            matches.append((i, j))
+            iou[i, :] = 0.0
+            iou[:, j] = 0.0
+
+        matched_t = {i for i, _ in matches}
+        matched_d = {j for _, j in matches}
+        return (matches,
+                [i for i in range(len(tracks)) if i not in matched_t],
+                [j for j in range(len(detections)) if j not in matched_d])
+
+    def update(self, detections: List[DetectionResult]) -> List[DetectionResult]:
+        """
+        Cập nhật tracker với detection của frame hiện tại.
+        Trả về bản sao các detection kèm track_id (không sửa detection đầu vào);
+        detection tin cậy thấp không ghép được track nào có track_id = None.
+        """
+        predicted = [track.predict() for track in self.tracks]
+        detections = [det.with_metadata(det.metadata) for det in detections]
+        for det in detections:
+            det.track_id = None  # Kết quả dùng lại (MotionGate) có thể mang track_id cũ
+
+        high = [d for d in detections if d.confidence >= self.high_conf]
+        low = [d for d in detections if d.confidence < self.high_conf]
+
+        # Bước 1: detection tin cậy cao
+        matches, rest_t, rest_d = self._associate(self.tracks, predicted, high)
+        for i, j in matches:
+            self.tracks[i].update(high[j])
+            high[j].track_id = self.tracks[i].track_id
+
+        # Bước 2: detection tin cậy thấp chỉ dùng để duy trì track đã có
+        rest_tracks = [self.tracks[i] for i in rest_t]
+        matches_low, _, _ = self._associate(rest_tracks, [predicted[i] for i in rest_t], low)
+        for i, j in matches_low:
+            rest_tracks[i].update(low[j])
+            low[j].track_id = rest_tracks[i].track_id
+
+        # Detection tin cậy cao chưa ghép -> track mới
+        for j in rest_d:
+            track = KalmanBoxTrack(next(self._ids), high[j])
+            self.tracks.append(track)
+            high[j].track_id = track.track_id
+
+        self.tracks = [t for t in self.tracks if t.time_since_update <= self.max_age]
+        self._since_detection = 0
+        return detections
+
+    def propagate(self, metadata: dict,
+                  position_fn: Optional[Callable[[List[int], dict], str]] = None) -> List[DetectionResult]:
+        """
+        Dự đoán vị trí các track cho frame không chạy detector.
+        :param position_fn: Hàm phân loại vị trí (bbox, metadata) -> str; None thì giữ vị trí cũ.
+        """
+        frame_h = metadata["frame_height"]
+        frame_w = metadata["frame_width"]
+        self._since_detection += 1
+        results = []
+        for track in self.tracks:
+            x1, y1, x2, y2 = track.predict()
+            # Chỉ nội suy các track được ghép ở lần chạy detector gần nhất
+            if track.time_since_update > self._since_detection:
+                continue
+            bbox = [int(min(max(x1, 0), frame_w - 1)), int(min(max(y1, 0), frame_h - 1)),
+                    int(min(max(x2, 0), frame_w - 1)), int(min(max(y2, 0), frame_h - 1))]
+            position = position_fn(bbox, metadata) if position_fn else track.position
+            results.append(DetectionResult(
+                class_name=track.class_name,
+                confidence=track.confidence,
+                bbox=bbox,
+                position=position,
+                metadata=metadata,
+                track_id=track.track_id
+            ))
+        self.tracks = [t for t in self.tracks if t.time_since_update <= self.max_age]
+        return results
+
+
+class TrackedDetector:
+    def __init__(self, detector, detect_every: int = TRACKER["detect_every"],
+                 position_fn: Optional[Callable[[List[int], dict], str]] = None):
+        """
+        Chạy detector mỗi `detect_every` frame, các frame ở giữa do tracker nội suy bbox.
+        Cùng hợp đồng detect_objects với ObjectDetector, nên có thể bọc ObjectDetector hoặc MotionGate.
+        :param detector: Đối tượng có detect_objects/detect_objects_batch.
+        :param position_fn: Hàm phân loại vị trí cho bbox nội suy (vd: ObjectDetector.position_of).
+        """
+        self.detector = detector
+        self.detect_every = max(1, detect_every)
+        self.position_fn = position_fn
+        self._ids = itertools.count(1)  # Track ID duy nhất trên mọi camera
+        self._trackers: Dict[str, ObjectTracker] = {}
+        self._frame_counts: Dict[str, int] = {}
+
+    def _tracker(self, camera_id: str) -> ObjectTracker:
+        if camera_id not in self._trackers:
+            self._trackers[camera_id] = ObjectTracker(id_counter=self._ids)
+            self._frame_counts[camera_id] = 0
+        return self._trackers[camera_id]
+
+    def _needs_detection(self, camera_id: str) -> bool:
+        self._tracker(camera_id)
+        count = self._frame_counts[camera_id]
+        self._frame_counts[camera_id] = count + 1
+        return count % self.detect_every == 0
+
+    def detect_objects(self, data_packet: dict) -> List[DetectionResult]:
+        camera_id = data_packet["metadata"]["camera_id"]
+        tracker = self._tracker(camera_id)
+        if self._needs_detection(camera_id):
+            return tracker.update(self.detector.detect_objects(data_packet))
+        return tracker.propagate(data_packet["metadata"], self.position_fn)
+
+    def detect_objects_batch(self, data_packets: List[dict]) -> List[List[DetectionResult]]:
+        flags = [self._needs_detection(p["metadata"]["camera_id"]) for p in data_packets]
+        detected = iter(self.detector.detect_objects_batch([p for p, f in zip(data_packets, flags) if f]))
+
+        results = []
+        for packet, flag in zip(data_packets, flags):
+            tracker = self._tracker(packet["metadata"]["camera_id"])
+            if flag:
+                results.append(tracker.update(next(detected)))
+            else:
+                results.append(tracker.propagate(packet["metadata"], self.position_fn))
+        return results
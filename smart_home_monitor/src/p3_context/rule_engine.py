@@ -1,36 +1,236 @@
 # src/p3_context/rule_engine.py
 
-from configs.config import SAFETY_RULES, OBJECT_CATEGORIES
-from src.utils.helpers import DetectionResult
-from typing import Tuple, Optional
+import os
+import json
+import threading
+import numpy as np
+from configs.config import (SAFETY_RULES, OBJECT_CATEGORIES, CATEGORY_ALIASES,
+                            RULES_FILE, RULES_RELOAD_INTERVAL)
+from src.utils.helpers import DetectionResult, POSITIONS
+from src.utils.metrics import REGISTRY
+from src.p3_context.temporal import TemporalState
+from typing import Tuple, Optional, Dict, List, Set
+
+# Kết quả mặc định khi không vi phạm
+NO_VIOLATION = (False, None, "INFO", "")
+
+RULE_EVALUATIONS = REGISTRY.counter("p3_rule_evaluations_total", "Số detection đã đối soát quy tắc")
+VIOLATIONS = REGISTRY.counter("p3_violations_total", "Số vi phạm phát hiện được", ("severity",))
+TEMPORAL_PENDING = REGISTRY.counter("p3_temporal_pending_total",
+                                    "Số vi phạm chưa đủ điều kiện thời gian (chưa cảnh báo)")
+
+# Mẫu thông báo theo loại vi phạm (định dạng một lần cho mỗi cặp vật thể/phòng)
+MESSAGE_TEMPLATES = {
+    "forbidden_object": "Phát hiện {obj_name} trong {room_name}!",
+    "forbidden_on_floor": "Phát hiện {obj_name} đặt sai vị trí (dưới sàn)!"
+}
+
+
+class CompiledRules:
+    """
+    Bảng quy tắc đã biên dịch: (room_type, class_name, position) -> (violation_type, severity).
+    Các từ khóa nhóm (vd: any_sharp_object) được mở rộng sẵn khi biên dịch.
+    Điều kiện thời gian: (room_type, class_name, violation_type) -> (seconds, ratio).
+    """
+
+    def __init__(self, rules: dict, categories: dict, aliases: dict):
+        self.rules = rules
+        self.categories = categories
+        self.table: Dict[Tuple[str, str, str], Tuple[str, str]] = {}
+        self._verdicts: Dict[tuple, tuple] = {}
+        self.temporal: Dict[Tuple[str, str, str], Tuple[float, float]] = {}
+
+        for room_type, room_rules in rules.items():
+            # 1. Vật thể bị cấm hoàn toàn trong phòng (Trang 2) - mọi vị trí
+            for obj_name in self._expand(room_rules.get("forbidden_objects", []), categories, aliases):
+                for pos in POSITIONS:
+                    self.table[(room_type, obj_name, pos)] = ("forbidden_object", "CRITICAL")
+
+            # 2. Vật thể bị cấm để dưới sàn (Trang 2), không ghi đè vi phạm nặng hơn
+            for obj_name in self._expand(room_rules.get("forbidden_on_floor", []), categories, aliases):
+                self.table.setdefault((room_type, obj_name, "floor"), ("forbidden_on_floor", "HIGH"))
+
+            # 3. Điều kiện thời gian theo loại vi phạm: vi phạm >= seconds giây trong >= ratio số frame mới cảnh báo
+            for v_type, objects in room_rules.get("temporal", {}).items():
+                if v_type not in MESSAGE_TEMPLATES:
+                    raise ValueError(f"Loại vi phạm không hợp lệ trong temporal của {room_type}: {v_type}")
+                for name, qualifier in objects.items():
+                    if float(qualifier["seconds"]) <= 0:
+                        continue
+                    for obj_name in self._expand([name], categories, aliases):
+                        self.temporal[(room_type, obj_name, v_type)] = (float(qualifier["seconds"]),
+                                                                        float(qualifier.get("ratio", 1.0)))
+
+        # Các độ dài cửa sổ mỗi phòng dùng (đếm tổng số frame theo từng cửa sổ)
+        self.temporal_windows: Dict[str, Tuple[float, ...]] = {}
+        for (room_type, _, _), (seconds, _) in self.temporal.items():
+            windows = self.temporal_windows.get(room_type, ())
+            if seconds not in windows:
+                self.temporal_windows[room_type] = windows + (seconds,)
+
+        # Vật thể bị cấm hoàn toàn cũng áp dụng cho vị trí ngoài POSITIONS
+        self.anywhere = {(room, obj) for (room, obj, _), (v_type, _) in self.table.items()
+                         if v_type == "forbidden_object"}
+
+    @staticmethod
+    def _expand(names: List[str], categories: dict, aliases: dict) -> Set[str]:
+        """Mở rộng từ khóa nhóm (Trang 15) thành danh sách vật thể cụ thể."""
+        expanded = set()
+        for name in names:
+            category = aliases.get(name)
+            if category is not None:
+                expanded.update(categories.get(category, []))
+            else:
+                expanded.add(name)
+        return expanded
+
+    def lookup(self, room_type: str, obj_name: str, pos: str) -> Optional[Tuple[str, str]]:
+        verdict = self.table.get((room_type, obj_name, pos))
+        if verdict is None and pos not in POSITIONS and (room_type, obj_name) in self.anywhere:
+            return ("forbidden_object", "CRITICAL")
+        return verdict
+
+    def verdict_table(self, room_types: List[str], class_names: List[str]) -> Tuple[np.ndarray, List[tuple]]:
+        """
+        Bảng tra vector hóa cho nhiều detection cùng lúc (dùng khi chấm lại nhật ký detection):
+        table[room_code, class_code, position_code] = chỉ số trong danh sách verdict (0: không vi phạm).
+        :param room_types: Danh sách room_type theo mã (vd từ điển của DetectionLog).
+        :param class_names: Danh sách lớp theo mã.
+        :return: (table uint8 kích thước (R, C, len(POSITIONS)), [None, (violation_type, severity), ...])
+        """
+        verdicts: List[Optional[tuple]] = [None]
+        index: Dict[tuple, int] = {}
+        table = np.zeros((len(room_types), len(class_names), len(POSITIONS)), dtype=np.uint8)
+        rooms = {room: i for i, room in enumerate(room_types)}
+        classes = {name: i for i, name in enumerate(class_names)}
+        for (room_type, obj_name, pos), verdict in self.table.items():
+            if room_type not in rooms or obj_name not in classes:
+                continue
+            code = index.get(verdict)
+            if code is None:
+                code = index[verdict] = len(verdicts)
+                verdicts.append(verdict)
+            table[rooms[room_type], classes[obj_name], POSITIONS.index(pos)] = code
+        return table, verdicts
+
+    def verdict(self, room_type: str, room_name: str, obj_name: str,
+                pos: str) -> Tuple[bool, Optional[str], str, str]:
+        """Kết quả đầy đủ (kèm thông báo đã định dạng sẵn), được cache theo phòng/vật thể/vị trí."""
+        key = (room_type, room_name, obj_name, pos)
+        result = self._verdicts.get(key)
+        if result is None:
+            verdict = self.lookup(room_type, obj_name, pos)
+            if verdict is None:
+                result = NO_VIOLATION
+            else:
+                v_type, severity = verdict
+                msg = MESSAGE_TEMPLATES[v_type].format(obj_name=obj_name, room_name=room_name)
+                result = (True, v_type, severity, msg)
+            self._verdicts[key] = result
+        return result
+
 
 class RuleEngine:
-    def __init__(self):
-        self.rules = SAFETY_RULES
+    def __init__(self, rules_path: Optional[str] = RULES_FILE, reload_interval: float = RULES_RELOAD_INTERVAL):
+        """
+        Module P3: Đối soát quy tắc an toàn bằng bảng tra cứu biên dịch sẵn (O(1) mỗi detection).
+        :param rules_path: File JSON quy tắc để cập nhật nóng (None: dùng SAFETY_RULES trong config).
+        :param reload_interval: Chu kỳ (giây) kiểm tra thay đổi file quy tắc; <= 0 để tắt.
+        """
+        self.rules_path = rules_path
+        self._compiled = CompiledRules(SAFETY_RULES, OBJECT_CATEGORIES, CATEGORY_ALIASES)
+        self._temporal = TemporalState()
+        self._mtime = None
+        self._stop_event = threading.Event()
+        self._watcher = None
+
+        if rules_path:
+            self.reload()
+            if reload_interval > 0:
+                self._watcher = threading.Thread(target=self._watch, args=(reload_interval,),
+                                                 name="P3-rules-watcher", daemon=True)
+                self._watcher.start()
+
+    @property
+    def rules(self) -> dict:
+        return self._compiled.rules
+
+    @property
+    def compiled(self) -> CompiledRules:
+        return self._compiled
+
+    def reload(self) -> bool:
+        """
+        Đọc lại file quy tắc, biên dịch bảng mới rồi thay thế nguyên khối (atomic).
+        Frame đang xử lý vẫn dùng bảng cũ; file lỗi thì giữ nguyên bảng hiện tại.
+        """
+        try:
+            mtime = os.path.getmtime(self.rules_path)
+            with open(self.rules_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            compiled = CompiledRules(data.get("SAFETY_RULES", SAFETY_RULES),
+                                     data.get("OBJECT_CATEGORIES", OBJECT_CATEGORIES),
+                                     data.get("CATEGORY_ALIASES", CATEGORY_ALIASES))
+        except (OSError, ValueError, AttributeError, KeyError, TypeError) as e:
+            print(f"[Error] Không thể nạp quy tắc từ {self.rules_path}: {e}")
+            return False
+
+        # Gán một tham chiếu duy nhất: an toàn với luồng đang đọc bảng cũ
+        self._compiled = compiled
+        self._mtime = mtime
+        print(f"[P3] Đã nạp {len(compiled.table)} quy tắc từ {self.rules_path}")
+        return True
+
+    def _watch(self, interval: float):
+        while not self._stop_event.wait(interval):
+            try:
+                changed = os.path.getmtime(self.rules_path) != self._mtime
+            except OSError:
+                continue
+            if changed:
+                self.reload()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def reset_temporal(self):
+        """Xóa trạng thái cửa sổ của quy tắc theo thời gian (vd khi chuyển sang đoạn video khác)."""
+        self._temporal = TemporalState()
 
     def validate_detection(self, det: DetectionResult) -> Tuple[bool, Optional[str], str, str]:
         """
         Node P3.2 & P3.3: Đối soát quy tắc an toàn.
+        Kết quả tức thời, không xét điều kiện thời gian (dùng validate_batch cho luồng frame).
         Trả về: (is_violation, violation_type, severity, message)
         """
-        room_type = det.metadata.get("room_type")
-        room_rules = self.rules.get(room_type, {})
-        
-        obj_name = det.class_name
-        pos = det.position
-        
-        # 1. Kiểm tra vật thể bị cấm hoàn toàn trong phòng (Trang 2)
-        if obj_name in room_rules.get("forbidden_objects", []):
-            return True, "forbidden_object", "CRITICAL", f"Phát hiện {obj_name} trong {det.metadata.get('room_name')}!"
-
-        # 2. Kiểm tra vật thể bị cấm để dưới sàn (Trang 2)
-        if pos == "floor":
-            forbidden_on_floor = room_rules.get("forbidden_on_floor", [])
-            
-            # Kiểm tra vật thể cụ thể hoặc nhóm vật thể nguy hiểm (Trang 15)
-            if obj_name in forbidden_on_floor or (
-                "any_sharp_object" in forbidden_on_floor and obj_name in OBJECT_CATEGORIES["DANGEROUS"]
-            ):
-                return True, "forbidden_on_floor", "HIGH", f"Phát hiện {obj_name} đặt sai vị trí (dưới sàn)!"
-
-        return False, None, "INFO", ""
\ No newline at end of file
+        metadata = det.metadata
+        result = self._compiled.verdict(metadata.get("room_type"), metadata.get("room_name"),
+                                        det.class_name, det.position)
+        RULE_EVALUATIONS.inc()
+        if result[0]:
+            VIOLATIONS.inc(result[2])
+        return result
+
+    def validate_batch(self, detections: List[DetectionResult],
+                       metadata: Optional[dict] = None) -> List[Tuple[bool, Optional[str], str, str]]:
+        """
+        Đối soát toàn bộ detection của một frame trong một lần gọi.
+        Cả frame dùng cùng một bảng quy tắc kể cả khi đang cập nhật nóng.
+        Vi phạm có điều kiện thời gian ("temporal") chỉ được trả về khi đã thỏa, trạng thái cửa sổ
+        cập nhật O(1) mỗi detection; cần gọi theo đúng thứ tự frame của từng camera.
+        :param metadata: Metadata của frame, để frame không có detection vẫn được đếm vào cửa sổ.
+        """
+        compiled = self._compiled
+        verdict = compiled.verdict
+        results = [verdict(det.metadata.get("room_type"), det.metadata.get("room_name"), det.class_name, det.position)
+                   for det in detections]
+        if compiled.temporal:
+            waiting = self._temporal.apply(compiled, detections, results, metadata, NO_VIOLATION)
+            if waiting:
+                TEMPORAL_PENDING.inc(amount=waiting)
+        if REGISTRY.enabled and results:
+            RULE_EVALUATIONS.inc(amount=len(results))
+            for is_violation, _, severity, _ in results:
+                if is_violation:
+                    VIOLATIONS.inc(severity)
+        return results
@@ -0,0 +1,153 @@
+# src/p3_context/temporal.py
+
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from configs.config import TEMPORAL_BUCKETS, TEMPORAL_MAX_KEYS
+
+
+class WindowCounter:
+    """
+    Bộ đếm cửa sổ trượt chia thùng cố định: cửa sổ `seconds` giây gồm `num_buckets` thùng,
+    cộng và lấy tổng đều O(1) (mỗi lần dịch cửa sổ xóa tối đa num_buckets thùng), không lưu lịch sử frame.
+    """
+    __slots__ = ("width", "buckets", "head", "total")
+
+    def __init__(self, seconds: float, num_buckets: int = TEMPORAL_BUCKETS):
+        self.width = seconds / num_buckets
+        self.buckets = [0] * num_buckets
+        self.head: Optional[int] = None  # Chỉ số (t // width) của thùng mới nhất
+        self.total = 0
+
+    def _advance(self, t: float):
+        index = int(t // self.width)
+        head = self.head
+        size = len(self.buckets)
+        if head is None or index >= head + size or index <= head - size:
+            # Lần đầu, cách quá một cửa sổ hoặc thời gian lùi hẳn (vd video khác): bắt đầu lại
+            self.buckets = [0] * size
+            self.total = 0
+            self.head = index
+        elif index > head:
+            for i in range(head + 1, index + 1):
+                slot = i % size
+                self.total -= self.buckets[slot]
+                self.buckets[slot] = 0
+            self.head = index
+        # index <= head trong cùng cửa sổ (frame đến trễ): tính vào thùng mới nhất
+
+    def add(self, t: float, amount: int = 1):
+        self._advance(t)
+        self.buckets[self.head % len(self.buckets)] += amount
+        self.total += amount
+
+    def count(self, t: float) -> int:
+        self._advance(t)
+        return self.total
+
+
+class _Track:
+    """Số frame có vi phạm (camera, lớp, loại vi phạm) trong cửa sổ, kèm thời điểm bắt đầu vi phạm."""
+    __slots__ = ("hits", "first_seen", "last_seen", "seconds")
+
+    def __init__(self, seconds: float, t: float):
+        self.hits = WindowCounter(seconds)
+        self.first_seen = t
+        self.last_seen = None
+        self.seconds = seconds
+
+
+def _epoch(ts) -> Optional[float]:
+    if isinstance(ts, datetime):
+        return ts.timestamp()
+    return ts
+
+
+class TemporalState:
+    def __init__(self, max_keys: int = TEMPORAL_MAX_KEYS):
+        """
+        Trạng thái quy tắc theo thời gian (vd "dao dưới sàn phòng trẻ em >= 3 giây trong >= 80% số frame").
+        Mỗi (camera, lớp, loại vi phạm) có một WindowCounter số frame vi phạm, mỗi camera một bộ đếm tổng số frame.
+        Vị trí thuộc về kết quả đối soát chứ không thuộc khóa: vật bị xếp nhầm sang vị trí khác vài frame
+        (gần ranh giới vùng) chỉ làm giảm tỉ lệ, không đặt lại cửa sổ.
+        Khóa không được cập nhật quá một cửa sổ thì bị loại (sắp theo lần cập nhật gần nhất, O(1) mỗi lần).
+        :param max_keys: Số khóa (camera, lớp, loại vi phạm) tối đa giữ trong bộ nhớ.
+        """
+        self.max_keys = max_keys
+        self.tracks: "OrderedDict[tuple, _Track]" = OrderedDict()
+        self.frames: Dict[Tuple[str, float], WindowCounter] = {}
+        self._last_frame: Dict[str, float] = {}
+
+    def _evict(self, t: float):
+        tracks = self.tracks
+        while tracks:
+            key, track = next(iter(tracks.items()))
+            if t - track.last_seen <= track.seconds and len(tracks) <= self.max_keys:
+                break
+            tracks.popitem(last=False)
+
+    def observe_frame(self, camera_id: str, t: float, windows):
+        """Đếm một frame của camera cho mọi độ dài cửa sổ mà phòng của camera dùng."""
+        if self._last_frame.get(camera_id) == t:
+            return
+        self._last_frame[camera_id] = t
+        for seconds in windows:
+            counter = self.frames.get((camera_id, seconds))
+            if counter is None:
+                counter = self.frames[(camera_id, seconds)] = WindowCounter(seconds)
+            counter.add(t)
+
+    def confirm(self, camera_id: str, class_name: str, violation_type: str, t: float,
+                seconds: float, ratio: float) -> bool:
+        """
+        Ghi nhận vi phạm ở frame thời điểm t và cho biết điều kiện thời gian đã thỏa:
+        đã vi phạm ít nhất `seconds` giây và trong ít nhất `ratio` số frame của cửa sổ.
+        """
+        key = (camera_id, class_name, violation_type)
+        track = self.tracks.get(key)
+        if track is None or track.seconds != seconds or t < track.last_seen or t - track.last_seen > seconds:
+            track = self.tracks[key] = _Track(seconds, t)
+        if track.last_seen != t:  # Nhiều bbox cùng lớp/vi phạm trong một frame chỉ tính một lần
+            track.hits.add(t)
+            track.last_seen = t
+        self.tracks.move_to_end(key)
+        self._evict(t)
+
+        if t - track.first_seen < seconds:
+            return False
+        frames = self.frames.get((camera_id, seconds))
+        total = frames.count(t) if frames is not None else 0
+        return total > 0 and track.hits.count(t) >= ratio * total
+
+    def apply(self, compiled, detections: list, results: List[tuple], metadata: Optional[dict],
+              pending: tuple) -> int:
+        """
+        Áp dụng quy tắc theo thời gian lên kết quả tức thời của một frame (sửa trực tiếp `results`).
+        Chỉ vi phạm có loại được khai báo điều kiện thời gian mới bị giữ lại; chưa thỏa thì thay bằng
+        `pending` (không cảnh báo).
+        :param metadata: Metadata của frame (để đếm cả frame không có detection); None thì lấy từ detection.
+        :return: Số vi phạm đang chờ đủ điều kiện thời gian.
+        """
+        if metadata is None:
+            if not detections:
+                return 0
+            metadata = detections[0].metadata
+        camera_id = metadata.get("camera_id")
+        room_type = metadata.get("room_type")
+        windows = compiled.temporal_windows.get(room_type)
+        t = _epoch(metadata.get("timestamp"))
+        if not windows or t is None:
+            return 0
+
+        self.observe_frame(camera_id, t, windows)
+        temporal = compiled.temporal
+        waiting = 0
+        for i, (det, result) in enumerate(zip(detections, results)):
+            if not result[0]:
+                continue
+            v_type = result[1]
+            qualifier = temporal.get((room_type, det.class_name, v_type))
+            if qualifier is not None and not self.confirm(camera_id, det.class_name, v_type, t, *qualifier):
+                results[i] = pending
+                waiting += 1
+        return waiting
@@ -1,17 +1,52 @@
 # src/p4_action/alert_manager.py
 
 import time
+import uuid
+from collections import OrderedDict
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Optional
+import numpy as np
 from src.utils.helpers import DetectionResult, AlertMessage
-from configs.config import DEDUPLICATION_TIME
+from src.p4_action.notifier import NotificationDispatcher, ConsoleSink, WebhookSink
+from src.utils.metrics import REGISTRY
+from configs.config import DEDUPLICATION_TIME, ALERT_DEDUP_IOU, ALERT_HISTORY_MAX, NOTIFY_WEBHOOK_URL
+
+# Số cảnh báo gần nhất giữ lại cho mỗi khóa (camera, vật thể)
+_MAX_ENTRIES_PER_KEY = 32
+
+ALERTS_TRIGGERED = REGISTRY.counter("p4_alerts_triggered_total", "Số cảnh báo đã phát", ("camera_id",))
+ALERTS_DEDUPLICATED = REGISTRY.counter("p4_alerts_deduplicated_total", "Số cảnh báo bị lọc trùng", ("camera_id",))
+
 
 class AlertManager:
-    def __init__(self):
+    def __init__(self, dispatcher: Optional[NotificationDispatcher] = None, notify: bool = True,
+                 dedup_interval: float = DEDUPLICATION_TIME, iou_threshold: float = ALERT_DEDUP_IOU,
+                 max_keys: int = ALERT_HISTORY_MAX, evidence_recorder=None):
+        """
+        Module P4: Lọc trùng và gửi cảnh báo.
+        :param dispatcher: Bộ gửi thông báo nền (mặc định: Console + Webhook nếu có NOTIFY_WEBHOOK_URL).
+        :param notify: False để chỉ lọc trùng, không gửi thông báo.
+        :param iou_threshold: Hai bbox cùng lớp có IoU >= ngưỡng được coi là cùng một vật thể.
+        :param max_keys: Số khóa tối đa trong lịch sử lọc trùng (giới hạn bộ nhớ).
+        :param evidence_recorder: EvidenceRecorder lưu ảnh chụp/clip và điền image_path (None: không lưu).
+        """
         # Lưu trữ lịch sử cảnh báo để lọc trùng (Node P4.2)
-        # Cấu trúc: {(room_id, object_class): last_alert_time}
-        self.alert_history: Dict[tuple, float] = {}
-        self.dedup_interval = DEDUPLICATION_TIME # 30 giây theo yêu cầu
+        # Cấu trúc: {(camera_id, object_class): [[bbox, track_id, last_alert_time], ...]}
+        # Sắp theo thời gian cập nhật gần nhất để loại bỏ khóa hết hạn (TTL) với chi phí O(1)
+        self.alert_history: "OrderedDict[tuple, List[list]]" = OrderedDict()
+        self.dedup_interval = dedup_interval # 30 giây theo yêu cầu
+        self.iou_threshold = iou_threshold
+        self.max_keys = max_keys
+        self.triggered_count = 0
+        self.deduplicated_count = 0
+
+        if dispatcher is None and notify:
+            sinks = [ConsoleSink()]
+            if NOTIFY_WEBHOOK_URL:
+                sinks.append(WebhookSink(NOTIFY_WEBHOOK_URL))
+            dispatcher = NotificationDispatcher(sinks).start()
+        self.dispatcher = dispatcher if notify else None
+        self.evidence_recorder = evidence_recorder
 
     def _calculate_iou(self, bbox1, bbox2):
         """Hàm bổ trợ tính IoU để xác định độ trùng lắp vị trí (Trang 24)"""
@@ -19,45 +54,101 @@ class AlertManager:
         y1 = max(bbox1[1], bbox2[1])
         x2 = min(bbox1[2], bbox2[2])
         y2 = min(bbox1[3], bbox2[3])
-        
+
         intersection = max(0, x2 - x1) * max(0, y2 - y1)
         area1 = (bbox1[2] - bbox1[0]) * (bbox1[3] - bbox1[1])
         area2 = (bbox2[2] - bbox2[0]) * (bbox2[3] - bbox2[1])
         union = area1 + area2 - intersection
-        
+
         return intersection / union if union > 0 else 0
 
-    def is_duplicate(self, det: DetectionResult) -> bool:
+    def _evict(self, current_time: float):
+        """Loại bỏ các khóa đã hết hạn (TTL) hoặc vượt quá max_keys, bắt đầu từ khóa cũ nhất."""
+        history = self.alert_history
+        while history:
+            key, entries = next(iter(history.items()))
+            newest = max(entry[2] for entry in entries)
+            if current_time - newest < self.dedup_interval and len(history) <= self.max_keys:
+                break
+            history.popitem(last=False)
+
+    def is_duplicate(self, det: DetectionResult, current_time: Optional[float] = None) -> bool:
         """
         Node P4.2: Thuật toán lọc trùng cảnh báo (Trang 23).
         Kiểm tra nếu cùng vật thể, cùng phòng vi phạm trong khoảng thời gian ngắn.
+        Cùng vật thể: cùng track_id (nếu có) hoặc bbox trùng lắp (IoU >= ngưỡng),
+        nên hai vật cùng loại ở hai chỗ khác nhau vẫn là hai cảnh báo riêng.
         """
-        current_time = time.time()
-        key = (det.metadata.get("camera_id"), det.class_name, det.position)
-        
-        if key in self.alert_history:
-            last_time = self.alert_history[key]
-            if (current_time - last_time) < self.dedup_interval:
-                return True
-        
+        if current_time is None:
+            current_time = time.time()
+
+        key = (det.metadata.get("camera_id"), det.class_name)
+        entries = self.alert_history.get(key)
+        if entries is None:
+            entries = []
+        else:
+            # Bỏ các bản ghi hết hạn của khóa này
+            entries = [e for e in entries if current_time - e[2] < self.dedup_interval]
+
+        duplicate = False
+        for entry in entries:
+            bbox, track_id, _ = entry
+            same_track = det.track_id is not None and track_id == det.track_id
+            if same_track or self._calculate_iou(bbox, det.bbox) >= self.iou_threshold:
+                duplicate = True
+                break
+
         # Cập nhật thời gian cảnh báo mới nhất
-        self.alert_history[key] = current_time
-        return False
+        if not duplicate:
+            entries.append([det.bbox, det.track_id, current_time])
+            if len(entries) > _MAX_ENTRIES_PER_KEY:
+                entries = entries[-_MAX_ENTRIES_PER_KEY:]
+
+        if entries:
+            self.alert_history[key] = entries
+            self.alert_history.move_to_end(key)
+        else:
+            self.alert_history.pop(key, None)
+        self._evict(current_time)
+        return duplicate
 
-    def trigger(self, det: DetectionResult, violation_info: tuple):
+    def trigger(self, det: DetectionResult, violation_info: tuple, frame: Optional[np.ndarray] = None,
+                current_time: Optional[float] = None) -> Optional[AlertMessage]:
         """
         Node P4.1 & P4.3: Tạo và gửi cảnh báo.
+        :param frame: Frame gốc chứa vi phạm, để lưu ảnh chụp/clip bằng chứng.
+        :param current_time: Thời điểm (epoch) dùng để lọc trùng, mặc định là thời gian thực;
+                             khi phân tích video ghi sẵn thì truyền thời điểm của frame.
+        :return: AlertMessage nếu cảnh báo được phát (truthy), None nếu không vi phạm hoặc bị lọc trùng.
         """
         is_violation, v_type, severity, msg = violation_info
-        
-        if is_violation and not self.is_duplicate(det):
-            # 1. Tạo Alert Object (P4.1)
-            timestamp_str = det.metadata.get("timestamp").strftime("%Y-%m-%d %H:%M:%S")
-            
-            # 2. In cảnh báo ra Console (P4.3)
-            # Định dạng: [Severity] Message (Timestamp)
-            print(f"[{severity}] {msg} ({timestamp_str})")
-            
-            # Trong thực tế, đây là nơi gọi API gửi SMS/Push Notification hoặc lưu DB
-            return True
-        return False
\ No newline at end of file
+        if not is_violation:
+            return None
+
+        if self.is_duplicate(det, current_time):
+            self.deduplicated_count += 1
+            ALERTS_DEDUPLICATED.inc(det.metadata.get("camera_id"))
+            return None
+
+        # 1. Tạo Alert Object (P4.1)
+        alert = AlertMessage(
+            alert_id=uuid.uuid4().hex,
+            timestamp=det.metadata.get("timestamp") or datetime.now(),
+            room_name=det.metadata.get("room_name"),
+            violation_type=v_type,
+            severity=severity,
+            message=msg,
+            camera_id=det.metadata.get("camera_id"),
+            class_name=det.class_name
+        )
+        self.triggered_count += 1
+        ALERTS_TRIGGERED.inc(alert.camera_id)
+
+        # Lưu bằng chứng trước khi gửi để thông báo có image_path (nén/ghi file chạy nền)
+        if self.evidence_recorder is not None and frame is not None:
+            self.evidence_recorder.capture(alert, frame, det.bbox)
+
+        # 2. Gửi thông báo qua hàng đợi nền (Console/SMS/Push) - không chặn luồng xử lý frame (P4.3)
+        if self.dispatcher is not None:
+            self.dispatcher.submit(alert)
+        return alert
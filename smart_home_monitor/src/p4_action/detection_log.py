@@ -0,0 +1,216 @@
+# src/p4_action/detection_log.py
+
+import os
+import json
+import time
+import threading
+import numpy as np
+from datetime import datetime
+from typing import Dict, List, Optional
+from configs.config import DETECTION_LOG_DIR, DETECTION_LOG_FLUSH_ROWS, DETECTION_LOG_FLUSH_INTERVAL
+from src.utils.helpers import DetectionResult, POSITIONS
+
+# Mỗi cột là một file nhị phân riêng (<tên>.bin), chỉ ghi nối tiếp, đọc bằng np.memmap
+COLUMNS = {
+    "timestamp": np.dtype("<f8"),      # epoch (giây)
+    "camera": np.dtype("<u2"),         # mã trong từ điển "camera"
+    "room_type": np.dtype("<u2"),      # mã trong từ điển "room_type"
+    "class": np.dtype("<u2"),          # mã trong từ điển "class"
+    "position": np.dtype("u1"),        # chỉ số trong POSITIONS
+    "confidence": np.dtype("<f4"),
+    "track_id": np.dtype("<i4"),       # -1: không có track
+    "bbox": np.dtype(("<i4", (4,))),   # [x1, y1, x2, y2] theo khung hình gốc
+}
+DICTIONARIES = ("camera", "room_type", "class")
+_DICTIONARY_FILE = "dictionary.json"
+
+
+def _column_path(directory: str, name: str) -> str:
+    return os.path.join(directory, f"{name}.bin")
+
+
+def _load_dictionary(directory: str) -> Dict[str, List[str]]:
+    path = os.path.join(directory, _DICTIONARY_FILE)
+    if not os.path.exists(path):
+        return {kind: [] for kind in DICTIONARIES}
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return {kind: list(data.get(kind, [])) for kind in DICTIONARIES}
+
+
+def _row_count(directory: str) -> int:
+    """Số dòng đầy đủ (mọi cột đều đã ghi); dòng ghi dở do dừng đột ngột bị bỏ qua."""
+    counts = []
+    for name, dtype in COLUMNS.items():
+        path = _column_path(directory, name)
+        counts.append(os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0)
+    return min(counts)
+
+
+class DetectionLog:
+    def __init__(self, directory: str = DETECTION_LOG_DIR, flush_rows: int = DETECTION_LOG_FLUSH_ROWS,
+                 flush_interval: float = DETECTION_LOG_FLUSH_INTERVAL):
+        """
+        Nhật ký detection dạng cột, chỉ ghi nối tiếp (append-only), để chấm lại quy tắc
+        (backtest_rules.py) mà không cần chạy lại YOLO. Chuỗi camera/phòng/lớp được mã hóa
+        bằng từ điển (dictionary.json), mỗi dòng ~40 byte.
+        Chỉ một tiến trình được ghi vào một thư mục; nhiều pipeline trong cùng tiến trình dùng chung một đối tượng.
+        :param flush_rows: Số dòng gom trong bộ nhớ trước khi ghi xuống đĩa.
+        :param flush_interval: Giây tối đa giữa hai lần ghi.
+        """
+        self.directory = directory
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+
+        self.dictionary = _load_dictionary(directory)
+        self._codes = {kind: {value: code for code, value in enumerate(values)}
+                       for kind, values in self.dictionary.items()}
+        self._dictionary_dirty = False
+
+        # Cắt phần ghi dở (nếu có) để mọi cột cùng số dòng trước khi ghi tiếp
+        self.rows = _row_count(directory)
+        self._files = {}
+        for name, dtype in COLUMNS.items():
+            path = _column_path(directory, name)
+            with open(path, "ab") as f:
+                f.truncate(self.rows * dtype.itemsize)
+            self._files[name] = open(path, "ab")
+
+        self._pending: Dict[str, list] = {name: [] for name in COLUMNS}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self.closed = False
+
+    def _code(self, kind: str, value: Optional[str]) -> int:
+        value = "" if value is None else str(value)
+        code = self._codes[kind].get(value)
+        if code is None:
+            code = self._codes[kind][value] = len(self.dictionary[kind])
+            self.dictionary[kind].append(value)
+            self._dictionary_dirty = True
+        return code
+
+    def record_detections(self, detections: List[DetectionResult]):
+        """
+        Ghi detection của một frame (vào bộ đệm, xuống đĩa theo flush_rows/flush_interval).
+        Frame không có detection vẫn nên gọi (danh sách rỗng) để dòng đang đệm được ghi đúng hạn khi camera vắng vật thể.
+        """
+        if not detections:
+            if self._pending["timestamp"] and time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+            return
+        with self._lock:
+            if self.closed:
+                return
+            pending = self._pending
+            for det in detections:
+                meta = det.metadata
+                ts = meta.get("timestamp")
+                pending["timestamp"].append(ts.timestamp() if ts is not None else time.time())
+                pending["camera"].append(self._code("camera", meta.get("camera_id")))
+                pending["room_type"].append(self._code("room_type", meta.get("room_type")))
+                pending["class"].append(self._code("class", det.class_name))
+                pending["position"].append(POSITIONS.index(det.position))
+                pending["confidence"].append(det.confidence)
+                pending["track_id"].append(-1 if det.track_id is None else det.track_id)
+                pending["bbox"].append(det.bbox)
+
+            if (len(pending["timestamp"]) >= self.flush_rows
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush()
+
+    def _flush(self):
+        self._last_flush = time.monotonic()
+        count = len(self._pending["timestamp"])
+        if not count:
+            return
+        # Từ điển ghi trước (đổi tên nguyên tử) để dòng trên đĩa không bao giờ tham chiếu mã chưa có
+        if self._dictionary_dirty:
+            path = os.path.join(self.directory, _DICTIONARY_FILE)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(self.dictionary, f, ensure_ascii=False)
+            os.replace(path + ".tmp", path)
+            self._dictionary_dirty = False
+
+        for name, dtype in COLUMNS.items():
+            f = self._files[name]
+            f.write(np.asarray(self._pending[name], dtype=dtype.base).tobytes())
+            f.flush()
+            self._pending[name].clear()
+        self.rows += count
+
+    def flush(self):
+        with self._lock:
+            if not self.closed:
+                self._flush()
+
+    def close(self):
+        """Ghi nốt bộ đệm rồi đóng file; gọi nhiều lần không lỗi, detection ghi sau khi đóng bị bỏ qua."""
+        with self._lock:
+            if self.closed:
+                return
+            self._flush()
+            for f in self._files.values():
+                f.close()
+            self.closed = True
+
+
+class DetectionLogReader:
+    def __init__(self, directory: str = DETECTION_LOG_DIR):
+        """
+        Đọc nhật ký detection bằng np.memmap (không nạp cả file vào RAM).
+        Chỉ thấy các dòng đã ghi xuống đĩa tại thời điểm mở.
+        """
+        self.directory = directory
+        self.dictionary = _load_dictionary(directory)
+        self.rows = _row_count(directory) if os.path.isdir(directory) else 0
+        self.columns: Dict[str, np.ndarray] = {}
+        for name, dtype in COLUMNS.items():
+            if self.rows == 0:
+                # np.memmap không mở được vùng rỗng
+                self.columns[name] = np.empty((0,) + dtype.shape, dtype=dtype.base)
+            else:
+                self.columns[name] = np.memmap(_column_path(directory, name), dtype=dtype.base, mode="r",
+                                               shape=(self.rows,) + dtype.shape)
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def codes(self, kind: str, values: List[str]) -> np.ndarray:
+        """Mã từ điển của các giá trị (giá trị chưa từng xuất hiện bị bỏ qua)."""
+        lookup = {value: code for code, value in enumerate(self.dictionary[kind])}
+        return np.asarray([lookup[v] for v in values if v in lookup], dtype=np.int64)
+
+    def select(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+               camera_ids: Optional[List[str]] = None) -> np.ndarray:
+        """Chỉ số các dòng trong [start, end) của các camera cho trước, sắp theo thời gian."""
+        ts = self.columns["timestamp"]
+        mask = np.ones(self.rows, dtype=bool)
+        if start is not None:
+            mask &= ts >= start.timestamp()
+        if end is not None:
+            mask &= ts < end.timestamp()
+        if camera_ids is not None:
+            mask &= np.isin(self.columns["camera"], self.codes("camera", camera_ids))
+        rows = np.flatnonzero(mask)
+        # Nhiều camera ghi xen kẽ nên thứ tự ghi chỉ gần đúng theo thời gian
+        return rows[np.argsort(ts[rows], kind="stable")]
+
+    def to_result(self, row: int, room_names: Optional[Dict[str, str]] = None) -> DetectionResult:
+        """Dựng lại DetectionResult của một dòng (room_name lấy theo camera từ room_names nếu có)."""
+        camera_id = self.dictionary["camera"][self.columns["camera"][row]] or None
+        track_id = int(self.columns["track_id"][row])
+        return DetectionResult(
+            class_name=self.dictionary["class"][self.columns["class"][row]],
+            confidence=float(self.columns["confidence"][row]),
+            bbox=self.columns["bbox"][row].tolist(),
+            position=POSITIONS[self.columns["position"][row]],
+            track_id=track_id if track_id >= 0 else None,
+            metadata={"camera_id": camera_id,
+                      "room_type": self.dictionary["room_type"][self.columns["room_type"][row]] or None,
+                      "room_name": (room_names or {}).get(camera_id),
+                      "timestamp": datetime.fromtimestamp(float(self.columns["timestamp"][row]))})
@@ -0,0 +1,206 @@
+# src/p4_action/event_store.py
+
+import os
+import time
+import queue
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from configs.config import EVENT_DB_PATH, EVENT_BATCH_SIZE, EVENT_FLUSH_INTERVAL, EVENT_QUEUE_SIZE
+from src.utils.helpers import DetectionResult, AlertMessage
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS detections (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp REAL NOT NULL,
+    camera_id TEXT,
+    room_type TEXT,
+    class TEXT,
+    confidence REAL,
+    position TEXT,
+    track_id INTEGER,
+    x1 INTEGER, y1 INTEGER, x2 INTEGER, y2 INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_detections_camera_ts ON detections (camera_id, timestamp);
+
+CREATE TABLE IF NOT EXISTS alerts (
+    alert_id TEXT PRIMARY KEY,
+    timestamp REAL NOT NULL,
+    camera_id TEXT,
+    room_name TEXT,
+    class TEXT,
+    violation_type TEXT,
+    severity TEXT,
+    message TEXT,
+    image_path TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_alerts_ts ON alerts (timestamp);
+CREATE INDEX IF NOT EXISTS idx_alerts_camera_ts ON alerts (camera_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_alerts_severity_ts ON alerts (severity, timestamp);
+"""
+
+_INSERT_DETECTION = ("INSERT INTO detections (timestamp, camera_id, room_type, class, confidence, position, "
+                     "track_id, x1, y1, x2, y2) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+_INSERT_ALERT = ("INSERT OR REPLACE INTO alerts (alert_id, timestamp, camera_id, room_name, class, "
+                 "violation_type, severity, message, image_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)")
+
+
+def _epoch(ts: Optional[datetime]) -> float:
+    return ts.timestamp() if ts is not None else time.time()
+
+
+class EventStore:
+    def __init__(self, db_path: str = EVENT_DB_PATH, batch_size: int = EVENT_BATCH_SIZE,
+                 flush_interval: float = EVENT_FLUSH_INTERVAL, queue_size: int = EVENT_QUEUE_SIZE):
+        """
+        Kho sự kiện SQLite (chế độ WAL) lưu detection và cảnh báo lâu dài.
+        Việc ghi do một luồng nền gom lô thực hiện; luồng xử lý frame chỉ đưa bản ghi vào hàng đợi.
+        :param db_path: Đường dẫn file cơ sở dữ liệu.
+        :param batch_size: Số bản ghi tối đa trong một transaction.
+        :param flush_interval: Giây tối đa giữa hai lần ghi.
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+        self._queue: "queue.Queue[tuple]" = queue.Queue(maxsize=queue_size)
+        self._local = threading.local()
+        self._stop_event = threading.Event()
+        self._writer = threading.Thread(target=self._run, name="P4-event-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        """Mỗi luồng đọc dùng một kết nối riêng (WAL cho phép đọc song song với luồng ghi)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    # --- Ghi (không chặn) ---
+    def _put(self, item: tuple):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def record_detections(self, detections: List[DetectionResult]):
+        """Đưa detection của một frame vào hàng đợi ghi."""
+        if not detections:
+            return
+        rows = []
+        for det in detections:
+            meta = det.metadata
+            x1, y1, x2, y2 = det.bbox
+            rows.append((_epoch(meta.get("timestamp")), meta.get("camera_id"), meta.get("room_type"),
+                         det.class_name, det.confidence, det.position, det.track_id, x1, y1, x2, y2))
+        self._put((_INSERT_DETECTION, rows))
+
+    def record_alert(self, alert: AlertMessage):
+        """Đưa một cảnh báo vào hàng đợi ghi."""
+        self._put((_INSERT_ALERT, [(alert.alert_id, _epoch(alert.timestamp), alert.camera_id, alert.room_name,
+                                    alert.class_name, alert.violation_type, alert.severity, alert.message,
+                                    alert.image_path)]))
+
+    def _write(self, conn: sqlite3.Connection, batch: List[tuple]):
+        grouped: Dict[str, list] = {}
+        for sql, rows in batch:
+            grouped.setdefault(sql, []).extend(rows)
+        with conn:
+            for sql, rows in grouped.items():
+                conn.executemany(sql, rows)
+
+    def _run(self):
+        conn = self._connect()
+        try:
+            while not (self._stop_event.is_set() and self._queue.empty()):
+                try:
+                    batch = [self._queue.get(timeout=0.2)]
+                except queue.Empty:
+                    continue
+                deadline = time.monotonic() + self.flush_interval
+                count = len(batch[0][1])
+                while count < self.batch_size and time.monotonic() < deadline and not self._stop_event.is_set():
+                    # Chờ từng đoạn ngắn để close() không phải đợi hết flush_interval mới ghi lô đang gom
+                    try:
+                        item = self._queue.get(timeout=min(0.2, max(0.0, deadline - time.monotonic())))
+                    except queue.Empty:
+                        continue
+                    batch.append(item)
+                    count += len(item[1])
+                try:
+                    self._write(conn, batch)
+                except sqlite3.Error as e:
+                    print(f"[Error] Không thể ghi sự kiện vào {self.db_path}: {e}")
+        finally:
+            conn.close()
+
+    def close(self, timeout: float = 5.0):
+        """Ghi nốt các bản ghi còn trong hàng đợi rồi dừng luồng ghi."""
+        self._stop_event.set()
+        self._writer.join(timeout=timeout)
+
+    # --- Truy vấn ---
+    @staticmethod
+    def _rows(cursor) -> List[Dict[str, Any]]:
+        records = []
+        for row in cursor:
+            record = dict(row)
+            record["timestamp"] = datetime.fromtimestamp(record["timestamp"])
+            records.append(record)
+        return records
+
+    def last_alerts(self, limit: int = 10, offset: int = 0, camera_id: Optional[str] = None,
+                    severity: Optional[str] = None) -> List[Dict[str, Any]]:
+        """N cảnh báo mới nhất (phân trang bằng offset), lọc theo camera/mức độ nếu cần."""
+        where, params = [], []
+        if camera_id is not None:
+            where.append("camera_id = ?")
+            params.append(camera_id)
+        if severity is not None:
+            where.append("severity = ?")
+            params.append(severity)
+        sql = "SELECT * FROM alerts"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY timestamp DESC LIMIT ? OFFSET ?"
+        return self._rows(self._reader().execute(sql, params + [limit, offset]))
+
+    def alerts_between(self, start: datetime, end: datetime, camera_id: Optional[str] = None,
+                       severity: Optional[str] = None, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Cảnh báo trong khoảng thời gian [start, end), theo thứ tự thời gian."""
+        sql = "SELECT * FROM alerts WHERE timestamp >= ? AND timestamp < ?"
+        params: list = [start.timestamp(), end.timestamp()]
+        if camera_id is not None:
+            sql += " AND camera_id = ?"
+            params.append(camera_id)
+        if severity is not None:
+            sql += " AND severity = ?"
+            params.append(severity)
+        sql += " ORDER BY timestamp LIMIT ?"
+        return self._rows(self._reader().execute(sql, params + [limit]))
+
+    def detections_between(self, camera_id: str, start: datetime, end: datetime,
+                           limit: int = 10000) -> List[Dict[str, Any]]:
+        """Detection của một camera trong khoảng thời gian [start, end)."""
+        sql = ("SELECT * FROM detections WHERE camera_id = ? AND timestamp >= ? AND timestamp < ? "
+               "ORDER BY timestamp LIMIT ?")
+        return self._rows(self._reader().execute(sql, (camera_id, start.timestamp(), end.timestamp(), limit)))
+
+    def count_alerts(self) -> int:
+        return self._reader().execute("SELECT COUNT(*) FROM alerts").fetchone()[0]
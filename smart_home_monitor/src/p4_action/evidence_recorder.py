@@ -0,0 +1,259 @@
+# src/p4_action/evidence_recorder.py
+
+import os
+import time
+import queue
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+from configs.config import (CAMERA_CONFIG, EVIDENCE_DIR, EVIDENCE_PRE_SECONDS, EVIDENCE_POST_SECONDS,
+                            EVIDENCE_FPS, EVIDENCE_MEMORY_MB, EVIDENCE_JPEG_QUALITY, EVIDENCE_MAX_WIDTH,
+                            EVIDENCE_QUEUE_SIZE)
+from src.utils.helpers import AlertMessage
+
+
+def _epoch(ts: Optional[datetime]) -> float:
+    return ts.timestamp() if ts is not None else time.time()
+
+
+class _CameraBuffer:
+    """
+    Ring buffer JPEG của một camera, giới hạn theo thời gian và dung lượng.
+    Frame chưa nén đang chờ trong hàng đợi (`queued` byte) cũng tính vào `max_bytes`:
+    nhận frame mới thì bỏ JPEG cũ nhất để nhường chỗ, hàng đợi của camera tự nó vượt giới hạn thì bỏ frame mới.
+    """
+
+    def __init__(self, seconds: float, max_bytes: int):
+        self.seconds = seconds
+        self.max_bytes = max_bytes
+        self.frames: Deque[Tuple[float, bytes]] = deque()
+        self.nbytes = 0
+        self.queued = 0
+        self._lock = threading.Lock()  # Luồng xử lý frame (reserve) và luồng nén (append) cùng sửa
+
+    def _evict(self, now: Optional[float] = None):
+        while self.frames and (self.nbytes + self.queued > self.max_bytes
+                               or (now is not None and now - self.frames[0][0] > self.seconds)):
+            _, old = self.frames.popleft()
+            self.nbytes -= len(old)
+
+    def reserve(self, size: int) -> bool:
+        """Giữ chỗ cho một frame chưa nén sắp vào hàng đợi; False nếu vượt giới hạn (bỏ frame)."""
+        with self._lock:
+            if self.queued + size > self.max_bytes:
+                return False
+            self.queued += size
+            self._evict()
+            return True
+
+    def release(self, size: int):
+        """Frame đã rời hàng đợi (đã nén hoặc bị bỏ)."""
+        with self._lock:
+            self.queued -= size
+
+    def append(self, ts: float, jpeg: bytes):
+        with self._lock:
+            self.frames.append((ts, jpeg))
+            self.nbytes += len(jpeg)
+            self._evict(ts)
+
+    def between(self, start: float, end: float) -> List[bytes]:
+        with self._lock:
+            return [jpeg for ts, jpeg in self.frames if start <= ts <= end]
+
+    def latest(self) -> float:
+        with self._lock:
+            return self.frames[-1][0] if self.frames else 0.0
+
+
+class EvidenceRecorder:
+    def __init__(self, output_dir: str = EVIDENCE_DIR, pre_seconds: float = EVIDENCE_PRE_SECONDS,
+                 post_seconds: float = EVIDENCE_POST_SECONDS, fps: float = EVIDENCE_FPS,
+                 memory_mb: float = EVIDENCE_MEMORY_MB, jpeg_quality: int = EVIDENCE_JPEG_QUALITY,
+                 max_width: int = EVIDENCE_MAX_WIDTH, queue_size: int = EVIDENCE_QUEUE_SIZE):
+        """
+        Lưu bằng chứng cho cảnh báo (P4): ảnh chụp JPEG và đoạn clip trước/sau thời điểm cảnh báo.
+        Mỗi camera giữ các frame gần nhất dạng JPEG trong bộ nhớ; giới hạn `memory_mb` (ghi đè bằng khóa
+        "evidence_memory_mb" của camera) tính cả frame chưa nén đang chờ trong hàng đợi, nên luồng nén
+        chạy chậm cũng không làm bộ nhớ vượt giới hạn. Việc nén và ghi đĩa chạy trên luồng nền;
+        luồng xử lý frame chỉ thu nhỏ frame về `max_width` rồi đưa vào hàng đợi.
+        :param pre_seconds: Số giây trước cảnh báo đưa vào clip.
+        :param post_seconds: Số giây sau cảnh báo đưa vào clip.
+        :param fps: Số frame tối đa mỗi giây được lưu vào ring buffer.
+        :param max_width: Thu nhỏ frame về chiều rộng này trước khi đưa vào hàng đợi nén.
+        """
+        self.output_dir = output_dir
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.fps = fps
+        self.memory_mb = memory_mb
+        self.jpeg_quality = jpeg_quality
+        self.max_width = max_width
+        self.dropped = 0
+        self.snapshots_written = 0
+        self.clips_written = 0
+
+        self._buffers: Dict[str, _CameraBuffer] = {}
+        self._last_sampled: Dict[str, float] = {}
+        self._pending: List[tuple] = []  # (camera_id, start, end, path), chỉ luồng nén truy cập
+        self._encode_queue: "queue.Queue[tuple]" = queue.Queue(maxsize=queue_size)
+        self._write_queue: "queue.Queue[tuple]" = queue.Queue()
+        self._stop_event = threading.Event()
+        self._encoder = threading.Thread(target=self._encode_loop, name="P4-evidence-encoder", daemon=True)
+        self._writer = threading.Thread(target=self._write_loop, name="P4-evidence-writer", daemon=True)
+        self._encoder.start()
+        self._writer.start()
+
+    # --- Luồng xử lý frame (không chặn) ---
+    def _shrink(self, frame: np.ndarray) -> Tuple[np.ndarray, float]:
+        h, w = frame.shape[:2]
+        scale = min(1.0, self.max_width / w)
+        if scale < 1.0:
+            frame = cv2.resize(frame, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA)
+        return frame, scale
+
+    def _put(self, camera_id: str, item: tuple, frame: np.ndarray) -> bool:
+        buf = self._buffer(camera_id)
+        if not buf.reserve(frame.nbytes):
+            self.dropped += 1
+            return False
+        try:
+            self._encode_queue.put_nowait(item)
+            return True
+        except queue.Full:
+            buf.release(frame.nbytes)
+            self.dropped += 1
+            return False
+
+    def add_frame(self, camera_id: str, frame: np.ndarray, timestamp: Optional[datetime] = None):
+        """
+        Đưa một frame vào ring buffer của camera (lấy mẫu theo fps).
+        Frame không lớn hơn max_width được giữ theo tham chiếu tới khi nén xong nên không được sửa sau khi gọi.
+        """
+        ts = _epoch(timestamp)
+        if ts - self._last_sampled.get(camera_id, 0.0) < 1.0 / self.fps:
+            return
+        self._last_sampled[camera_id] = ts
+        frame, _ = self._shrink(frame)
+        self._put(camera_id, ("frame", camera_id, frame, ts), frame)
+
+    def capture(self, alert: AlertMessage, frame: np.ndarray, bbox: Optional[List[int]] = None) -> str:
+        """
+        Lên lịch lưu ảnh chụp và clip cho một cảnh báo, điền alert.image_path (file được ghi bất đồng bộ).
+        :param bbox: Bbox vật thể vi phạm để khoanh trên ảnh chụp.
+        :return: Đường dẫn ảnh chụp.
+        """
+        camera_id = alert.camera_id or "unknown"
+        ts = _epoch(alert.timestamp)
+        stem = f"{datetime.fromtimestamp(ts).strftime('%Y%m%d_%H%M%S')}_{alert.alert_id[:8]}"
+        base = os.path.join(self.output_dir, camera_id, stem)
+        alert.image_path = base + ".jpg"
+        frame, scale = self._shrink(frame)
+        if bbox is not None and scale < 1.0:
+            bbox = [int(v * scale) for v in bbox]
+        self._put(camera_id, ("alert", camera_id, frame, ts, bbox, base), frame)
+        return alert.image_path
+
+    # --- Luồng nén ---
+    def _buffer(self, camera_id: str) -> _CameraBuffer:
+        buf = self._buffers.get(camera_id)
+        if buf is None:
+            memory_mb = CAMERA_CONFIG.get(camera_id, {}).get("evidence_memory_mb", self.memory_mb)
+            seconds = self.pre_seconds + self.post_seconds
+            # setdefault: luồng xử lý frame và luồng nén có thể cùng tạo buffer lần đầu
+            buf = self._buffers.setdefault(camera_id, _CameraBuffer(seconds, int(memory_mb * 1024 * 1024)))
+        return buf
+
+    def _encode(self, frame: np.ndarray, bbox: Optional[List[int]] = None) -> Optional[bytes]:
+        """Nén frame (đã thu nhỏ ở _shrink), khoanh bbox (cùng tỉ lệ) nếu có."""
+        if bbox is not None:
+            frame = frame.copy()
+            x1, y1, x2, y2 = bbox
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        return jpeg.tobytes() if ok else None
+
+    def _flush_pending(self, now: Optional[float] = None, force: bool = False):
+        """Ghi các clip đã đủ phần sau cảnh báo (hoặc tất cả nếu force)."""
+        remaining = []
+        for camera_id, start, end, path in self._pending:
+            buf = self._buffer(camera_id)
+            latest = buf.latest()
+            # Đủ frame sau cảnh báo, hoặc camera đã ngừng gửi frame quá lâu
+            if force or latest >= end or (now is not None and now - end > self.post_seconds):
+                frames = buf.between(start, end)
+                if frames:
+                    self._write_queue.put(("clip", path, frames))
+            else:
+                remaining.append((camera_id, start, end, path))
+        self._pending = remaining
+
+    def _encode_loop(self):
+        while not (self._stop_event.is_set() and self._encode_queue.empty()):
+            try:
+                item = self._encode_queue.get(timeout=0.2)
+            except queue.Empty:
+                self._flush_pending(now=time.time())
+                continue
+
+            buf = self._buffer(item[1])
+            if item[0] == "frame":
+                _, camera_id, frame, ts = item
+                jpeg = self._encode(frame)
+                buf.release(frame.nbytes)
+                if jpeg is not None:
+                    buf.append(ts, jpeg)
+            else:
+                _, camera_id, frame, ts, bbox, base = item
+                snapshot = self._encode(frame, bbox)
+                buf.release(frame.nbytes)
+                if snapshot is not None:
+                    self._write_queue.put(("snapshot", base + ".jpg", snapshot))
+                self._pending.append((camera_id, ts - self.pre_seconds, ts + self.post_seconds, base + ".mp4"))
+            self._flush_pending()
+        self._flush_pending(force=True)
+        self._write_queue.put(None)
+
+    # --- Luồng ghi đĩa ---
+    def _write_clip(self, path: str, frames: List[bytes]):
+        images = [cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR) for jpeg in frames]
+        h, w = images[0].shape[:2]
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), self.fps, (w, h))
+        try:
+            for image in images:
+                if image.shape[:2] != (h, w):
+                    image = cv2.resize(image, (w, h))
+                writer.write(image)
+        finally:
+            writer.release()
+
+    def _write_loop(self):
+        while True:
+            item = self._write_queue.get()
+            if item is None:
+                break
+            kind, path, data = item
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if kind == "snapshot":
+                    with open(path, "wb") as f:
+                        f.write(data)
+                    self.snapshots_written += 1
+                else:
+                    self._write_clip(path, data)
+                    self.clips_written += 1
+            except (OSError, cv2.error) as e:
+                print(f"[Error] Không thể ghi bằng chứng {path}: {e}")
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Dung lượng (byte) ring buffer JPEG cộng frame chờ nén của từng camera."""
+        return {camera_id: buf.nbytes + buf.queued for camera_id, buf in list(self._buffers.items())}
+
+    def close(self, timeout: float = 5.0):
+        """Nén nốt hàng đợi, ghi các clip còn chờ (chỉ với frame đã có) rồi dừng các luồng nền."""
+        self._stop_event.set()
+        self._encoder.join(timeout=timeout)
+        self._writer.join(timeout=timeout)
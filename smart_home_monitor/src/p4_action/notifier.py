@@ -0,0 +1,195 @@
+# src/p4_action/notifier.py
+
+import json
+import time
+import queue
+import threading
+from typing import Dict, List, Optional
+from configs.config import (NOTIFY_QUEUE_SIZE, NOTIFY_BATCH_SIZE, NOTIFY_FLUSH_INTERVAL,
+                            NOTIFY_MAX_RETRIES, NOTIFY_RETRY_BACKOFF, NOTIFY_RATE_LIMIT)
+from src.utils.helpers import AlertMessage
+
+
+class NotificationSink:
+    """
+    Kênh gửi thông báo (Node P4.3). Lớp con cài đặt send(); lỗi được báo bằng exception
+    để dispatcher thử lại.
+    :param rate_limit: Số lần gọi send() tối đa mỗi phút (None: không giới hạn).
+    """
+    name = "sink"
+
+    def __init__(self, rate_limit: Optional[float] = None):
+        self.rate_limit = rate_limit
+
+    def send(self, alerts: List[AlertMessage]):
+        raise NotImplementedError
+
+
+class ConsoleSink(NotificationSink):
+    name = "console"
+
+    def send(self, alerts: List[AlertMessage]):
+        for alert in alerts:
+            # Định dạng: [Severity] Message (Timestamp)
+            print(f"[{alert.severity}] {alert.message} ({alert.timestamp.strftime('%Y-%m-%d %H:%M:%S')})")
+
+
+class WebhookSink(NotificationSink):
+    name = "webhook"
+
+    def __init__(self, url: str, timeout: float = 5.0, headers: Optional[Dict[str, str]] = None,
+                 rate_limit: Optional[float] = NOTIFY_RATE_LIMIT):
+        """
+        Gửi lô cảnh báo dạng JSON qua HTTP POST (cổng SMS/Push hoặc dịch vụ nội bộ).
+        """
+        super().__init__(rate_limit)
+        self.url = url
+        self.timeout = timeout
+        self.headers = {"Content-Type": "application/json"}
+        self.headers.update(headers or {})
+
+    def send(self, alerts: List[AlertMessage]):
+        body = json.dumps({"alerts": [a.to_dict() for a in alerts]}, ensure_ascii=False).encode("utf-8")
+        import urllib.request  # Import khi gửi lần đầu: urllib.request kéo theo http.client/email (~60 ms)
+        request = urllib.request.Request(self.url, data=body, headers=self.headers, method="POST")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            if response.status >= 300:
+                raise RuntimeError(f"HTTP {response.status}")
+
+
+class _SinkWorker:
+    """Hàng đợi + luồng riêng cho một kênh, để kênh chậm không ảnh hưởng kênh khác."""
+
+    def __init__(self, sink: NotificationSink, queue_size: int):
+        self.sink = sink
+        self.queue: "queue.Queue[AlertMessage]" = queue.Queue(maxsize=queue_size)
+        self.thread: Optional[threading.Thread] = None
+        self.next_send_at = 0.0
+        self.stats = {"sent": 0, "failed": 0, "dropped": 0, "retries": 0}
+
+
+class NotificationDispatcher:
+    def __init__(self, sinks: List[NotificationSink], queue_size: int = NOTIFY_QUEUE_SIZE,
+                 batch_size: int = NOTIFY_BATCH_SIZE, flush_interval: float = NOTIFY_FLUSH_INTERVAL,
+                 max_retries: int = NOTIFY_MAX_RETRIES, retry_backoff: float = NOTIFY_RETRY_BACKOFF):
+        """
+        Gửi thông báo nền: submit() không bao giờ chặn luồng xử lý frame.
+        Mỗi kênh có hàng đợi giới hạn, gom lô, giới hạn tần suất và thử lại với backoff.
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._workers = [_SinkWorker(sink, queue_size) for sink in sinks]
+        self._stop_event = threading.Event()
+
+    def start(self):
+        self._stop_event.clear()
+        for worker in self._workers:
+            worker.thread = threading.Thread(target=self._run, args=(worker,),
+                                             name=f"P4-notify-{worker.sink.name}", daemon=True)
+            worker.thread.start()
+        return self
+
+    def stop(self, timeout: float = 2.0):
+        """Dừng các luồng gửi; cảnh báo còn trong hàng đợi được gửi nốt trong thời gian cho phép."""
+        self._stop_event.set()
+        for worker in self._workers:
+            if worker.thread is not None:
+                worker.thread.join(timeout=timeout)
+
+    def submit(self, alert: AlertMessage) -> bool:
+        """Đưa cảnh báo vào hàng đợi của từng kênh. Trả về False nếu có kênh bị đầy."""
+        accepted = True
+        for worker in self._workers:
+            try:
+                worker.queue.put_nowait(alert)
+            except queue.Full:
+                worker.stats["dropped"] += 1
+                accepted = False
+        return accepted
+
+    def _collect(self, worker: _SinkWorker) -> List[AlertMessage]:
+        try:
+            batch = [worker.queue.get(timeout=0.2)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop_event.is_set():
+                break
+            try:
+                batch.append(worker.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _wait_rate_limit(self, worker: _SinkWorker):
+        if not worker.sink.rate_limit:
+            return
+        delay = worker.next_send_at - time.monotonic()
+        if delay > 0:
+            self._stop_event.wait(delay)
+        worker.next_send_at = max(worker.next_send_at, time.monotonic()) + 60.0 / worker.sink.rate_limit
+
+    def _run(self, worker: _SinkWorker):
+        while not (self._stop_event.is_set() and worker.queue.empty()):
+            batch = self._collect(worker)
+            if not batch:
+                continue
+
+            self._wait_rate_limit(worker)
+            for attempt in range(self.max_retries + 1):
+                try:
+                    worker.sink.send(batch)
+                    worker.stats["sent"] += len(batch)
+                    break
+                except Exception as e:
+                    if attempt == self.max_retries or self._stop_event.is_set():
+                        worker.stats["failed"] += len(batch)
+                        print(f"[Error] Gửi thông báo qua {worker.sink.name} thất bại: {e}")
+                        break
+                    worker.stats["retries"] += 1
+                    self._stop_event.wait(self.retry_backoff * (2 ** attempt))
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {w.sink.name: dict(w.stats, pending=w.queue.qsize()) for w in self._workers}
+
+
+# --- Đoạn mã chạy thử nghiệm (Webhook với HTTP server giả lập cục bộ) ---
+if __name__ == "__main__":
+    import datetime
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    received = []
+
+    class _StandIn(BaseHTTPRequestHandler):
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            time.sleep(0.5)  # Giả lập cổng thông báo chậm
+            received.append(payload)
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), _StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    dispatcher = NotificationDispatcher([ConsoleSink(), WebhookSink(f"http://127.0.0.1:{server.server_port}/alerts")])
+    dispatcher.start()
+
+    start = time.perf_counter()
+    for i in range(50):
+        dispatcher.submit(AlertMessage(alert_id=str(i), timestamp=datetime.datetime.now(), room_name="Bếp tầng 1",
+                                       violation_type="forbidden_on_floor", severity="HIGH",
+                                       message=f"Phát hiện knife đặt sai vị trí (dưới sàn)! #{i}"))
+    print(f"submit() 50 cảnh báo mất {1000 * (time.perf_counter() - start):.2f} ms")
+
+    time.sleep(3)
+    dispatcher.stop()
+    server.shutdown()
+    print(f"Server nhận {len(received)} lô, {sum(len(p['alerts']) for p in received)} cảnh báo")
+    print(dispatcher.stats())
@@ -0,0 +1,170 @@
+# src/pipeline.py
+
+import time
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple, Union
+import numpy as np
+from configs.config import CAMERA_CONFIG, INFERENCE_BACKEND
+from src.p1_acquisition.data_reader import DataAcquisition
+from src.p2_recognition.motion_gate import MotionGate
+from src.p2_recognition.tracker import TrackedDetector
+from src.p3_context.rule_engine import RuleEngine
+from src.p4_action.alert_manager import AlertManager
+from src.utils.frame_bus import FrameBus
+from src.utils.helpers import DetectionResult, AlertMessage
+from src.utils.metrics import REGISTRY, SpanLog
+
+STAGE_SECONDS = REGISTRY.histogram("pipeline_stage_seconds", "Thời gian xử lý mỗi giai đoạn của một frame",
+                                   ("camera_id", "stage"))
+
+
+@dataclass
+class FrameResult:
+    """Kết quả P1-P4 của một frame, được đăng lên FrameBus cho giao diện."""
+    camera_id: str
+    metadata: Dict[str, Any]
+    raw_frame: np.ndarray
+    detections: List[DetectionResult]
+    verdicts: List[Tuple[bool, Optional[str], str, str]]
+    alerts: List[AlertMessage] = field(default_factory=list)
+
+
+class MonitorPipeline:
+    def __init__(self, source: Union[str, int], camera_id: str, detector=None,
+                 rule_engine: Optional[RuleEngine] = None, alert_manager: Optional[AlertManager] = None,
+                 event_store=None, bus: Optional[FrameBus] = None,
+                 use_motion_gate: bool = True, use_tracker: bool = True, span_log: Optional[SpanLog] = None,
+                 evidence_recorder=None, scheduler=None, detection_log=None):
+        """
+        Pipeline đầu-cuối P1 -> P4 cho một camera, chạy trên luồng riêng,
+        tách khỏi việc hiển thị: kết quả được đăng lên FrameBus thay vì vẽ trực tiếp.
+        Các giai đoạn tùy chọn (chia ô, QoS) và backend model chỉ được import khi dùng tới.
+        :param detector: ObjectDetector dùng chung (None: tạo theo "model"/"backend" của camera).
+        :param event_store: EventStore để lưu detection/cảnh báo (None: không lưu).
+        :param use_motion_gate: Bỏ qua YOLO khi khung cảnh tĩnh (MotionGate).
+        :param use_tracker: Gán track ID và nội suy giữa các lần chạy YOLO (TrackedDetector).
+        :param span_log: Ghi thời gian từng giai đoạn của mỗi frame ra JSON Lines (None: không ghi).
+        :param evidence_recorder: EvidenceRecorder nhận frame cho clip bằng chứng (None: không lưu);
+                                  AlertManager mặc định cũng dùng nó để lưu ảnh chụp khi cảnh báo.
+        :param scheduler: QoSScheduler dùng chung giữa các camera để chia ngân sách inference (None: không giới hạn).
+        :param detection_log: DetectionLog ghi mọi detection dạng cột để chấm lại quy tắc (None: không ghi).
+        """
+        self.camera_id = camera_id
+        self.acquisition = DataAcquisition(source=source, camera_id=camera_id)
+        if detector is None:
+            # Mỗi camera có thể dùng model/backend riêng (khóa "model", "backend" trong CAMERA_CONFIG)
+            from src.p2_recognition.detector import ObjectDetector
+            cam_info = CAMERA_CONFIG.get(camera_id, {})
+            detector = ObjectDetector(model_path=cam_info.get("model", "yolov8n.pt"),
+                                      backend=cam_info.get("backend", INFERENCE_BACKEND))
+        self.detector = detector
+        self.rule_engine = rule_engine if rule_engine is not None else RuleEngine()
+        self.alert_manager = (alert_manager if alert_manager is not None
+                              else AlertManager(evidence_recorder=evidence_recorder))
+        self.event_store = event_store
+        self.bus = bus if bus is not None else FrameBus()
+        self.span_log = span_log
+        self.evidence_recorder = evidence_recorder
+        self.scheduler = scheduler
+        self.detection_log = detection_log
+
+        # Chuỗi nhận diện P2: ObjectDetector -> TiledDetector -> MotionGate -> ScheduledDetector -> TrackedDetector
+        recognizer = self.detector
+        if CAMERA_CONFIG.get(camera_id, {}).get("tiling"):
+            from src.p2_recognition.tiling import TiledDetector
+            recognizer = TiledDetector(recognizer)
+        if use_motion_gate:
+            recognizer = MotionGate(recognizer)
+        if scheduler is not None:
+            from src.p2_recognition.scheduler import ScheduledDetector
+            recognizer = ScheduledDetector(recognizer, scheduler, scalable=self.detector.backend.input_size is None)
+        if use_tracker:
+            recognizer = TrackedDetector(recognizer, position_fn=self.detector.position_of)
+        self.recognizer = recognizer
+
+        self.frames_processed = 0
+        self.fps = 0.0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def process_packet(self, packet: dict) -> FrameResult:
+        """Chạy P2 -> P4 cho một packet từ P1."""
+        t0 = time.perf_counter()
+        # P2: Object Recognition & Position Classification
+        detections = self.recognizer.detect_objects(packet)
+        t1 = time.perf_counter()
+
+        # P3: Context Analysis
+        verdicts = self.rule_engine.validate_batch(detections, packet["metadata"])
+        t2 = time.perf_counter()
+
+        # P4: Action Triggering
+        alerts = []
+        for det, verdict in zip(detections, verdicts):
+            if verdict[0]:
+                alert = self.alert_manager.trigger(det, verdict, frame=packet["raw_frame"])
+                if alert:
+                    alerts.append(alert)
+                    if self.scheduler is not None:
+                        self.scheduler.observe_alert(self.camera_id)
+        if self.evidence_recorder is not None:
+            self.evidence_recorder.add_frame(self.camera_id, packet["raw_frame"], packet["metadata"]["timestamp"])
+
+        if self.event_store is not None:
+            self.event_store.record_detections(detections)
+            for alert in alerts:
+                self.event_store.record_alert(alert)
+        if self.detection_log is not None:
+            self.detection_log.record_detections(detections)
+        t3 = time.perf_counter()
+
+        if REGISTRY.enabled or self.span_log is not None:
+            decode, preprocess = packet["metadata"].get("p1_timings", (0.0, 0.0))
+            stages = {"decode": decode, "preprocess": preprocess,
+                      "recognition": t1 - t0, "context": t2 - t1, "action": t3 - t2}
+            for stage, seconds in stages.items():
+                STAGE_SECONDS.observe(seconds, self.camera_id, stage)
+            if self.span_log is not None:
+                self.span_log.write(self.camera_id, stages, detections=len(detections), alerts=len(alerts))
+
+        return FrameResult(camera_id=self.camera_id, metadata=packet["metadata"], raw_frame=packet["raw_frame"],
+                           detections=detections, verdicts=verdicts, alerts=alerts)
+
+    def run(self):
+        """Vòng lặp chính: đọc P1, xử lý và đăng kết quả lên FrameBus."""
+        window_start, window_frames = time.monotonic(), 0
+        for packet in self.acquisition.get_stream():
+            if self._stop_event.is_set():
+                break
+            result = self.process_packet(packet)
+
+            self.bus.publish_frame(self.camera_id, result)
+            for alert in result.alerts:
+                self.bus.publish_alert(alert)
+
+            self.frames_processed += 1
+            window_frames += 1
+            elapsed = time.monotonic() - window_start
+            if elapsed >= 1.0:
+                self.fps = window_frames / elapsed
+                window_start, window_frames = time.monotonic(), 0
+
+    def start(self):
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run, name=f"pipeline-{self.camera_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        """Dừng luồng pipeline và ghi nốt các detection đang đệm của DetectionLog."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        if self.detection_log is not None:
+            self.detection_log.flush()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
@@ -0,0 +1,81 @@
+# src/utils/frame_bus.py
+
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class LatestSlot:
+    """
+    Ô chứa giá trị mới nhất (latest-value): bên ghi ghi đè, bên đọc lấy bản mới nhất
+    kèm số phiên bản để biết có gì thay đổi hay không. Không bao giờ chặn bên ghi.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value: Any = None
+        self.version = 0
+
+    def publish(self, value: Any):
+        with self._lock:
+            self._value = value
+            self.version += 1
+
+    def get(self, since_version: int = -1) -> Tuple[int, Optional[Any]]:
+        """Trả về (version, value); value là None nếu không có gì mới hơn since_version."""
+        with self._lock:
+            if self.version <= since_version:
+                return self.version, None
+            return self.version, self._value
+
+
+class EventRing:
+    """Ring buffer sự kiện có giới hạn (vd: cảnh báo mới nhất) kèm số phiên bản."""
+
+    def __init__(self, maxlen: int = 100):
+        self._lock = threading.Lock()
+        self._items: deque = deque(maxlen=maxlen)
+        self.version = 0
+
+    def push(self, item: Any):
+        with self._lock:
+            self._items.appendleft(item)
+            self.version += 1
+
+    def snapshot(self, since_version: int = -1, limit: Optional[int] = None) -> Tuple[int, Optional[List[Any]]]:
+        """Trả về (version, danh sách mới nhất trước); danh sách là None nếu không có gì mới."""
+        with self._lock:
+            if self.version <= since_version:
+                return self.version, None
+            items = list(self._items) if limit is None else list(self._items)[:limit]
+            return self.version, items
+
+
+class FrameBus:
+    def __init__(self, alert_capacity: int = 100):
+        """
+        Kênh trung gian giữa pipeline P1-P4 và giao diện: pipeline đăng kết quả mỗi frame
+        vào ô latest-value của từng camera và đẩy cảnh báo vào ring buffer;
+        các dashboard chỉ đọc, nên số dashboard không ảnh hưởng tốc độ nhận diện.
+        """
+        self._lock = threading.Lock()
+        self._frames: Dict[str, LatestSlot] = {}
+        self.alerts = EventRing(alert_capacity)
+
+    def frame_slot(self, camera_id: str) -> LatestSlot:
+        with self._lock:
+            slot = self._frames.get(camera_id)
+            if slot is None:
+                slot = self._frames[camera_id] = LatestSlot()
+            return slot
+
+    def publish_frame(self, camera_id: str, frame_result: Any):
+        self.frame_slot(camera_id).publish(frame_result)
+
+    def publish_alert(self, alert: Any):
+        self.alerts.push(alert)
+
+    @property
+    def camera_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._frames)
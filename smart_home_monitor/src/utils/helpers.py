@@ -1,8 +1,12 @@
 # src/utils/helpers.py
 
-from dataclasses import dataclass, field
-from typing import List, Optional, Dict, Any
+from dataclasses import dataclass, field, replace
+from typing import List, Optional, Dict, Any, Iterator
 import datetime
+import numpy as np
+
+# Các vị trí đồ vật theo chiều cao (Node P2.3 - Trang 22)
+POSITIONS = ("floor", "low", "mid", "high")
 
 @dataclass
 class DetectionResult:
@@ -18,6 +22,9 @@ class DetectionResult:
     # Metadata chứa ngữ cảnh hệ thống (Trang 7)
     metadata: Dict[str, Any] = field(default_factory=dict) 
 
+    # Mã track ổn định giữa các frame (gán bởi ObjectTracker, None nếu không tracking)
+    track_id: Optional[int] = None
+
     def to_dict(self) -> Dict[str, Any]:
         """Chuyển đổi dữ liệu sang Dictionary để phục vụ ghi Log JSON (Trang 20)"""
         return {
@@ -25,11 +32,114 @@ class DetectionResult:
             "confidence": round(self.confidence, 2),
             "bbox": self.bbox,
             "position": self.position,
+            "track_id": self.track_id,
             "room_type": self.metadata.get("room_type"),
             "camera_id": self.metadata.get("camera_id"),
             "timestamp": self.metadata.get("timestamp").isoformat() if self.metadata.get("timestamp") else None
         }
 
+    def with_metadata(self, metadata: Dict[str, Any]) -> "DetectionResult":
+        """Bản sao gắn metadata của frame khác (vd: dùng lại kết quả cũ cho frame mới)."""
+        return replace(self, metadata=metadata)
+
+
+class DetectionBatch:
+    """
+    Toàn bộ detection của một frame dạng struct-of-arrays: bbox, độ tin cậy, mã lớp, mã vị trí
+    là các mảng NumPy; metadata được giữ một lần cho cả frame thay vì mỗi vật thể một tham chiếu.
+    Duyệt/đánh chỉ số trả về DetectionView (cùng thuộc tính với DetectionResult).
+    """
+    __slots__ = ("boxes", "scores", "class_ids", "position_codes", "track_ids", "names", "metadata")
+
+    def __init__(self, boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray, position_codes: np.ndarray,
+                 names: Dict[int, str], metadata: Dict[str, Any], track_ids: Optional[np.ndarray] = None):
+        self.boxes = boxes                    # (N, 4) int32 [x1, y1, x2, y2] theo khung hình gốc
+        self.scores = scores                  # (N,) float32
+        self.class_ids = class_ids            # (N,) int32
+        self.position_codes = position_codes  # (N,) uint8, chỉ số trong POSITIONS
+        self.track_ids = track_ids if track_ids is not None else np.full(len(scores), -1, dtype=np.int64)
+        self.names = names
+        self.metadata = metadata
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def __getitem__(self, index: int) -> "DetectionView":
+        if not -len(self) <= index < len(self):
+            raise IndexError(index)
+        return DetectionView(self, index % len(self))
+
+    def __iter__(self) -> Iterator["DetectionView"]:
+        return (DetectionView(self, i) for i in range(len(self)))
+
+    @property
+    def class_names(self) -> List[str]:
+        names = self.names
+        return [names[c] for c in self.class_ids.tolist()]
+
+    @property
+    def positions(self) -> List[str]:
+        return [POSITIONS[c] for c in self.position_codes.tolist()]
+
+    def to_results(self) -> List[DetectionResult]:
+        """Chuyển sang danh sách DetectionResult (cho code cần dataclass đầy đủ)."""
+        return [DetectionResult(class_name=name, confidence=score, bbox=bbox, position=position,
+                                metadata=self.metadata, track_id=track_id if track_id >= 0 else None)
+                for name, score, bbox, position, track_id in zip(self.class_names, self.scores.tolist(),
+                                                                 self.boxes.tolist(), self.positions,
+                                                                 self.track_ids.tolist())]
+
+
+class DetectionView:
+    """Khung nhìn một vật thể trong DetectionBatch, dùng thay DetectionResult mà không sao chép dữ liệu."""
+    __slots__ = ("batch", "index")
+
+    def __init__(self, batch: DetectionBatch, index: int):
+        self.batch = batch
+        self.index = index
+
+    @property
+    def class_name(self) -> str:
+        return self.batch.names[int(self.batch.class_ids[self.index])]
+
+    @property
+    def confidence(self) -> float:
+        return float(self.batch.scores[self.index])
+
+    @property
+    def bbox(self) -> List[int]:
+        return self.batch.boxes[self.index].tolist()
+
+    @property
+    def position(self) -> str:
+        return POSITIONS[self.batch.position_codes[self.index]]
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return self.batch.metadata
+
+    @property
+    def track_id(self) -> Optional[int]:
+        track_id = int(self.batch.track_ids[self.index])
+        return track_id if track_id >= 0 else None
+
+    @track_id.setter
+    def track_id(self, value: Optional[int]):
+        self.batch.track_ids[self.index] = -1 if value is None else value
+
+    to_dict = DetectionResult.to_dict
+
+    def to_result(self) -> DetectionResult:
+        return DetectionResult(class_name=self.class_name, confidence=self.confidence, bbox=self.bbox,
+                               position=self.position, metadata=self.metadata, track_id=self.track_id)
+
+    def with_metadata(self, metadata: Dict[str, Any]) -> DetectionResult:
+        return replace(self.to_result(), metadata=metadata)
+
+    def __repr__(self) -> str:
+        return (f"DetectionView(class_name={self.class_name!r}, confidence={self.confidence:.2f}, "
+                f"bbox={self.bbox}, position={self.position!r}, track_id={self.track_id})")
+
 @dataclass
 class AlertMessage:
     """
@@ -43,6 +153,22 @@ class AlertMessage:
     severity: str             # 'CRITICAL', 'HIGH', 'MEDIUM'
     message: str
     image_path: Optional[str] = None
+    camera_id: Optional[str] = None
+    class_name: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Chuyển đổi sang Dictionary để gửi thông báo hoặc ghi Log JSON"""
+        return {
+            "alert_id": self.alert_id,
+            "timestamp": self.timestamp.isoformat() if self.timestamp else None,
+            "camera_id": self.camera_id,
+            "room_name": self.room_name,
+            "class": self.class_name,
+            "violation_type": self.violation_type,
+            "severity": self.severity,
+            "message": self.message,
+            "image_path": self.image_path
+        }
 
 def calculate_iou(bbox1: List[int], bbox2: List[int]) -> float:
     """
@@ -74,6 +200,28 @@ def calculate_iou(bbox1: List[int], bbox2: List[int]) -> float:
 
     return intersection_area / union_area if union_area > 0 else 0.0
 
+def calculate_iou_matrix(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+    """
+    Phiên bản vector hóa của calculate_iou cho hai tập bbox.
+    :param boxes1: Mảng (N, 4) dạng [x1, y1, x2, y2]
+    :param boxes2: Mảng (M, 4) dạng [x1, y1, x2, y2]
+    :return: Ma trận IoU kích thước (N, M)
+    """
+    boxes1 = np.asarray(boxes1, dtype=np.float32).reshape(-1, 4)
+    boxes2 = np.asarray(boxes2, dtype=np.float32).reshape(-1, 4)
+
+    x_left = np.maximum(boxes1[:, None, 0], boxes2[None, :, 0])
+    y_top = np.maximum(boxes1[:, None, 1], boxes2[None, :, 1])
+    x_right = np.minimum(boxes1[:, None, 2], boxes2[None, :, 2])
+    y_bottom = np.minimum(boxes1[:, None, 3], boxes2[None, :, 3])
+
+    intersection = np.clip(x_right - x_left, 0, None) * np.clip(y_bottom - y_top, 0, None)
+    area1 = (boxes1[:, 2] - boxes1[:, 0]) * (boxes1[:, 3] - boxes1[:, 1])
+    area2 = (boxes2[:, 2] - boxes2[:, 0]) * (boxes2[:, 3] - boxes2[:, 1])
+    union = area1[:, None] + area2[None, :] - intersection
+
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
 def get_severity_color(severity: str) -> tuple:
     """
     Hàm bổ trợ trả về màu sắc BGR dựa trên mức độ nghiêm trọng.
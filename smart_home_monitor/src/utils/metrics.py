@@ -0,0 +1,180 @@
+# src/utils/metrics.py
+
+import json
+import time
+import threading
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+from configs.config import METRICS_ENABLED, METRICS_PORT
+
+# Ngưỡng bucket mặc định (giây) cho histogram thời gian
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help_text: str, labels: Tuple[str, ...]):
+        self._registry = registry
+        self._lock = threading.Lock()
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+
+    def _label_str(self, values: tuple, extra: str = "") -> str:
+        parts = [f'{k}="{v}"' for k, v in zip(self.labels, values)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter(_Metric):
+    """Bộ đếm tăng dần, theo từng bộ giá trị nhãn (vd: camera_id)."""
+    kind = "counter"
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1.0):
+        if not self._registry.enabled:
+            return
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{self._label_str(values)} {total:g}" for values, total in items]
+
+
+class Histogram(_Metric):
+    """Histogram với bucket cố định: observe() chỉ tăng một ô đếm, không lưu từng mẫu."""
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(*args)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[tuple, list] = {}  # nhãn -> [đếm theo bucket..., +Inf, sum]
+
+    def observe(self, value: float, *label_values):
+        if not self._registry.enabled:
+            return
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[idx] += 1
+            state[-1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(values, list(state)) for values, state in self._values.items()]
+        lines = []
+        for values, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{self._label_str(values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_str(values)} {state[-1]:g}")
+            lines.append(f"{self.name}_count{self._label_str(values)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        """
+        Tập hợp các counter/histogram của pipeline.
+        Khi tắt (enabled=False), inc()/observe() trả về ngay sau một phép kiểm tra cờ.
+        """
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _get_or_create(self, cls, name: str, help_text: str, labels: Tuple[str, ...], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(self, name, help_text, tuple(labels), **kwargs)
+            return metric
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help_text, labels)
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, labels, buckets=buckets)
+
+    def render(self) -> str:
+        """Xuất toàn bộ chỉ số theo định dạng văn bản của Prometheus."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Registry dùng chung cho cả tiến trình
+REGISTRY = MetricsRegistry()
+
+
+def start_http_server(port: int = METRICS_PORT, host: str = "127.0.0.1",
+                      registry: MetricsRegistry = REGISTRY) -> "ThreadingHTTPServer":
+    """Mở endpoint http://host:port/metrics (luồng nền) cho Prometheus hoặc curl."""
+    # Import tại chỗ: http.server kéo theo email/ssl, chỉ cần khi bật endpoint
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"[Metrics] Endpoint: http://{host}:{port}/metrics")
+    return server
+
+
+class SpanLog:
+    def __init__(self, path: str):
+        """
+        Nhật ký span theo từng frame (JSON Lines): thời gian mỗi giai đoạn P1-P4 của mỗi camera,
+        để tìm camera/giai đoạn nào đang chiếm ngân sách CPU.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, camera_id: str, stages: Dict[str, float], **fields):
+        record = {"ts": time.time(), "camera_id": camera_id,
+                  "stages_ms": {stage: round(1000 * seconds, 3) for stage, seconds in stages.items()}}
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def open_span_log(path: Optional[str]) -> Optional[SpanLog]:
+    return SpanLog(path) if path else None
@@ -0,0 +1,101 @@
+# src/utils/zones.py
+
+import cv2
+import numpy as np
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from configs.config import CAMERA_CONFIG, SAFETY_RULES, ZONE_POSITIONS, ZONE_MASK_WIDTH, ROI_MARGIN
+from src.utils.helpers import POSITIONS
+
+NO_ZONE = 255  # Giá trị mask tại điểm không thuộc vùng nào
+
+
+class ZoneMap:
+    def __init__(self, zones: Dict[str, List[List[float]]], mask_width: int = ZONE_MASK_WIDTH):
+        """
+        Bản đồ vùng (sàn, mặt bếp, kệ...) của một camera.
+        Các đa giác được rasterize một lần thành mask mã vị trí, nên tra vị trí một vật thể là O(1).
+        :param zones: {tên vùng: [[x, y], ...]} với tọa độ chuẩn hóa [0, 1] theo khung hình.
+                      Vùng khai báo sau ghi đè vùng khai báo trước khi chồng lên nhau.
+        :param mask_width: Chiều rộng mask (thu nhỏ so với frame để tiết kiệm bộ nhớ).
+        """
+        unknown = [name for name in zones if name not in ZONE_POSITIONS]
+        if unknown:
+            raise ValueError(f"Vùng không hợp lệ: {unknown} (chọn trong {list(ZONE_POSITIONS)})")
+        self.zones = zones
+        self.mask_width = mask_width
+        self._cache: Optional[tuple] = None  # (frame_w, frame_h, mask, sx, sy)
+
+    def _mask(self, frame_w: int, frame_h: int) -> tuple:
+        cache = self._cache
+        if cache is not None and cache[0] == frame_w and cache[1] == frame_h:
+            return cache
+
+        mask_w = min(self.mask_width, frame_w)
+        mask_h = max(1, round(frame_h * mask_w / frame_w))
+        mask = np.full((mask_h, mask_w), NO_ZONE, dtype=np.uint8)
+        for name, polygon in self.zones.items():
+            points = np.round(np.asarray(polygon, dtype=np.float64) * (mask_w, mask_h)).astype(np.int32)
+            cv2.fillPoly(mask, [points], POSITIONS.index(ZONE_POSITIONS[name]))
+
+        self._cache = (frame_w, frame_h, mask, mask_w / frame_w, mask_h / frame_h)
+        return self._cache
+
+    def position_codes(self, boxes: np.ndarray, frame_w: int, frame_h: int) -> np.ndarray:
+        """
+        Mã vị trí (chỉ số trong POSITIONS, NO_ZONE nếu ngoài mọi vùng) tại điểm giữa cạnh dưới bbox,
+        tức điểm vật thể tiếp xúc với mặt đặt nó.
+        :param boxes: Mảng (N, 4) [x1, y1, x2, y2] theo khung hình gốc.
+        """
+        _, _, mask, sx, sy = self._mask(frame_w, frame_h)
+        boxes = np.asarray(boxes).reshape(-1, 4)
+        xs = np.clip(((boxes[:, 0] + boxes[:, 2]) * 0.5 * sx).astype(np.int32), 0, mask.shape[1] - 1)
+        ys = np.clip((boxes[:, 3] * sy).astype(np.int32), 0, mask.shape[0] - 1)
+        return mask[ys, xs]
+
+    def position_of(self, bbox: List[int], frame_w: int, frame_h: int) -> Optional[str]:
+        code = int(self.position_codes(np.asarray([bbox]), frame_w, frame_h)[0])
+        return POSITIONS[code] if code != NO_ZONE else None
+
+    def roi(self, zone_names: List[str], margin: float = ROI_MARGIN) -> Optional[Tuple[float, float, float, float]]:
+        """
+        Hình chữ nhật chuẩn hóa (x0, y0, x1, y1) bao các vùng cho trước, nới thêm `margin` (tỉ lệ khung hình)
+        để giữ trọn vật thể đặt trên vùng (thân vật nhô lên trên mép vùng). None nếu không có vùng nào.
+        """
+        points = [p for name in zone_names if name in self.zones for p in self.zones[name]]
+        if not points:
+            return None
+        points = np.asarray(points, dtype=np.float64)
+        x0, y0 = np.clip(points.min(axis=0) - margin, 0.0, 1.0)
+        x1, y1 = np.clip(points.max(axis=0) + margin, 0.0, 1.0)
+        return float(x0), float(y0), float(x1), float(y1)
+
+
+def relevant_zones(zone_names: List[str], room_rules: dict) -> List[str]:
+    """
+    Các vùng cần quan sát theo quy tắc của phòng: phòng chỉ có quy tắc forbidden_on_floor
+    chỉ cần vùng sàn; có forbidden_objects (cấm ở mọi nơi) thì cần mọi vùng.
+    """
+    if room_rules.get("forbidden_objects") or not room_rules.get("forbidden_on_floor"):
+        return list(zone_names)
+    return [name for name in zone_names if ZONE_POSITIONS[name] == "floor"]
+
+
+@lru_cache(maxsize=None)
+def zone_map_for(camera_id: str) -> Optional[ZoneMap]:
+    """ZoneMap của camera theo khóa "zones" trong CAMERA_CONFIG (None nếu chưa hiệu chỉnh vùng)."""
+    zones = CAMERA_CONFIG.get(camera_id, {}).get("zones")
+    return ZoneMap(zones) if zones else None
+
+
+def camera_roi(camera_id: str) -> Optional[Tuple[float, float, float, float]]:
+    """
+    ROI chuẩn hóa để chỉ chạy inference trên phần khung hình chứa các vùng có quy tắc áp dụng,
+    khi camera bật "roi_inference". None: dùng toàn khung hình.
+    """
+    cam_info = CAMERA_CONFIG.get(camera_id, {})
+    zone_map = zone_map_for(camera_id)
+    if not cam_info.get("roi_inference") or zone_map is None:
+        return None
+    room_rules = SAFETY_RULES.get(cam_info.get("room_type"), {})
+    return zone_map.roi(relevant_zones(list(zone_map.zones), room_rules))
@@ -0,0 +1,9 @@
+# tests/conftest.py
+# Chạy từ thư mục smart_home_monitor: python -m pytest tests
+
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
@@ -0,0 +1,65 @@
+# tests/test_alert_manager.py
+
+from src.p4_action.alert_manager import AlertManager
+from src.utils.helpers import DetectionResult
+
+VIOLATION = (True, "forbidden_on_floor", "HIGH", "Phát hiện knife đặt sai vị trí (dưới sàn)!")
+
+
+def _det(bbox, camera_id="CAM_001", class_name="knife", track_id=None):
+    return DetectionResult(class_name=class_name, confidence=0.9, bbox=bbox, position="floor",
+                           metadata={"camera_id": camera_id, "room_name": "Bếp"}, track_id=track_id)
+
+
+def _manager(**kwargs):
+    return AlertManager(notify=False, dedup_interval=30, iou_threshold=0.3, **kwargs)
+
+
+def test_overlapping_bbox_is_duplicate_within_interval():
+    manager = _manager()
+    assert not manager.is_duplicate(_det([100, 100, 200, 200]), 0.0)
+    assert manager.is_duplicate(_det([110, 105, 210, 205]), 10.0)
+
+
+def test_distant_bbox_same_class_is_separate_alert():
+    manager = _manager()
+    assert not manager.is_duplicate(_det([0, 0, 50, 50]), 0.0)
+    assert not manager.is_duplicate(_det([400, 400, 450, 450]), 1.0)
+
+
+def test_same_track_is_duplicate_even_after_moving():
+    manager = _manager()
+    assert not manager.is_duplicate(_det([0, 0, 50, 50], track_id=7), 0.0)
+    assert manager.is_duplicate(_det([300, 300, 350, 350], track_id=7), 5.0)
+    assert not manager.is_duplicate(_det([300, 300, 350, 350], track_id=8, class_name="scissors"), 5.0)
+
+
+def test_other_camera_or_class_not_duplicate():
+    manager = _manager()
+    assert not manager.is_duplicate(_det([100, 100, 200, 200]), 0.0)
+    assert not manager.is_duplicate(_det([100, 100, 200, 200], camera_id="CAM_002"), 1.0)
+    assert not manager.is_duplicate(_det([100, 100, 200, 200], class_name="glass"), 1.0)
+
+
+def test_alert_again_after_interval_expires():
+    manager = _manager()
+    assert not manager.is_duplicate(_det([100, 100, 200, 200]), 0.0)
+    assert manager.is_duplicate(_det([100, 100, 200, 200]), 29.9)
+    assert not manager.is_duplicate(_det([100, 100, 200, 200]), 30.0)
+
+
+def test_expired_keys_evicted_and_history_bounded():
+    manager = _manager(max_keys=3)
+    for i in range(10):
+        manager.is_duplicate(_det([0, 0, 10, 10], camera_id=f"CAM_{i}"), float(i))
+    assert len(manager.alert_history) == 3
+    manager.is_duplicate(_det([0, 0, 10, 10], camera_id="CAM_NEW"), 100.0)
+    assert list(manager.alert_history) == [("CAM_NEW", "knife")]
+
+
+def test_trigger_counts_and_skips_non_violations():
+    manager = _manager()
+    assert manager.trigger(_det([100, 100, 200, 200]), VIOLATION, current_time=0.0) is not None
+    assert manager.trigger(_det([100, 100, 200, 200]), VIOLATION, current_time=1.0) is None
+    assert manager.trigger(_det([100, 100, 200, 200]), (False, None, "INFO", ""), current_time=2.0) is None
+    assert (manager.triggered_count, manager.deduplicated_count) == (1, 1)
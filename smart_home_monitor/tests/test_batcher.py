@@ -0,0 +1,59 @@
+# tests/test_batcher.py
+
+from src.p2_recognition.batcher import DynamicBatcher
+
+
+class _EchoDetector:
+    def detect_objects_batch(self, packets):
+        return [[packet["metadata"]["camera_id"]] for packet in packets]
+
+
+class _FailingDetector:
+    def detect_objects_batch(self, packets):
+        raise RuntimeError("backend lỗi")
+
+
+def _packet(camera_id):
+    return {"metadata": {"camera_id": camera_id}}
+
+
+def _run(detector, on_result=None, count=3):
+    batcher = DynamicBatcher(detector, max_batch_size=count, max_wait_ms=50, on_result=on_result)
+    futures = [batcher.submit(_packet(f"CAM_{i}")) for i in range(count)]
+    batcher.start()
+    try:
+        return [future.exception(timeout=2) or future.result() for future in futures]
+    finally:
+        batcher.stop()
+
+
+def test_results_routed_to_each_packet():
+    assert _run(_EchoDetector()) == [["CAM_0"], ["CAM_1"], ["CAM_2"]]
+
+
+def test_backend_error_resolves_every_future():
+    results = _run(_FailingDetector())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_callback_error_resolves_remaining_futures():
+    def on_result(camera_id, detections):
+        if camera_id == "CAM_1":
+            raise ValueError("callback lỗi")
+
+    results = _run(_EchoDetector(), on_result=on_result)
+    assert results[0] == ["CAM_0"]
+    assert isinstance(results[1], ValueError) and isinstance(results[2], ValueError)
+
+
+def test_stats_recorded_per_batch():
+    batcher = DynamicBatcher(_EchoDetector(), max_batch_size=2, max_wait_ms=50)
+    futures = [batcher.submit(_packet("CAM_0")) for _ in range(2)]
+    batcher.start()
+    try:
+        for future in futures:
+            future.result(timeout=2)
+    finally:
+        batcher.stop()
+    assert batcher.summary()["batches"] == 1
+    assert batcher.summary()["mean_batch_size"] == 2
@@ -0,0 +1,100 @@
+# tests/test_coordinates.py
+# Ánh xạ ngược bbox từ ảnh đầu vào model (letterbox / ROI) về khung hình gốc
+
+import numpy as np
+import pytest
+from configs.config import CAMERA_CONFIG, SAFETY_RULES, ROI_MARGIN
+from src.p1_acquisition.data_reader import DataAcquisition
+from src.p2_recognition import detector as detector_module
+from src.p2_recognition.detector import ObjectDetector
+from src.utils.zones import camera_roi, relevant_zones
+
+
+class _FakeBackend:
+    names = {0: "knife", 1: "cup"}
+    input_size = 640
+
+
+@pytest.fixture
+def detector(monkeypatch):
+    monkeypatch.setattr(detector_module.MODELS, "get", lambda model_path, backend: _FakeBackend())
+    return ObjectDetector(model_path="fake.pt")
+
+
+def _to_model_input(bbox, scale, pad_x, pad_y):
+    x1, y1, x2, y2 = bbox
+    return [x1 * scale + pad_x, y1 * scale + pad_y, x2 * scale + pad_x, y2 * scale + pad_y]
+
+
+@pytest.mark.parametrize("frame_w, frame_h", [(1280, 720), (1920, 1080), (480, 640), (640, 640)])
+def test_letterbox_inverse_recovers_original_bbox(detector, frame_w, frame_h):
+    acquisition = DataAcquisition(source="khong_ton_tai.mp4", camera_id="CAM_TEST", roi=None)
+    frame = np.zeros((frame_h, frame_w, 3), dtype=np.uint8)
+    processed, letterbox = acquisition._preprocess(frame)
+    assert processed.shape == (640, 640, 3)
+
+    original = [frame_w // 4, frame_h // 2, frame_w // 2, frame_h - 10]
+    boxes = np.array([_to_model_input(original, *letterbox) + [0.9, 0]], dtype=np.float32)
+    batch = detector._parse_result(boxes, {"camera_id": "CAM_TEST", "frame_width": frame_w,
+                                           "frame_height": frame_h, "letterbox": letterbox, "input_size": 640})
+    np.testing.assert_allclose(batch.boxes[0], original, atol=1)
+
+
+def test_letterbox_inverse_clips_to_frame(detector):
+    metadata = {"camera_id": "CAM_TEST", "frame_width": 1280, "frame_height": 720,
+                "letterbox": (0.5, 0, 140), "input_size": 640}
+    # Bbox nằm một phần trong vùng đệm phía trên/dưới
+    boxes = np.array([[-5, 100, 700, 639, 0.8, 1]], dtype=np.float32)
+    x1, y1, x2, y2 = detector._parse_result(boxes, metadata).boxes[0]
+    assert (x1, y1) == (0, 0)
+    assert x2 == 1279 and y2 == 719
+
+
+ROI_CAMERA = {"room_type": "kitchen", "room_name": "Bếp thử", "roi_inference": True,
+              "zones": {"floor": [[0.0, 0.6], [1.0, 0.6], [1.0, 1.0], [0.0, 1.0]],
+                        "counter": [[0.5, 0.3], [1.0, 0.3], [1.0, 0.6], [0.5, 0.6]]}}
+
+
+@pytest.fixture
+def roi_camera(monkeypatch):
+    monkeypatch.setitem(CAMERA_CONFIG, "CAM_ROI_TEST", ROI_CAMERA)
+    monkeypatch.setitem(CAMERA_CONFIG, "CAM_ROI_OFF", dict(ROI_CAMERA, roi_inference=False))
+    return "CAM_ROI_TEST"
+
+
+def test_relevant_zones_follow_room_rules():
+    zones = ["floor", "counter"]
+    # Bếp chỉ có quy tắc forbidden_on_floor: chỉ cần vùng sàn
+    assert relevant_zones(zones, SAFETY_RULES["kitchen"]) == ["floor"]
+    # Phòng trẻ em cấm vật ở mọi nơi: cần mọi vùng
+    assert relevant_zones(zones, SAFETY_RULES["child_room"]) == zones
+
+
+def test_camera_roi_bounds_floor_zone_with_margin(roi_camera):
+    x0, y0, x1, y1 = camera_roi(roi_camera)
+    assert (x0, x1, y1) == (0.0, 1.0, 1.0)
+    assert y0 == pytest.approx(0.6 - ROI_MARGIN)
+    assert camera_roi("CAM_ROI_OFF") is None
+
+
+@pytest.mark.parametrize("mode", ["letterbox", "stretch"])
+def test_roi_crop_coordinates_map_back_to_full_frame(detector, roi_camera, mode):
+    frame_w, frame_h = 1280, 720
+    acquisition = DataAcquisition(source="khong_ton_tai.mp4", camera_id=roi_camera, preprocess_mode=mode)
+    roi = acquisition._roi_box(frame_h, frame_w)
+    assert roi[1] > 0 and roi[3] == frame_h
+    crop = np.zeros((frame_h, frame_w, 3), dtype=np.uint8)[roi[1]:roi[3], roi[0]:roi[2]]
+    _, letterbox = acquisition._preprocess(crop)
+
+    original = [300, 600, 420, 700]
+    local = [original[0] - roi[0], original[1] - roi[1], original[2] - roi[0], original[3] - roi[1]]
+    if letterbox is not None:
+        model_box = _to_model_input(local, *letterbox)
+    else:
+        sx, sy = 640 / crop.shape[1], 640 / crop.shape[0]
+        model_box = [local[0] * sx, local[1] * sy, local[2] * sx, local[3] * sy]
+    boxes = np.array([model_box + [0.9, 0]], dtype=np.float32)
+    batch = detector._parse_result(boxes, {"camera_id": roi_camera, "frame_width": frame_w, "frame_height": frame_h,
+                                           "letterbox": letterbox, "input_size": 640, "roi": roi})
+    np.testing.assert_allclose(batch.boxes[0], original, atol=1)
+    assert batch.positions == ["floor"]
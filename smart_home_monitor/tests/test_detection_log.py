@@ -0,0 +1,132 @@
+# tests/test_detection_log.py
+
+import os
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from src.p3_context.rule_engine import RuleEngine
+from src.p4_action.detection_log import COLUMNS, DetectionLog, DetectionLogReader
+from src.utils.helpers import DetectionResult
+
+BASE = datetime(2026, 10, 1, 8, 0, 0)
+
+
+def _det(i, camera_id="CAM_001", room_type="kitchen", class_name="knife", position="floor", track_id=None):
+    return DetectionResult(class_name=class_name, confidence=0.5 + i / 100, bbox=[i, i + 1, i + 20, i + 30],
+                           position=position, track_id=track_id,
+                           metadata={"camera_id": camera_id, "room_type": room_type, "room_name": "Bếp",
+                                     "timestamp": BASE + timedelta(seconds=i)})
+
+
+def test_round_trip_preserves_every_field(tmp_path):
+    log = DetectionLog(str(tmp_path), flush_rows=3, flush_interval=3600)
+    written = [_det(0), _det(1, track_id=5), _det(2, camera_id="CAM_002", room_type="child_room",
+                                                  class_name="scissors", position="low"), _det(3)]
+    for det in written:
+        log.record_detections([det])
+    log.close()
+
+    reader = DetectionLogReader(str(tmp_path))
+    assert len(reader) == len(written)
+    for row, expected in enumerate(written):
+        got = reader.to_result(row, {"CAM_001": "Bếp", "CAM_002": "Bếp"})
+        assert got.class_name == expected.class_name
+        assert got.bbox == expected.bbox
+        assert got.position == expected.position
+        assert got.track_id == expected.track_id
+        assert got.confidence == np.float32(expected.confidence)
+        assert got.metadata["camera_id"] == expected.metadata["camera_id"]
+        assert got.metadata["room_type"] == expected.metadata["room_type"]
+        assert got.metadata["timestamp"] == expected.metadata["timestamp"]
+
+
+def test_reopen_appends_and_truncates_partial_row(tmp_path):
+    log = DetectionLog(str(tmp_path))
+    log.record_detections([_det(0), _det(1)])
+    log.close()
+    # Giả lập dừng đột ngột khi đang ghi: một cột có thêm nửa dòng
+    with open(os.path.join(tmp_path, "timestamp.bin"), "ab") as f:
+        f.write(b"\x00" * (COLUMNS["timestamp"].itemsize // 2))
+
+    log = DetectionLog(str(tmp_path))
+    assert log.rows == 2
+    log.record_detections([_det(2, class_name="glass")])
+    log.close()
+
+    reader = DetectionLogReader(str(tmp_path))
+    assert len(reader) == 3
+    assert [reader.to_result(r).class_name for r in range(3)] == ["knife", "knife", "glass"]
+    assert reader.dictionary["class"] == ["knife", "glass"]
+
+
+def test_select_filters_by_time_and_camera_sorted(tmp_path):
+    log = DetectionLog(str(tmp_path))
+    # Ghi lệch thứ tự thời gian giữa hai camera
+    log.record_detections([_det(5, camera_id="CAM_002"), _det(1), _det(3, camera_id="CAM_002"), _det(2)])
+    log.close()
+    reader = DetectionLogReader(str(tmp_path))
+
+    rows = reader.select()
+    assert list(reader["timestamp"][rows]) == sorted(reader["timestamp"])
+    rows = reader.select(start=BASE + timedelta(seconds=2), camera_ids=["CAM_002"])
+    assert [reader.to_result(r).bbox[0] for r in rows] == [3, 5]
+    assert len(reader.select(camera_ids=["CAM_999"])) == 0
+
+
+def test_empty_log_is_readable(tmp_path):
+    reader = DetectionLogReader(str(tmp_path / "khong_co"))
+    assert len(reader) == 0
+    assert len(reader.select()) == 0
+
+
+def test_verdict_table_matches_rule_engine(tmp_path):
+    log = DetectionLog(str(tmp_path))
+    log.record_detections([_det(0), _det(1, position="mid"), _det(2, camera_id="CAM_002", room_type="child_room",
+                                                                   class_name="scissors", position="mid")])
+    log.close()
+    reader = DetectionLogReader(str(tmp_path))
+    engine = RuleEngine(rules_path=None)
+    table, verdicts = engine.compiled.verdict_table(reader.dictionary["room_type"], reader.dictionary["class"])
+    codes = table[reader["room_type"], reader["class"], reader["position"]]
+    for row, code in enumerate(codes):
+        is_violation, v_type, severity, _ = engine.validate_detection(reader.to_result(row))
+        assert (verdicts[code] if code else None) == ((v_type, severity) if is_violation else None)
+
+
+def test_idle_camera_flushes_buffered_rows_on_interval(tmp_path):
+    log = DetectionLog(str(tmp_path), flush_rows=1000, flush_interval=0.05)
+    log.record_detections([_det(0)])
+    assert log.rows == 0
+    time.sleep(0.06)
+    # Frame không có detection vẫn đẩy bộ đệm xuống đĩa khi quá flush_interval
+    log.record_detections([])
+    assert log.rows == 1 and len(DetectionLogReader(str(tmp_path))) == 1
+    log.close()
+    log.close()
+    log.record_detections([_det(1)])
+    assert len(DetectionLogReader(str(tmp_path))) == 1
+
+
+class _FixedDetector:
+    def __init__(self, detections):
+        self.detections = detections
+
+    def detect_objects(self, packet):
+        return [det.with_metadata(packet["metadata"]) for det in self.detections]
+
+
+def test_pipeline_stop_flushes_detection_log(tmp_path):
+    from src.p4_action.alert_manager import AlertManager
+    from src.pipeline import MonitorPipeline
+
+    log = DetectionLog(str(tmp_path), flush_rows=1000, flush_interval=3600)
+    pipeline = MonitorPipeline(source="missing.avi", camera_id="CAM_001", detector=_FixedDetector([_det(0)]),
+                               rule_engine=RuleEngine(rules_path=None), alert_manager=AlertManager(notify=False),
+                               use_motion_gate=False, use_tracker=False, detection_log=log)
+    metadata = dict(_det(0).metadata, frame_width=64, frame_height=48)
+    pipeline.process_packet({"raw_frame": np.zeros((48, 64, 3), dtype=np.uint8), "metadata": metadata})
+    assert len(DetectionLogReader(str(tmp_path))) == 0
+
+    pipeline.stop()
+    assert len(DetectionLogReader(str(tmp_path))) == 1
+    log.close()
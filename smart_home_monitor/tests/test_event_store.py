@@ -0,0 +1,84 @@
+# tests/test_event_store.py
+
+import time
+from datetime import datetime, timedelta
+from src.p4_action.event_store import EventStore
+from src.utils.helpers import AlertMessage, DetectionResult
+
+BASE = datetime(2026, 10, 1, 8, 0, 0)
+
+
+def _det(seconds, camera_id="CAM_001", class_name="knife", track_id=None):
+    return DetectionResult(class_name=class_name, confidence=0.8, bbox=[10, 20, 30, 40], position="floor",
+                           track_id=track_id, metadata={"camera_id": camera_id, "room_type": "kitchen",
+                                                        "timestamp": BASE + timedelta(seconds=seconds)})
+
+
+def _alert(seconds, camera_id="CAM_001", severity="HIGH"):
+    return AlertMessage(alert_id=f"{camera_id}-{seconds}", timestamp=BASE + timedelta(seconds=seconds),
+                        room_name="Bếp", violation_type="forbidden_on_floor", severity=severity,
+                        message="knife dưới sàn", camera_id=camera_id, class_name="knife")
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+def test_batched_writer_persists_detections_and_alerts(tmp_path):
+    store = EventStore(str(tmp_path / "events.db"), batch_size=4, flush_interval=0.05)
+    for i in range(10):
+        store.record_detections([_det(i, track_id=i), _det(i, class_name="scissors")])
+    store.record_alert(_alert(3))
+    # Luồng ghi nền tự ghi theo batch_size/flush_interval, không cần close
+    assert _wait_for(lambda: len(store.detections_between("CAM_001", BASE, BASE + timedelta(hours=1))) == 20)
+    assert _wait_for(lambda: store.count_alerts() == 1)
+
+    rows = store.detections_between("CAM_001", BASE, BASE + timedelta(hours=1))
+    assert rows[0]["timestamp"] == BASE and rows[0]["track_id"] == 0
+    assert (rows[0]["x1"], rows[0]["y1"], rows[0]["x2"], rows[0]["y2"]) == (10, 20, 30, 40)
+    alert = store.last_alerts(1)[0]
+    assert alert["alert_id"] == "CAM_001-3" and alert["severity"] == "HIGH" and alert["class"] == "knife"
+    store.close()
+
+
+def test_queries_filter_by_camera_and_time_range(tmp_path):
+    store = EventStore(str(tmp_path / "events.db"), flush_interval=0.05)
+    for i in range(6):
+        store.record_detections([_det(i), _det(i, camera_id="CAM_002")])
+        store.record_alert(_alert(i, severity="CRITICAL" if i % 2 else "HIGH"))
+        store.record_alert(_alert(i, camera_id="CAM_002"))
+    store.close()
+
+    start, end = BASE + timedelta(seconds=2), BASE + timedelta(seconds=4)
+    detections = store.detections_between("CAM_001", start, end)
+    # Khoảng [start, end): giây 2 và 3, chỉ của CAM_001
+    assert [d["timestamp"] for d in detections] == [start, start + timedelta(seconds=1)]
+    assert {d["camera_id"] for d in detections} == {"CAM_001"}
+
+    alerts = store.alerts_between(start, end, camera_id="CAM_001")
+    assert [a["alert_id"] for a in alerts] == ["CAM_001-2", "CAM_001-3"]
+    assert len(store.alerts_between(start, end)) == 4
+    assert [a["alert_id"] for a in store.alerts_between(BASE, end, severity="CRITICAL")] == ["CAM_001-1",
+                                                                                            "CAM_001-3"]
+    assert [a["alert_id"] for a in store.last_alerts(2, camera_id="CAM_002")] == ["CAM_002-5", "CAM_002-4"]
+
+
+def test_close_flushes_pending_rows(tmp_path):
+    # flush_interval dài: bản ghi nằm chờ trong lô, chỉ close() mới đẩy xuống đĩa
+    store = EventStore(str(tmp_path / "events.db"), batch_size=1000, flush_interval=60)
+    store.record_detections([_det(0), _det(1)])
+    store.record_alert(_alert(0))
+    time.sleep(0.3)  # Luồng ghi đã nhận lô và đang chờ thêm bản ghi
+    started = time.monotonic()
+    store.close()
+    assert time.monotonic() - started < 2.0
+
+    reopened = EventStore(str(tmp_path / "events.db"))
+    assert len(reopened.detections_between("CAM_001", BASE, BASE + timedelta(hours=1))) == 2
+    assert reopened.count_alerts() == 1
+    reopened.close()
@@ -0,0 +1,82 @@
+# tests/test_evidence_recorder.py
+
+import os
+import threading
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from src.p4_action.evidence_recorder import EvidenceRecorder
+from src.utils.helpers import AlertMessage
+
+BASE = datetime(2026, 10, 1, 8, 0, 0)
+MB = 1024 * 1024
+
+
+def _frame(width=1920, height=1080):
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    frame[::8] = 255  # Ảnh có chi tiết để JPEG không quá nhỏ
+    return frame
+
+
+@pytest.fixture
+def lagging(tmp_path):
+    """EvidenceRecorder có luồng nén bị chặn tới khi gọi release.set()."""
+    recorder = EvidenceRecorder(output_dir=str(tmp_path), fps=10, memory_mb=4, max_width=960, queue_size=64)
+    release = threading.Event()
+    encode = recorder._encode
+
+    def _slow_encode(frame, bbox=None):
+        release.wait()
+        return encode(frame, bbox)
+
+    recorder._encode = _slow_encode
+    yield recorder, release
+    release.set()
+    recorder.close()
+
+
+def test_memory_cap_holds_when_encoder_lags(lagging):
+    recorder, release = lagging
+    cap = 4 * MB
+    for i in range(40):
+        recorder.add_frame("CAM_EVIDENCE", _frame(), BASE + timedelta(seconds=i / 5))
+        assert recorder.memory_usage()["CAM_EVIDENCE"] <= cap
+    # Mỗi frame chờ nén đã thu nhỏ về 960x540: chỉ vài frame vừa giới hạn, phần còn lại bị bỏ
+    assert recorder.dropped >= 40 - cap // (960 * 540 * 3)
+    assert all(item[2].shape[1] == 960 for item in list(recorder._encode_queue.queue))
+
+    release.set()
+    recorder.close()
+    usage = recorder.memory_usage()["CAM_EVIDENCE"]
+    assert 0 < usage <= cap and recorder._buffers["CAM_EVIDENCE"].queued == 0
+
+
+def test_ring_buffer_evicts_to_make_room_for_queued_frames(tmp_path):
+    recorder = EvidenceRecorder(output_dir=str(tmp_path), fps=10, memory_mb=2, max_width=320)
+    for i in range(50):
+        recorder.add_frame("CAM_EVIDENCE", _frame(), BASE + timedelta(seconds=i / 10))
+    recorder.close()
+    buf = recorder._buffers["CAM_EVIDENCE"]
+    assert buf.queued == 0 and 0 < buf.nbytes <= 2 * MB
+
+    # Giữ chỗ cho frame chờ nén: bỏ JPEG cũ để tổng vẫn trong giới hạn
+    assert buf.reserve(2 * MB - 1000)
+    assert buf.nbytes + buf.queued <= 2 * MB
+    assert not buf.reserve(2000)
+
+
+def test_capture_writes_snapshot_and_clip(tmp_path):
+    recorder = EvidenceRecorder(output_dir=str(tmp_path), fps=10, pre_seconds=1, post_seconds=1, max_width=480)
+    alert_time = BASE + timedelta(seconds=1)
+    alert = AlertMessage(alert_id="a" * 32, timestamp=alert_time, room_name="Bếp", violation_type="forbidden_on_floor",
+                         severity="HIGH", message="", camera_id="CAM_EVIDENCE")
+    for i in range(25):
+        ts = BASE + timedelta(seconds=i / 10)
+        recorder.add_frame("CAM_EVIDENCE", _frame(), ts)
+        if ts == alert_time:
+            path = recorder.capture(alert, _frame(), [1000, 900, 1100, 1000])
+    recorder.close()
+
+    assert alert.image_path == path and os.path.exists(path)
+    assert os.path.exists(path[:-4] + ".mp4")
+    assert recorder.snapshots_written == 1 and recorder.clips_written == 1
@@ -0,0 +1,90 @@
+# tests/test_motion_gate.py
+
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from src.p2_recognition.motion_gate import MotionGate
+from src.utils.helpers import DetectionResult
+
+BASE = datetime(2026, 10, 1, 8, 0, 0)
+MOTION = {"downscale_width": 160, "pixel_threshold": 25, "min_changed_ratio": 0.01, "redetect_interval": 5}
+
+
+class _CountingDetector:
+    """Trả một con dao cho mỗi packet và ghi lại các lô đã nhận."""
+
+    def __init__(self):
+        self.calls = []
+
+    def _detect(self, packet):
+        return [DetectionResult(class_name="knife", confidence=0.9, bbox=[10, 20, 30, 40], position="floor",
+                                metadata=packet["metadata"])]
+
+    def detect_objects(self, packet):
+        self.calls.append([packet["metadata"]["frame_index"]])
+        return self._detect(packet)
+
+    def detect_objects_batch(self, packets):
+        self.calls.append([packet["metadata"]["frame_index"] for packet in packets])
+        return [self._detect(packet) for packet in packets]
+
+
+def _packet(frame_index, camera_id="CAM_MOTION", square=None):
+    frame = np.full((240, 320, 3), 80, dtype=np.uint8)
+    if square is not None:
+        x, y, side = square
+        frame[y:y + side, x:x + side] = 230
+    return {"raw_frame": frame, "processed_frame": None,
+            "metadata": {"camera_id": camera_id, "frame_index": frame_index,
+                         "timestamp": BASE + timedelta(seconds=frame_index / 10)}}
+
+
+@pytest.fixture
+def gate():
+    detector = _CountingDetector()
+    config = {"CAM_MOTION": {"motion": MOTION}, "CAM_OTHER": {"motion": MOTION}}
+    return detector, MotionGate(detector, camera_config=config)
+
+
+def test_static_frame_reuses_detections_with_current_metadata(gate):
+    detector, motion_gate = gate
+    first = motion_gate.detect_objects(_packet(0))
+    reused = motion_gate.detect_objects(_packet(1))
+    assert detector.calls == [[0]]
+    assert [d.class_name for d in reused] == ["knife"] and reused[0].bbox == first[0].bbox
+    assert reused[0] is not first[0]
+    assert reused[0].metadata["frame_index"] == 1
+    assert reused[0].metadata["timestamp"] == BASE + timedelta(seconds=0.1)
+    assert motion_gate.stats()["CAM_MOTION"]["skipped"] == 1
+
+
+def test_redetect_interval_forces_detection_on_static_scene(gate):
+    detector, motion_gate = gate
+    for i in range(12):
+        motion_gate.detect_objects(_packet(i))
+    # Lần đầu, rồi sau redetect_interval (5) frame bỏ qua thì chạy lại dù cảnh tĩnh
+    assert detector.calls == [[0], [6]]
+    assert motion_gate.changed_ratio("CAM_MOTION") == 0.0
+
+
+def test_change_above_min_ratio_triggers_detection(gate):
+    detector, motion_gate = gate
+    motion_gate.detect_objects(_packet(0))
+    # Ô vuông 4x4 px (~0.02% khung hình): dưới min_changed_ratio, vẫn dùng lại kết quả
+    motion_gate.detect_objects(_packet(1, square=(100, 100, 4)))
+    assert detector.calls == [[0]]
+    # Ô vuông 60x60 px (~4.7% khung hình): vượt min_changed_ratio, chạy lại detector
+    motion_gate.detect_objects(_packet(2, square=(100, 100, 60)))
+    assert detector.calls == [[0], [2]]
+    assert motion_gate.changed_ratio("CAM_MOTION") >= MOTION["min_changed_ratio"]
+
+
+def test_batch_sends_only_changed_packets_to_detector(gate):
+    detector, motion_gate = gate
+    motion_gate.detect_objects_batch([_packet(0), _packet(0, camera_id="CAM_OTHER")])
+    results = motion_gate.detect_objects_batch([_packet(1), _packet(1, camera_id="CAM_OTHER", square=(0, 0, 100))])
+    # Chỉ camera có chuyển động vào lô; kết quả vẫn đúng thứ tự packet
+    assert detector.calls == [[0, 0], [1]]
+    assert [r[0].metadata["camera_id"] for r in results] == ["CAM_MOTION", "CAM_OTHER"]
+    assert motion_gate.stats()["CAM_MOTION"]["skipped"] == 1
+    assert motion_gate.stats()["CAM_OTHER"]["skipped"] == 0
@@ -0,0 +1,79 @@
+# tests/test_scheduler.py
+
+import pytest
+from src.p2_recognition.scheduler import QoSScheduler, room_risks
+
+CAMERAS = {
+    "CAM_KITCHEN": {"room_type": "kitchen"},
+    "CAM_CHILD": {"room_type": "child_room"},
+    "CAM_LIVING": {"room_type": "living_room"},
+}
+
+
+def _scheduler(budget_fps, low_res=640, **kwargs):
+    # low_res = full_size: không hạ độ phân giải, chỉ chia tần suất
+    return QoSScheduler(budget_fps=budget_fps, cpu_share=None, min_fps=1.0, low_res=low_res,
+                        camera_config=CAMERAS, **kwargs)
+
+
+def _feed(scheduler, seconds=20.0, fps=30.0):
+    """Mô phỏng mọi camera gửi frame đều đặn; trả về chi phí (frame 640) đã nhận diện mỗi giây."""
+    units = 0.0
+    steps = int(seconds * fps)
+    for step in range(steps):
+        now = step / fps
+        for camera_id in CAMERAS:
+            size = scheduler.admit(camera_id, now=now)
+            if size is not None and now >= seconds / 2:
+                units += scheduler.cost(size)
+    return units / (seconds / 2)
+
+
+def test_child_room_has_highest_risk():
+    risks = room_risks()
+    assert risks["child_room"] > risks["kitchen"] > 1.0
+
+
+@pytest.mark.parametrize("budget", [6.0, 15.0, 45.0])
+def test_waterfill_spends_exactly_the_budget_when_overloaded(budget):
+    scheduler = _scheduler(budget)
+    _feed(scheduler, seconds=4.0)
+    cameras = scheduler._cameras
+    rates = scheduler._waterfill(cameras, {cid: 640 for cid in cameras}, budget)
+    assert sum(rates.values()) == pytest.approx(min(budget, 90.0), rel=1e-6)
+    assert all(rate >= 1.0 - 1e-9 for rate in rates.values())
+    assert all(rates[cid] <= cam.demand + 1e-6 for cid, cam in cameras.items())
+
+
+def test_underloaded_budget_gives_every_camera_its_demand():
+    scheduler = _scheduler(1000.0)
+    _feed(scheduler, seconds=4.0)
+    for stats in scheduler.stats().values():
+        assert stats["rate_fps"] == pytest.approx(stats["demand_fps"], rel=1e-3)
+        assert stats["skipped"] == 0
+
+
+def test_admitted_cost_matches_budget_and_follows_priority():
+    scheduler = _scheduler(15.0)
+    spent = _feed(scheduler)
+    assert spent == pytest.approx(15.0, rel=0.1)
+    stats = scheduler.stats()
+    assert stats["CAM_CHILD"]["rate_fps"] > stats["CAM_KITCHEN"]["rate_fps"] > stats["CAM_LIVING"]["rate_fps"]
+    assert min(s["rate_fps"] for s in stats.values()) >= 1.0 - 1e-9
+
+
+def test_lowest_priority_camera_downgraded_first():
+    scheduler = _scheduler(70.0, low_res=320)
+    _feed(scheduler, seconds=4.0)
+    sizes = {cid: s["input_size"] for cid, s in scheduler.stats().items()}
+    assert sizes["CAM_LIVING"] == 320
+    assert sizes["CAM_CHILD"] == 640
+
+
+def test_recent_alert_raises_priority():
+    scheduler = _scheduler(15.0)
+    _feed(scheduler, seconds=4.0)
+    before = scheduler.stats()["CAM_LIVING"]["priority"]
+    scheduler.observe_alert("CAM_LIVING", now=4.0)
+    scheduler._reallocate(4.0)
+    assert scheduler.stats()["CAM_LIVING"]["priority"] > before
@@ -0,0 +1,142 @@
+# tests/test_temporal.py
+
+from datetime import datetime, timedelta
+import pytest
+from src.p3_context.rule_engine import RuleEngine
+from src.p3_context.temporal import TemporalState, WindowCounter
+from src.utils.helpers import DetectionResult
+
+BASE = datetime(2026, 10, 1, 8, 0, 0)
+FPS = 10
+
+
+def _meta(i, camera_id="CAM_002", room_type="child_room"):
+    return {"camera_id": camera_id, "room_type": room_type, "room_name": "Phòng trẻ em",
+            "timestamp": BASE + timedelta(seconds=i / FPS)}
+
+
+def _frame(engine, i, objects, **meta_kwargs):
+    """Đối soát một frame; objects = [(class_name, position), ...]."""
+    meta = _meta(i, **meta_kwargs)
+    detections = [DetectionResult(class_name=name, confidence=0.9, bbox=[100, 400, 140, 470], position=position,
+                                  metadata=meta) for name, position in objects]
+    return engine.validate_batch(detections, meta)
+
+
+def _first_alert(engine, pattern, frames=80, class_name="razor"):
+    """Frame đầu tiên có vi phạm được xác nhận; pattern(i) -> vị trí của vật ở frame i (None: không thấy)."""
+    engine.reset_temporal()
+    for i in range(frames):
+        position = pattern(i)
+        results = _frame(engine, i, [(class_name, position)] if position else [])
+        if results and results[0][0]:
+            return i
+    return None
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return RuleEngine(rules_path=None)
+
+
+# --- WindowCounter ---
+def test_window_counter_sums_and_slides():
+    counter = WindowCounter(seconds=10.0, num_buckets=10)
+    for i in range(10):
+        counter.add(float(i))
+    assert counter.count(9.5) == 10
+    # Trượt nửa cửa sổ: 5 thùng cũ bị xóa
+    assert counter.count(14.5) == 5
+    assert counter.count(50.0) == 0
+
+
+def test_window_counter_restarts_when_time_goes_back():
+    counter = WindowCounter(seconds=1.0, num_buckets=10)
+    counter.add(100.0)
+    counter.add(3.0)
+    assert counter.count(3.0) == 1
+
+
+# --- TemporalState ---
+def test_confirm_requires_duration_and_ratio():
+    state = TemporalState()
+    confirmed = []
+    for i in range(40):
+        t = i / FPS
+        state.observe_frame("CAM", t, (3.0,))
+        confirmed.append(state.confirm("CAM", "razor", "forbidden_on_floor", t, 3.0, 0.8))
+    assert not any(confirmed[:30]) and all(confirmed[30:])
+
+
+def test_idle_keys_evicted_and_bounded():
+    state = TemporalState(max_keys=2)
+    for k in range(5):
+        state.confirm("CAM", f"vat_{k}", "forbidden_on_floor", float(k), 3.0, 0.8)
+    assert list(state.tracks) == [("CAM", "vat_3", "forbidden_on_floor"), ("CAM", "vat_4", "forbidden_on_floor")]
+
+    state = TemporalState()
+    state.confirm("CAM", "vat_cu", "forbidden_on_floor", 0.0, 3.0, 0.8)
+    state.confirm("CAM", "vat_moi", "forbidden_on_floor", 10.0, 3.0, 0.8)
+    assert list(state.tracks) == [("CAM", "vat_moi", "forbidden_on_floor")]
+
+
+# --- RuleEngine với điều kiện thời gian mặc định (child_room: forbidden_on_floor any_sharp_object 3 s / 80%) ---
+def test_qualifier_keyed_by_violation_type(engine):
+    temporal = engine.compiled.temporal
+    assert ("child_room", "razor", "forbidden_on_floor") in temporal
+    assert not any(v_type == "forbidden_object" for _, _, v_type in temporal)
+
+
+def test_critical_forbidden_object_alerts_on_first_frame(engine):
+    engine.reset_temporal()
+    for position in ("mid", "floor"):
+        result = _frame(engine, 0, [("knife", position)])[0]
+        assert result[0] and result[1:3] == ("forbidden_object", "CRITICAL")
+
+
+def test_persistent_floor_violation_alerts_after_duration(engine):
+    assert _first_alert(engine, lambda i: "floor") == 3 * FPS
+
+
+@pytest.mark.parametrize("every", [2, 5])
+def test_flickering_detection_never_alerts(engine, every):
+    assert _first_alert(engine, lambda i: "floor" if i % every == 0 else None) is None
+
+
+def test_brief_dropout_does_not_reset_window(engine):
+    # Mất 1/10 frame (90% >= 80%): vẫn cảnh báo sau 3 giây, không bị đặt lại
+    assert _first_alert(engine, lambda i: None if i % 10 == 5 else "floor") == 3 * FPS
+
+
+def test_position_flicker_near_zone_boundary_does_not_reset(engine):
+    # Vật gần ranh giới bị xếp "low" 1/10 frame: chỉ giảm tỉ lệ, không tách/đặt lại cửa sổ
+    assert _first_alert(engine, lambda i: "low" if i % 10 == 5 else "floor") == 3 * FPS
+
+
+def test_explicit_forbidden_object_qualifier_ignores_position():
+    # Chỉ khi config khai báo rõ, forbidden_object mới bị giữ lại; dao lật giữa "mid"/"floor"
+    # vẫn là cùng một vi phạm nên cửa sổ không bị tách theo vị trí
+    import copy
+    from configs.config import SAFETY_RULES, OBJECT_CATEGORIES, CATEGORY_ALIASES
+    from src.p3_context.rule_engine import CompiledRules
+
+    rules = copy.deepcopy(SAFETY_RULES)
+    rules["child_room"]["temporal"] = {"forbidden_object": {"knife": {"seconds": 3, "ratio": 0.8}}}
+    engine = RuleEngine(rules_path=None)
+    engine._compiled = CompiledRules(rules, OBJECT_CATEGORIES, CATEGORY_ALIASES)
+    assert _first_alert(engine, lambda i: "mid" if i % 2 else "floor", class_name="knife") == 3 * FPS
+
+
+def test_room_without_qualifier_alerts_immediately(engine):
+    engine.reset_temporal()
+    result = _frame(engine, 0, [("knife", "floor")], camera_id="CAM_001", room_type="kitchen")[0]
+    assert result[:3] == (True, "forbidden_on_floor", "HIGH")
+
+
+def test_unknown_violation_type_rejected():
+    from configs.config import OBJECT_CATEGORIES, CATEGORY_ALIASES
+    from src.p3_context.rule_engine import CompiledRules
+
+    rules = {"kitchen": {"forbidden_on_floor": ["knife"], "temporal": {"on_floor": {"knife": {"seconds": 2}}}}}
+    with pytest.raises(ValueError):
+        CompiledRules(rules, OBJECT_CATEGORIES, CATEGORY_ALIASES)
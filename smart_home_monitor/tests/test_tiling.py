@@ -0,0 +1,168 @@
+# tests/test_tiling.py
+
+import numpy as np
+import pytest
+from src.p2_recognition.tiling import TiledDetector, merge_boxes, tile_grid
+from src.utils.helpers import DetectionBatch
+
+NAMES = {0: "knife", 1: "cup"}
+
+
+def test_tile_grid_covers_band_within_frame():
+    tiles = tile_grid(1920, 1080, (0.6, 1.0), tile_size=640, overlap=0.2, max_tiles=8)
+    assert 0 < len(tiles) <= 8
+    assert min(t[0] for t in tiles) == 0 and max(t[2] for t in tiles) == 1920
+    assert min(t[1] for t in tiles) <= int(0.6 * 1080) and max(t[3] for t in tiles) == 1080
+    for x0, y0, x1, y1 in tiles:
+        assert x1 - x0 == y1 - y0 and 0 <= x0 and 0 <= y0 and x1 <= 1920 and y1 <= 1080
+
+
+def test_tile_grid_grows_tiles_to_respect_max_tiles():
+    tiles = tile_grid(3840, 2160, (0.0, 1.0), tile_size=640, overlap=0.2, max_tiles=8)
+    assert len(tiles) <= 8
+    assert tiles[0][2] - tiles[0][0] > 640
+
+
+def test_tile_grid_skips_small_frames():
+    assert tile_grid(640, 480, (0.6, 1.0), tile_size=640, overlap=0.2, max_tiles=8) == []
+
+
+def test_merge_boxes_joins_object_cut_by_tile_seam():
+    # Vật nằm trên mép hai ô: mỗi ô thấy một phần, lượt cả frame thấy toàn bộ
+    boxes = np.array([[600, 700, 640, 740],    # phần trong ô trái
+                      [620, 700, 700, 740],    # phần trong ô phải
+                      [600, 700, 700, 740],    # bbox đầy đủ từ lượt cả frame
+                      [900, 700, 950, 740]],   # vật khác cùng lớp
+                     dtype=np.int32)
+    scores = np.array([0.6, 0.7, 0.8, 0.9], dtype=np.float32)
+    class_ids = np.array([0, 0, 0, 0], dtype=np.int32)
+    assert sorted(merge_boxes(boxes, scores, class_ids, 0.5).tolist()) == [2, 3]
+
+
+def test_merge_boxes_keeps_overlapping_boxes_of_other_classes():
+    boxes = np.array([[0, 0, 50, 50], [5, 5, 45, 45]], dtype=np.int32)
+    scores = np.array([0.9, 0.8], dtype=np.float32)
+    assert sorted(merge_boxes(boxes, scores, np.array([0, 1]), 0.5).tolist()) == [0, 1]
+
+
+class _FakeDetector:
+    """Lượt cả frame trả `full`, lượt ô đầu tiên trả `tile` (đã theo tọa độ frame gốc)."""
+    names = NAMES
+
+    def __init__(self):
+        self.full = []
+        self.tile = []
+        self.tile_calls = 0
+
+    @staticmethod
+    def _batch(objects, metadata):
+        boxes = np.array([box for box, _ in objects], dtype=np.int32).reshape(-1, 4)
+        class_ids = np.array([cid for _, cid in objects], dtype=np.int32)
+        return DetectionBatch(boxes=boxes, scores=np.full(len(objects), 0.8, dtype=np.float32), class_ids=class_ids,
+                              position_codes=np.zeros(len(objects), dtype=np.uint8), names=NAMES, metadata=metadata)
+
+    def detect_batches(self, packets):
+        batches = []
+        first_tile = True
+        for packet in packets:
+            if packet["metadata"].get("roi") is None:
+                batches.append(self._batch(self.full, packet["metadata"]))
+            else:
+                self.tile_calls += first_tile
+                batches.append(self._batch(self.tile if first_tile else [], packet["metadata"]))
+                first_tile = False
+        return batches
+
+
+@pytest.fixture
+def tiled():
+    fake = _FakeDetector()
+    detector = TiledDetector(fake, camera_config={"CAM_TILE": {"tiling": {"refresh_every": 5}}})
+    return fake, detector
+
+
+def _packet(camera_id="CAM_TILE", frame_index=0, processed_frame=None):
+    if processed_frame is None:
+        processed_frame = np.zeros((640, 640, 3), dtype=np.uint8)
+    return {"raw_frame": np.zeros((1080, 1920, 3), dtype=np.uint8), "processed_frame": processed_frame,
+            "metadata": {"camera_id": camera_id, "frame_index": frame_index}}
+
+
+def _run(detector, frame_index=0):
+    return detector.detect_batches([_packet(frame_index=frame_index)])[0]
+
+
+KNIFE = ([1000, 950, 1020, 1000], 0)
+
+
+def test_tile_only_object_refreshes_tiles_every_call(tiled):
+    fake, detector = tiled
+    fake.tile = [KNIFE]
+    for i in range(4):
+        assert _run(detector, i).class_names == ["knife"]
+    assert fake.tile_calls == 4
+
+    # Vật bị lấy đi: lượt ô kế tiếp không thấy, không còn detection cũ
+    fake.tile = []
+    assert len(_run(detector, 4)) == 0
+    assert len(_run(detector, 5)) == 0
+
+
+def test_confirmed_tile_box_dropped_when_full_frame_loses_it(tiled):
+    fake, detector = tiled
+    fake.full = [([998, 948, 1022, 1002], 0)]
+    fake.tile = [KNIFE]
+    assert len(_run(detector, 0)) == 1
+    # Frame giữa hai lượt ô: cả frame vẫn thấy -> giữ (đã gộp thành một bbox)
+    assert len(_run(detector, 1)) == 1
+    assert fake.tile_calls == 1
+
+    fake.full = []
+    fake.tile = []
+    # Cả frame mất vật: kết quả ô cũ không được phát lại
+    assert len(_run(detector, 2)) == 0
+    # Lần sau chạy lại ô ngay để kiểm tra vật nhỏ
+    _run(detector, 3)
+    assert fake.tile_calls == 2
+
+
+def test_camera_without_tiling_passes_through():
+    fake = _FakeDetector()
+    fake.full = [KNIFE]
+    detector = TiledDetector(fake, camera_config={})
+    batch = _run(detector)
+    assert batch.class_names == ["knife"] and fake.tile_calls == 0
+
+
+class _StackingDetector(_FakeDetector):
+    """Ghép ảnh thành một tensor như backend ONNX/OpenVINO: lô trộn kích thước hoặc kiểu ảnh là lỗi."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def detect_batches(self, packets):
+        images = [packet["processed_frame"] for packet in packets]
+        assert len({image.dtype for image in images}) == 1
+        blob = np.stack(images)
+        self.calls.append((blob.shape[1:3], blob.dtype.name, len(images)))
+        return [self._batch(self.full if packet["metadata"].get("roi") is None else [], packet["metadata"])
+                for packet in packets]
+
+
+def test_tiles_not_batched_with_stretched_or_downscaled_frames():
+    fake = _StackingDetector()
+    fake.full = [KNIFE]
+    detector = TiledDetector(fake, camera_config={"CAM_STRETCH": {"tiling": True}, "CAM_QOS": {"tiling": True}})
+    packets = [_packet("CAM_STRETCH", processed_frame=np.zeros((640, 640, 3), dtype=np.float32)),
+               _packet("CAM_QOS", processed_frame=np.zeros((320, 320, 3), dtype=np.uint8))]
+    batches = detector.detect_batches(packets)
+
+    # Mỗi nhóm (kích thước, kiểu) một lô: frame "stretch" float32, frame QoS 320 và các ô uint8 ở tile_size
+    groups = {(shape, dtype): count for shape, dtype, count in fake.calls}
+    num_tiles = len(detector._states["CAM_STRETCH"].tiles)
+    assert groups == {((640, 640), "float32"): 1, ((320, 320), "uint8"): 1,
+                      ((640, 640), "uint8"): 2 * num_tiles}
+    # Kết quả vẫn trả về đúng thứ tự packet
+    assert [b.metadata["camera_id"] for b in batches] == ["CAM_STRETCH", "CAM_QOS"]
+    assert all(b.class_names == ["knife"] for b in batches)
@@ -0,0 +1,68 @@
+# tests/test_tracker.py
+
+from configs.config import DETECTION_THRESHOLD, TRACKER
+from src.p2_recognition.tracker import ObjectTracker
+from src.utils.helpers import DetectionResult
+
+META = {"camera_id": "CAM_TEST", "frame_width": 640, "frame_height": 480}
+
+
+def _det(bbox, confidence=0.9, class_name="knife"):
+    return DetectionResult(class_name=class_name, confidence=confidence, bbox=bbox, position="floor", metadata=META)
+
+
+def test_low_conf_stage_reachable_with_default_thresholds():
+    # Detection detector giữ lại (>= DETECTION_THRESHOLD) nhưng dưới high_conf mặc định:
+    # bước ghép thứ hai duy trì track đã có, không tạo track mới
+    confidence = (DETECTION_THRESHOLD + TRACKER["high_conf"]) / 2
+    tracker = ObjectTracker()
+    first = tracker.update([_det([100, 100, 150, 150], confidence=0.95)])
+    low = tracker.update([_det([103, 101, 153, 151], confidence=confidence),
+                          _det([400, 300, 450, 350], confidence=confidence)])
+    assert low[0].track_id == first[0].track_id
+    assert low[1].track_id is None
+    assert len(tracker.tracks) == 1
+    assert tracker.tracks[0].confidence == confidence
+
+
+def test_track_id_stable_across_frames():
+    tracker = ObjectTracker()
+    first = tracker.update([_det([100, 100, 150, 150])])
+    second = tracker.update([_det([104, 102, 154, 152])])
+    assert first[0].track_id is not None
+    assert second[0].track_id == first[0].track_id
+
+
+def test_low_conf_detection_maintains_but_does_not_create_track():
+    tracker = ObjectTracker(high_conf=0.6)
+    first = tracker.update([_det([100, 100, 150, 150], confidence=0.9)])
+    low = tracker.update([_det([102, 101, 152, 151], confidence=0.55),
+                          _det([400, 300, 450, 350], confidence=0.55)])
+    assert low[0].track_id == first[0].track_id
+    assert low[1].track_id is None
+    assert len(tracker.tracks) == 1
+
+
+def test_classes_never_matched_together():
+    tracker = ObjectTracker()
+    first = tracker.update([_det([100, 100, 150, 150], class_name="knife")])
+    second = tracker.update([_det([100, 100, 150, 150], class_name="scissors")])
+    assert second[0].track_id != first[0].track_id
+
+
+def test_update_does_not_mutate_inputs():
+    tracker = ObjectTracker()
+    inputs = [_det([100, 100, 150, 150])]
+    results = tracker.update(inputs)
+    assert inputs[0].track_id is None
+    assert results[0] is not inputs[0] and results[0].track_id is not None
+
+
+def test_propagate_predicts_matched_tracks_only():
+    tracker = ObjectTracker()
+    tracker.update([_det([100, 100, 150, 150])])
+    tracker.update([_det([110, 100, 160, 150])])
+    predicted = tracker.propagate(META)
+    assert len(predicted) == 1
+    # Vận tốc dương theo trục x: bbox dự đoán dịch tiếp sang phải
+    assert predicted[0].bbox[0] > 110